@@ -1,31 +1,34 @@
-from typing import List, Set, Tuple, Dict
-import heapq
-from dataclasses import dataclass
+import logging
+from typing import Iterable, List, Optional, Set, Tuple
+from GridSearch import GridSearch
 from Position import Position
+from PathCache import PathCache
 
-
-@dataclass
-class Node:
-    """节点类，用于A*算法"""
-    position: Position  # 节点位置
-    g_cost: float  # 从起点到当前节点的实际代价
-    h_cost: float  # 从当前节点到终点的估计代价
-    parent: 'Node'  # 父节点
-
-    @property
-    def f_cost(self) -> float:
-        """f(n) = g(n) + h(n)"""
-        return self.g_cost + self.h_cost
-
-    def __lt__(self, other: 'Node') -> bool:
-        """用于优先队列的比较"""
-        return self.f_cost < other.f_cost
+logger = logging.getLogger(__name__)
 
 
 class AStar:
-    def __init__(self):
+    def __init__(self, path_cache: Optional[PathCache] = None,
+                 width: Optional[int] = None, height: Optional[int] = None,
+                 static_obstacles: Iterable[Tuple[int, int]] = ()):
+        """
+        :param path_cache: 寻路结果缓存，为None时每次都完整搜索
+        :param width: 网格宽，find_path 不指定bounds时在 width x height 的矩形网格上搜索
+        :param height: 网格高
+        :param static_obstacles: 静态障碍物（货架、墙）坐标，与find_path每次传入的动态障碍物（其他机器人）分开保存
+        """
         # 四个方向：上、右、下、左
         self.directions = [(0, -1), (1, 0), (0, 1), (-1, 0)]
+        self.path_cache = path_cache
+        self.width = width
+        self.height = height
+        self.static_obstacles = frozenset(static_obstacles)
+        # width x height 网格上去掉静态障碍物的相邻格子表，只在构造时建立一次
+        self._static_neighbors = None
+        if self.static_obstacles and width is not None and height is not None:
+            grid = GridSearch.shared(width, height)
+            self._static_neighbors = grid.neighbors_excluding(
+                grid.cell(x, y) for x, y in self.static_obstacles if grid.contains(x, y))
 
     @staticmethod
     def manhattan_distance(pos1: Position, pos2: Position) -> float:
@@ -37,113 +40,83 @@ class AStar:
         """计算欧几里得距离"""
         return ((pos1.x - pos2.x) ** 2 + (pos1.y - pos2.y) ** 2) ** 0.5
 
-    def is_valid_position(self, pos: Position, bounds: Tuple[int, int]) -> bool:
-        """检查位置是否在边界内"""
+    def is_valid_position(self, pos: Position, bounds: Optional[Tuple[int, int]]) -> bool:
+        """检查位置是否在边界内，bounds为None时检查是否在 width x height 的网格内"""
+        if bounds is None:
+            return 0 <= pos.x < self.width and 0 <= pos.y < self.height
         min_val, max_val = bounds
         return min_val <= pos.x <= max_val and min_val <= pos.y <= max_val
 
-    def get_neighbors(self, node: Node, bounds: Tuple[int, int], obstacles: Set[Tuple[int, int]]) -> List[Position]:
-        """获取相邻的可行节点"""
-        neighbors = []
-        for dx, dy in self.directions:
-            new_x = node.position.x + dx
-            new_y = node.position.y + dy
-            new_pos = Position(new_x, new_y)
-
-            # 检查是否在边界内且不是障碍物
-            if (self.is_valid_position(new_pos, bounds) and
-                    (new_pos.x, new_pos.y) not in obstacles):
-                neighbors.append(new_pos)
-        return neighbors
-
     def find_path(self, start: Position, goal: Position,
-                  obstacles: Set[Position], bounds: Tuple[int, int]) -> List[Position]:
+                  obstacles: Set[Position], bounds: Optional[Tuple[int, int]] = None,
+                  distance_field: Optional[List[int]] = None,
+                  layout_version: int = 0) -> List[Position]:
         """
         A*寻路算法主函数
         :param start: 起点
         :param goal: 终点
-        :param obstacles: 障碍物集合
-        :param bounds: 边界范围 (min_val, max_val)
+        :param obstacles: 动态障碍物集合（Position或坐标元组），静态障碍物在构造时给出
+        :param bounds: 正方形边界范围 (min_val, max_val)，为None时使用构造时给出的 width x height 矩形网格
+        :param distance_field: 按搜索网格展开的到终点距离场，作为启发值，默认曼哈顿距离
+        :param layout_version: 静态布局版本号，作为路线缓存键的一部分
         :return: 路径列表，从起点到终点（不包含起点）
         """
+        if bounds is None and (self.width is None or self.height is None):
+            raise ValueError("AStar needs width and height to search without bounds")
+
         # 如果起点和终点相同
         if start == goal:
             return []
 
         # 转换障碍物为坐标元组集合
-        obstacle_tuples = {(obs.x, obs.y) for obs in obstacles}
-
+        obstacle_tuples = PathCache.obstacle_cells(obstacles)
+
+        if self.path_cache is not None:
+            cached = self.path_cache.get(start, goal, bounds, layout_version, obstacle_tuples)
+            if cached is not None:
+                return cached
+            path = self._search(start, goal, obstacle_tuples, bounds, distance_field)
+            self.path_cache.put(start, goal, bounds, layout_version, obstacle_tuples, path)
+            return path
+        return self._search(start, goal, obstacle_tuples, bounds, distance_field)
+
+    def _search(self, start: Position, goal: Position, obstacle_tuples: Set[Tuple[int, int]],
+                bounds: Optional[Tuple[int, int]], distance_field: Optional[List[int]]) -> List[Position]:
+        """不经过缓存的A*搜索，由整数格子索引的GridSearch完成"""
         # 检查起点和终点是否有效
         if not self.is_valid_position(start, bounds) or not self.is_valid_position(goal, bounds):
-            print(f"警告：起点{start}或终点{goal}超出边界范围{bounds}")
+            logger.warning("警告：起点%s或终点%s超出边界范围%s", start, goal, bounds)
             return []
 
         if (start.x, start.y) in obstacle_tuples or (goal.x, goal.y) in obstacle_tuples:
-            print(f"警告：起点{start}或终点{goal}位于障碍物上")
+            logger.warning("警告：起点%s或终点%s位于障碍物上", start, goal)
+            return []
+        if (goal.x, goal.y) in self.static_obstacles:
+            logger.warning("警告：终点%s位于静态障碍物上", goal)
             return []
 
-        # 初始化开启和关闭列表
-        open_list = []
-        closed_set = set()
-
-        # 创建起始节点
-        start_node = Node(
-            position=start,
-            g_cost=0,
-            h_cost=self.manhattan_distance(start, goal),
-            parent=None
-        )
-
-        # 将起始节点加入开启列表
-        heapq.heappush(open_list, start_node)
-        node_dict = {(start.x, start.y): start_node}  # 用于快速查找节点
-
-        while open_list:
-            # 获取f值最小的节点
-            current = heapq.heappop(open_list)
-            current_tuple = (current.position.x, current.position.y)
-
-            # 如果到达目标
-            if current.position == goal:
-                path = []
-                while current.parent is not None:
-                    path.append(current.position)
-                    current = current.parent
-                return path[::-1]  # 反转路径并返回
-
-            # 将当前节点加入关闭列表
-            closed_set.add(current_tuple)
-
-            # 检查所有相邻节点
-            for neighbor_pos in self.get_neighbors(current, bounds, obstacle_tuples):
-                neighbor_tuple = (neighbor_pos.x, neighbor_pos.y)
-
-                # 如果节点已经在关闭列表中，跳过
-                if neighbor_tuple in closed_set:
-                    continue
-
-                # 计算新的g值
-                new_g_cost = current.g_cost + 1
-
-                # 如果是新节点或找到了更好的路径
-                if (neighbor_tuple not in node_dict or
-                        new_g_cost < node_dict[neighbor_tuple].g_cost):
-                    # 创建新的相邻节点
-                    neighbor_node = Node(
-                        position=neighbor_pos,
-                        g_cost=new_g_cost,
-                        h_cost=self.manhattan_distance(neighbor_pos, goal),
-                        parent=current
-                    )
-
-                    # 更新或添加到节点字典
-                    node_dict[neighbor_tuple] = neighbor_node
-
-                    # 添加到开启列表
-                    heapq.heappush(open_list, neighbor_node)
-
-        print(f"警告：无法找到从{start}到{goal}的路径")
-        return []  # 没有找到路径
+        neighbors = None
+        if bounds is None:
+            origin = 0
+            grid = GridSearch.shared(self.width, self.height)
+            neighbors = self._static_neighbors
+        else:
+            origin, max_val = bounds
+            grid = GridSearch.shared(max_val - origin + 1, max_val - origin + 1)
+            # 自定义边界的网格没有预先建好的相邻格子表，静态障碍物并入本次的障碍物
+            if self.static_obstacles:
+                obstacle_tuples = obstacle_tuples | self.static_obstacles
+
+        width = grid.width
+        blocked = {(y - origin) * width + x - origin for x, y in obstacle_tuples
+                   if grid.contains(x - origin, y - origin)}
+        cells = grid.find_path(grid.cell(start.x - origin, start.y - origin),
+                               grid.cell(goal.x - origin, goal.y - origin),
+                               blocked, distance_field, neighbors)
+        if not cells:
+            logger.debug("警告：无法找到从%s到%s的路径", start, goal)
+        xs, ys = grid.xs, grid.ys
+        return [Position(xs[cell] + origin, ys[cell] + origin) for cell in cells]
 
 
 def test_astar():
@@ -0,0 +1,323 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import heapq
+import time
+from DistanceFieldCache import DistanceFieldCache
+from Direction import Direction
+from Position import Position
+from ReservationTable import ReservationTable
+
+
+class CTNode:
+    """约束树节点"""
+
+    def __init__(self, constraints: Dict[str, Tuple[frozenset, frozenset]],
+                 paths: Dict[str, List[Tuple[int, int]]], lower_bounds: Dict[str, int]):
+        # rid -> (顶点约束 {(x, y, t)}, 边约束 {(x1, y1, x2, y2, t)})
+        self.constraints = constraints
+        # rid -> 路线格子列表，第一个元素为起点
+        self.paths = paths
+        self.lower_bounds = lower_bounds
+        self.cost = sum(len(p) - 1 for p in paths.values())
+        self.lower_bound = sum(lower_bounds.values())
+        self.conflicts: List[tuple] = []
+
+
+class ConflictBasedSearch:
+    """
+    多机器人联合规划：基于冲突的搜索（CBS）
+    suboptimality > 1 时为有界次优的ECBS：高层与底层都使用focal列表，
+    在代价不超过下界suboptimality倍的节点中优先选择冲突最少的节点
+    不参与联合规划的机器人通过共享预约表视为障碍
+    """
+
+    def __init__(self, width: int, height: int, table: ReservationTable,
+                 suboptimality: float = 1.0, time_limit: float = 0.05, max_nodes: int = 200,
+                 distance_fields: Optional[DistanceFieldCache] = None,
+                 static_obstacles: Iterable[Tuple[int, int]] = ()):
+        """
+        :param width: 仓库宽
+        :param height: 仓库高
+        :param table: 共享预约表
+        :param suboptimality: 次优界，1.0为最优CBS
+        :param time_limit: 单次求解时间上限，单位秒
+        :param max_nodes: 约束树最大展开节点数
+        :param distance_fields: 固定目标的距离场，底层搜索的目标有距离场时用作启发值
+        :param static_obstacles: 静态障碍物（货架、墙）坐标，底层搜索不进入这些格子
+        """
+        self.width = width
+        self.height = height
+        self.table = table
+        self.suboptimality = suboptimality
+        self.time_limit = time_limit
+        self.max_nodes = max_nodes
+        self.distance_fields = distance_fields
+        self.static_obstacles = frozenset(static_obstacles)
+        self.moves = Direction.get_directions() + ((0, 0),)
+
+    @staticmethod
+    def manhattan_distance(x1: int, y1: int, x2: int, y2: int) -> int:
+        return abs(x1 - x2) + abs(y1 - y2)
+
+    def solve(self, agents: Dict[str, Tuple[Position, Position, int, bool]]) -> Optional[Dict[str, List[Position]]]:
+        """
+        联合求解多个机器人的无冲突路线
+        :param agents: rid -> (起点, 终点, 起始tick, 到达终点后是否一直停留)
+        :return: rid -> 路径列表（不包含起点），单独也无法到达终点的机器人不出现在结果中；超时返回None
+        """
+        deadline = time.perf_counter() + self.time_limit
+        w = self.suboptimality
+
+        empty = (frozenset(), frozenset())
+        root_paths = {}
+        root_bounds = {}
+        for rid in agents:
+            if time.perf_counter() > deadline:
+                return None
+            result = self._low_level(rid, agents, empty, {}, w)
+            if result is not None:
+                root_paths[rid], root_bounds[rid] = result
+        if not root_paths:
+            return {}
+        agents = {rid: agents[rid] for rid in root_paths}
+        root = CTNode({rid: empty for rid in agents}, root_paths, root_bounds)
+        root.conflicts = self._find_conflicts(root.paths, agents)
+
+        counter = 0
+        open_list = [(root.lower_bound, len(root.conflicts), counter, root)]
+        expanded = 0
+        while open_list:
+            if time.perf_counter() > deadline or expanded >= self.max_nodes:
+                return None
+            node = self._pop_focal(open_list, w)
+            expanded += 1
+
+            if not node.conflicts:
+                return {rid: [Position(x, y) for x, y in path[1:]] for rid, path in node.paths.items()}
+
+            for rid, vertex, edge in self._split(self._choose_conflict(node.conflicts, agents)):
+                vertex_cons, edge_cons = node.constraints[rid]
+                if vertex is not None:
+                    vertex_cons = vertex_cons | {vertex}
+                if edge is not None:
+                    edge_cons = edge_cons | {edge}
+                constraints = dict(node.constraints)
+                constraints[rid] = (vertex_cons, edge_cons)
+                others = {other: path for other, path in node.paths.items() if other != rid}
+                result = self._low_level(rid, agents, constraints[rid], others, w)
+                if result is None:
+                    continue
+                paths = dict(node.paths)
+                bounds = dict(node.lower_bounds)
+                paths[rid], bounds[rid] = result
+                child = CTNode(constraints, paths, bounds)
+                child.conflicts = self._find_conflicts(paths, agents)
+                counter += 1
+                heapq.heappush(open_list, (child.lower_bound, len(child.conflicts), counter, child))
+
+        return None
+
+    @staticmethod
+    def _pop_focal(open_list: list, w: float) -> CTNode:
+        """
+        从开放列表中取出下一个展开的约束树节点：
+        CBS取下界最小的节点，ECBS在代价不超过 w*最小下界 的节点中取冲突数最少的节点
+        """
+        if w <= 1.0:
+            return heapq.heappop(open_list)[3]
+        bound = open_list[0][0] * w
+        best_index = 0
+        best_key = None
+        for index, (lower_bound, conflict_count, counter, node) in enumerate(open_list):
+            if node.cost > bound:
+                continue
+            key = (conflict_count, node.cost, counter)
+            if best_key is None or key < best_key:
+                best_key = key
+                best_index = index
+        node = open_list[best_index][3]
+        open_list[best_index] = open_list[-1]
+        open_list.pop()
+        heapq.heapify(open_list)
+        return node
+
+    @staticmethod
+    def _choose_conflict(conflicts: List[tuple], agents: dict) -> tuple:
+        """
+        优先拆分发生在某台机器人终点上的冲突：这类冲突只能靠推迟到达解决，必然抬高代价下界，
+        先拆分可以避免在走廊中大量等价绕行方案上反复分支
+        """
+        for conflict in conflicts:
+            if conflict[0] == "vertex":
+                x, y = conflict[3]
+                for rid in (conflict[1], conflict[2]):
+                    goal = agents[rid][1]
+                    if goal.x == x and goal.y == y:
+                        return conflict
+        return conflicts[0]
+
+    @staticmethod
+    def _split(conflict: tuple) -> List[Tuple[str, Optional[tuple], Optional[tuple]]]:
+        """把一个冲突拆成两个子节点各自新增的约束"""
+        if conflict[0] == "vertex":
+            _, a, b, (x, y), ta, tb = conflict
+            return [(a, (x, y, ta), None), (b, (x, y, tb), None)]
+        _, a, b, (x1, y1), (x2, y2), t = conflict
+        return [(a, None, (x1, y1, x2, y2, t)), (b, None, (x2, y2, x1, y1, t))]
+
+    def _occupancy(self, rid: str, path: List[Tuple[int, int]], agents: dict, horizon: int):
+        """按时间顺序给出机器人从起始tick到horizon的占用格子"""
+        t0 = agents[rid][2]
+        parks = agents[rid][3]
+        end = t0 + len(path) - 1
+        last = horizon if parks else min(horizon, end + self.table.goal_dwell)
+        for t in range(t0, last + 1):
+            index = t - t0
+            yield t, path[index] if index < len(path) else path[-1]
+
+    def _find_conflicts(self, paths: Dict[str, List[Tuple[int, int]]], agents: dict) -> List[tuple]:
+        """
+        检测联合路线中的冲突，冲突判定与预约表一致：非关键节点上时间差不超过slack即视为冲突
+        :return: 按时间排序的冲突列表
+        """
+        table = self.table
+        horizon = max(agents[rid][2] + len(path) - 1 for rid, path in paths.items()) + table.goal_dwell
+        visits: Dict[Tuple[int, int], List[Tuple[int, str]]] = {}
+        moves: Dict[Tuple[int, int, int, int, int], str] = {}
+        conflicts = []
+        for rid, path in paths.items():
+            previous = None
+            for t, cell in self._occupancy(rid, path, agents, horizon):
+                slack = 0 if cell in table.critical_cells else table.slack
+                for other_t, other in visits.get(cell, ()):
+                    if other != rid and abs(other_t - t) <= slack:
+                        conflicts.append(("vertex", rid, other, cell, t, other_t))
+                        break
+                visits.setdefault(cell, []).append((t, rid))
+                if previous is not None and previous != cell:
+                    other = moves.get((cell[0], cell[1], previous[0], previous[1], t))
+                    if other is not None and other != rid:
+                        conflicts.append(("edge", rid, other, previous, cell, t))
+                    moves[(previous[0], previous[1], cell[0], cell[1], t)] = rid
+                previous = cell
+        conflicts.sort(key=lambda c: min(c[4], c[5]) if c[0] == "vertex" else c[5])
+        return conflicts
+
+    def _low_level(self, rid: str, agents: dict, constraints: Tuple[frozenset, frozenset],
+                   other_paths: Dict[str, List[Tuple[int, int]]], w: float):
+        """
+        带约束的时空A*（w > 1时为focal搜索，以与其他机器人路线的冲突数作为次级启发）
+        :return: (路线格子列表, 代价下界)，无解返回None
+        """
+        start, goal, t0, parks = agents[rid]
+        vertex_cons, edge_cons = constraints
+        table = self.table
+        width, height = self.width, self.height
+        gx, gy = goal.x, goal.y
+        static_obstacles = self.static_obstacles
+        if (gx, gy) in static_obstacles:
+            return None
+        # 起始tick所在的格子无法回避：冲突拆分到起点上的子节点无解，保留它只会带着同样的冲突反复分支
+        if (start.x, start.y, t0) in vertex_cons:
+            return None
+
+        parked = table.parked.get((gx, gy))
+        if parked is not None and parked[0] != rid:
+            return None
+
+        # 其他机器人当前路线的占用，用于统计冲突数
+        occupied = {}
+        for other, path in other_paths.items():
+            other_t0 = agents[other][2]
+            for index, cell in enumerate(path):
+                occupied[(cell[0], cell[1], other_t0 + index)] = True
+
+        goal_cons = [t for x, y, t in vertex_cons if x == gx and y == gy]
+        last_goal_con = max(goal_cons) if goal_cons else -1
+        latest_con = max([t for x, y, t in vertex_cons] + [c[4] for c in edge_cons] + [t0])
+
+        field = self.distance_fields.get(goal) if self.distance_fields is not None else None
+        if field is not None:
+            h0 = field[start.y * width + start.x]
+            if h0 < 0:
+                return None
+        else:
+            h0 = self.manhattan_distance(start.x, start.y, gx, gy)
+        t_limit = t0 + h0 + width + height
+        t_cap = max(table.latest_time + table.slack + 1, latest_con + 1, t0 + 1)
+
+        counter = 0
+        start_state = (start.x, start.y, t0)
+        came_from = {start_state: None}
+        conflicts_of = {start_state: 0}
+        # 超过t_cap后时间层合并，g值单独记录
+        g_of = {start_state: 0}
+        open_list = [(h0, counter, start_state)]
+        focal_list = [(0, h0, counter, start_state)]
+        closed = set()
+        f_min = h0
+
+        while focal_list:
+            _, f, _, state = heapq.heappop(focal_list)
+            if state in closed:
+                continue
+            closed.add(state)
+            x, y, t = state
+            g = g_of[state]
+
+            if x == gx and y == gy and t > last_goal_con and self._goal_holdable(rid, x, y, t, vertex_cons):
+                path = []
+                while state is not None:
+                    path.append((state[0], state[1]))
+                    state = came_from[state]
+                return path[::-1], f_min
+
+            if t0 + g + 1 <= t_limit:
+                nt = min(t + 1, t_cap)
+                for dx, dy in self.moves:
+                    nx, ny = x + dx, y + dy
+                    if not (0 <= nx < width and 0 <= ny < height) or (nx, ny) in static_obstacles:
+                        continue
+                    next_state = (nx, ny, nt)
+                    if next_state in came_from:
+                        continue
+                    if (nx, ny, t + 1) in vertex_cons or not table.is_cell_free(nx, ny, t + 1, rid):
+                        continue
+                    if dx or dy:
+                        if (x, y, nx, ny, t + 1) in edge_cons or not table.is_edge_free(x, y, nx, ny, t + 1, rid):
+                            continue
+                    if field is not None:
+                        h = field[ny * width + nx]
+                        if h < 0:
+                            continue
+                    else:
+                        h = self.manhattan_distance(nx, ny, gx, gy)
+                    came_from[next_state] = state
+                    g_of[next_state] = g + 1
+                    conflicts = conflicts_of[state] + (1 if (nx, ny, t0 + g + 1) in occupied else 0)
+                    conflicts_of[next_state] = conflicts
+                    nf = g + 1 + h
+                    counter += 1
+                    heapq.heappush(open_list, (nf, counter, next_state))
+                    if nf <= w * f_min:
+                        heapq.heappush(focal_list, (conflicts, nf, counter, next_state))
+
+            # 开放列表最小f值增大时，把新进入界限的节点补充到focal列表
+            while open_list and open_list[0][2] in closed:
+                heapq.heappop(open_list)
+            if not open_list:
+                break
+            new_f_min = open_list[0][0]
+            if new_f_min > f_min or not focal_list:
+                old_bound = w * f_min if focal_list else -1
+                f_min = new_f_min
+                for nf, entry_counter, entry_state in open_list:
+                    if entry_state not in closed and old_bound < nf <= w * f_min:
+                        heapq.heappush(focal_list, (conflicts_of[entry_state], nf, entry_counter, entry_state))
+
+        return None
+
+    def _goal_holdable(self, rid: str, x: int, y: int, t: int, vertex_cons: frozenset) -> bool:
+        for dt in range(1, self.table.goal_dwell + 1):
+            if (x, y, t + dt) in vertex_cons or not self.table.is_cell_free(x, y, t + dt, rid):
+                return False
+        return True
@@ -0,0 +1,176 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import heapq
+from Direction import Direction
+from Position import Position
+
+INF = float("inf")
+
+
+class DStarLite:
+    """
+    增量式路径规划：D* Lite（Koenig & Likhachev）
+    从终点反向搜索并在多次规划之间保留 g / rhs 值，障碍物变化或起点移动时
+    只修复受变化格子影响的部分，每台机器人、每个终点各保留一个实例
+    """
+
+    def __init__(self, width: int, height: int, goal: Position,
+                 static_obstacles: Iterable[Tuple[int, int]] = ()):
+        """
+        :param width: 仓库宽
+        :param height: 仓库高
+        :param goal: 终点，终点改变时需要新建实例
+        :param static_obstacles: 静态障碍物（货架、墙）坐标，不作为相邻格子，不参与每次规划的障碍物比较
+        """
+        self.width = width
+        self.height = height
+        self.goal = (goal.x, goal.y)
+        self.directions = Direction.get_directions()
+        self.static_obstacles = frozenset(static_obstacles)
+        self.obstacles: Set[Tuple[int, int]] = set()
+        self.g: Dict[Tuple[int, int], float] = {}
+        self.rhs: Dict[Tuple[int, int], float] = {self.goal: 0}
+        self.km = 0
+        self.start: Optional[Tuple[int, int]] = None
+        self._last_start: Optional[Tuple[int, int]] = None
+        # 优先队列使用惰性删除：_open_keys 记录每个格子当前有效的键
+        self._open: List[Tuple[float, float, Tuple[int, int]]] = []
+        self._open_keys: Dict[Tuple[int, int], Tuple[float, float]] = {}
+        # 上一次规划的起点不可达：在起点不变且没有障碍物被移除前必然仍不可达
+        self._unreachable = False
+        # 累计展开的格子数，用于比较增量修复与从头搜索的代价
+        self.expansions = 0
+
+    @staticmethod
+    def manhattan_distance(a: Tuple[int, int], b: Tuple[int, int]) -> int:
+        return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+    def plan(self, start: Position, obstacles: Set[Tuple[int, int]]) -> List[Position]:
+        """
+        以当前障碍物规划从start到终点的路径，只修复与上一次规划相比发生变化的格子
+        :param start: 当前位置
+        :param obstacles: 当前障碍物坐标集合
+        :return: 路径列表（不包含起点），不可达时为空列表
+        """
+        start_cell = (start.x, start.y)
+        if start_cell == self.goal or self.goal in self.static_obstacles:
+            return []
+        # 起点四周都是障碍物时直接返回：反向搜索要展开终点所在的整个连通区域才能发现起点不可达
+        if all(neighbor in obstacles for neighbor in self._neighbors(start_cell)):
+            return []
+
+        if self.start is None:
+            self.start = self._last_start = start_cell
+            self.obstacles = set(obstacles)
+            self._push(self.goal)
+        else:
+            if self._unreachable and start_cell == self.start and self.obstacles <= obstacles:
+                # 新增的障碍物留到下一次规划时再与其他变化一起修复
+                return []
+            changed = self.obstacles ^ obstacles
+            if start_cell != self.start or changed:
+                self.start = start_cell
+                self.km += self.manhattan_distance(self._last_start, start_cell)
+                self._last_start = start_cell
+            if changed:
+                self.obstacles = set(obstacles)
+                for cell in changed:
+                    self._update_vertex(cell)
+                    for neighbor in self._neighbors(cell):
+                        self._update_vertex(neighbor)
+
+        self._compute_shortest_path()
+        path = self._extract_path()
+        self._unreachable = not path
+        return path
+
+    def _neighbors(self, cell: Tuple[int, int]):
+        x, y = cell
+        static_obstacles = self.static_obstacles
+        for dx, dy in self.directions:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < self.width and 0 <= ny < self.height and (nx, ny) not in static_obstacles:
+                yield nx, ny
+
+    def _cost(self, a: Tuple[int, int], b: Tuple[int, int]) -> float:
+        """相邻格子间的移动代价，进出障碍物格子为无穷大"""
+        if a in self.obstacles or b in self.obstacles:
+            return INF
+        return 1
+
+    def _key(self, cell: Tuple[int, int]) -> Tuple[float, float]:
+        best = min(self.g.get(cell, INF), self.rhs.get(cell, INF))
+        return best + self.manhattan_distance(self.start, cell) + self.km, best
+
+    def _push(self, cell: Tuple[int, int]):
+        key = self._key(cell)
+        self._open_keys[cell] = key
+        heapq.heappush(self._open, (key[0], key[1], cell))
+
+    def _top_key(self) -> Tuple[float, float]:
+        open_list = self._open
+        while open_list:
+            k1, k2, cell = open_list[0]
+            if self._open_keys.get(cell) == (k1, k2):
+                return k1, k2
+            heapq.heappop(open_list)
+        return INF, INF
+
+    def _update_vertex(self, cell: Tuple[int, int]):
+        if cell != self.goal:
+            g = self.g
+            best = INF
+            for neighbor in self._neighbors(cell):
+                cost = self._cost(cell, neighbor) + g.get(neighbor, INF)
+                if cost < best:
+                    best = cost
+            self.rhs[cell] = best
+        self._open_keys.pop(cell, None)
+        if self.g.get(cell, INF) != self.rhs.get(cell, INF):
+            self._push(cell)
+
+    def _compute_shortest_path(self):
+        g, rhs = self.g, self.rhs
+        start = self.start
+        while True:
+            top = self._top_key()
+            start_key = self._key(start)
+            if top >= start_key and rhs.get(start, INF) == g.get(start, INF):
+                return
+            if top == (INF, INF):
+                return
+            _, _, cell = heapq.heappop(self._open)
+            del self._open_keys[cell]
+            self.expansions += 1
+            new_key = self._key(cell)
+            if top < new_key:
+                self._push(cell)
+            elif g.get(cell, INF) > rhs.get(cell, INF):
+                g[cell] = rhs[cell]
+                for neighbor in self._neighbors(cell):
+                    self._update_vertex(neighbor)
+            else:
+                g[cell] = INF
+                self._update_vertex(cell)
+                for neighbor in self._neighbors(cell):
+                    self._update_vertex(neighbor)
+
+    def _extract_path(self) -> List[Position]:
+        """沿 代价 + g 最小的相邻格子从起点走到终点"""
+        g = self.g
+        current = self.start
+        if g.get(current, INF) == INF:
+            return []
+        path = []
+        for _ in range(self.width * self.height):
+            if current == self.goal:
+                return path
+            best, best_cost = None, INF
+            for neighbor in self._neighbors(current):
+                cost = self._cost(current, neighbor) + g.get(neighbor, INF)
+                if cost < best_cost:
+                    best, best_cost = neighbor, cost
+            if best is None:
+                return []
+            path.append(Position(best[0], best[1]))
+            current = best
+        return []
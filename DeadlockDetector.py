@@ -0,0 +1,503 @@
+import heapq
+import logging
+from collections import deque
+from typing import Deque, Dict, FrozenSet, Hashable, List, Optional, Set, Tuple
+from Direction import Direction
+from Position import Position
+from TickProfiler import percentile
+
+logger = logging.getLogger(__name__)
+
+
+class Deadlock:
+    """等待图中的一个环，或排在同一台停滞机器人之后的长队列（链）"""
+
+    def __init__(self, kind: str, members: FrozenSet[str], head: Optional[str], appeared_at: int):
+        """
+        :param kind: "cycle" 或 "chain"
+        :param members: 环上的机器人，或链头及所有（直接或间接）等待它的机器人
+        :param head: 链头（不等待任何机器人的停滞机器人），环为None
+        :param appeared_at: 首次出现的tick
+        """
+        self.kind = kind
+        self.members = members
+        self.head = head
+        self.appeared_at = appeared_at
+        self.confirmed = False  # 持续patience个tick后确认为死锁
+        self.attempts = 0  # 已执行的处理次数
+        self.last_attempt = appeared_at
+        self.closed_at: Optional[int] = None
+
+    @property
+    def key(self) -> Hashable:
+        """环以成员集合区分，链以链头区分"""
+        return self.members if self.kind == "cycle" else self.head
+
+
+class DeadlockDetector:
+    """
+    基于等待图（wait-for graph）的死锁检测与处理，每个tick所有机器人行动后调用一次update
+    每台机器人最多等待一台机器人（想进入的下一格的当前占用者），等待图中每个节点的出度不超过1：
+    有路线时看future_route[0]；没有路线时按到目标的距离搜索附近的空闲格子，找出挡在前面的机器人
+    增量检测：只从本tick出边发生变化的机器人出发沿出边查找新出现的环，已记录的环在成员的出边都未变化时保持；
+    链按链头记录，只重新统计出边变化所涉及的链头
+    环或链持续patience个tick后确认为死锁并按policy处理，仍未解除则每隔patience个tick按
+    priority_yield -> back_off -> joint_replan 的顺序升级处理方式；
+    处理过程中短暂消失又在patience个tick内重新出现的环或链视为同一次死锁
+    """
+
+    # 处理方式，按升级顺序排列；"none" 只检测与统计，不做处理
+    POLICIES = ("none", "priority_yield", "back_off", "joint_replan")
+
+    def __init__(self, warehouse, policy: str = "back_off", patience: int = 3, chain_length: int = 4,
+                 max_push: int = 8, max_group: int = 6, window: int = 1000):
+        """
+        :param warehouse: 所属仓库
+        :param policy: 处理方式
+                       "priority_yield" 优先级最高的成员立即重新规划，其余成员原地让行hold_ticks个tick；
+                       "back_off" 有空闲相邻格子的成员（链头优先，其次按优先级从低到高）退到该格子并停留
+                       hold_ticks个tick，都没有时沿最近的空闲格子方向把一列机器人整体推开；
+                       "joint_replan" 成员与等待它们的机器人（最多max_group台）用ECBS联合重新规划，无解时退回back_off
+        :param patience: 环或链持续多少个tick确认为死锁，也是两次处理之间的间隔
+        :param chain_length: 链上至少多少台机器人才视为死锁
+        :param max_push: back_off 推开一列机器人时最多经过的格子数
+        :param max_group: joint_replan 联合规划的最大机器人数
+        :param window: 保留最近多少次死锁的持续时间用于计算分位数
+        """
+        if policy not in self.POLICIES:
+            raise ValueError(f"unknown deadlock policy: {policy}")
+        self.wHouse = warehouse
+        self.policy = policy
+        self.patience = patience
+        self.chain_length = chain_length
+        self.max_push = max_push
+        self.max_group = max_group
+        self.hold_ticks = 2
+        # 判断没有路线的机器人被谁挡住时最多展开的空闲格子数
+        self.region_limit = 32
+        # 退入的空闲格子至少与多少个空闲格子连通，避免退进死角
+        self.open_size = 6
+
+        # 等待图：rid -> 正在等待的机器人，以及反向的 rid -> 等待它的机器人
+        self.waits_for: Dict[str, str] = {}
+        self.waiters: Dict[str, Set[str]] = {}
+        # rid -> 建立当前出边时机器人所在的格子，机器人移动或出边变化都视为出边变化
+        self._edge_cell: Dict[str, Tuple[int, int]] = {}
+        # rid -> (占用索引版本, 位置, 目标, 挡住它的机器人)；没有路线的机器人在周围没有变化时不重复搜索
+        self._blocker_cache: Dict[str, tuple] = {}
+        # 环：成员集合 -> 记录；链：链头 -> 记录
+        self.cycles: Dict[FrozenSet[str], Deadlock] = {}
+        self.chains: Dict[str, Deadlock] = {}
+        # 链头 -> 成为链头时所在的格子
+        self._head_cell: Dict[str, Tuple[int, int]] = {}
+        # 刚消失的记录，patience个tick内重新出现时恢复
+        self._closing: Dict[Hashable, Deadlock] = {}
+
+        # 统计
+        self.detected = {"cycle": 0, "chain": 0}
+        self.resolutions = {policy: 0 for policy in self.POLICIES[1:]}
+        self.failed_joint_replans = 0
+        self.resolved = 0
+        self.total_ticks = 0
+        self.max_ticks = 0
+        self.durations: Deque[int] = deque(maxlen=window)
+
+    def update(self) -> List[Deadlock]:
+        """
+        根据机器人当前位置与路线更新等待图，检测并处理死锁
+        :return: 本tick处理过的死锁
+        """
+        tick = self.wHouse.tick_count
+        changed = self._update_edges()
+
+        for key, record in list(self.cycles.items()):
+            if not changed.isdisjoint(record.members):
+                del self.cycles[key]
+                self._close(record, tick)
+        for rid in changed:
+            cycle = self._cycle_from(rid)
+            if cycle is not None and cycle not in self.cycles:
+                self.cycles[cycle] = self._open("cycle", cycle, None, tick)
+        self._update_chains(changed, tick)
+
+        for key, record in list(self._closing.items()):
+            if tick - record.closed_at > self.patience:
+                del self._closing[key]
+                self._finish(record)
+
+        handled = []
+        for record in list(self.cycles.values()) + list(self.chains.values()):
+            if tick - record.last_attempt < self.patience:
+                continue
+            if not record.confirmed:
+                record.confirmed = True
+                self.detected[record.kind] += 1
+                self.wHouse.profiler.count("deadlocks")
+                logger.info("检测到死锁（%s）：%s", record.kind, sorted(record.members))
+            if self.policy != "none":
+                self._resolve(record)
+                handled.append(record)
+            record.last_attempt = tick
+        return handled
+
+    def _update_edges(self) -> Set[str]:
+        """重新计算每台机器人的出边，返回出边发生变化（新增、改变或消失）的机器人"""
+        wh = self.wHouse
+        changed = set()
+        for rid, robot in wh.robots.items():
+            blocker = self._blocker(rid, robot)
+            cell = (robot.position.x, robot.position.y)
+            old = self.waits_for.get(rid)
+            if blocker == old and (blocker is None or self._edge_cell.get(rid) == cell):
+                continue
+            changed.add(rid)
+            if old is not None:
+                self._remove_waiter(old, rid)
+            if blocker is None:
+                self.waits_for.pop(rid, None)
+                self._edge_cell.pop(rid, None)
+            else:
+                self.waits_for[rid] = blocker
+                self._edge_cell[rid] = cell
+                self.waiters.setdefault(blocker, set()).add(rid)
+        # 已移除的机器人
+        for rid in [rid for rid in self.waits_for if rid not in wh.robots]:
+            changed.add(rid)
+            self._remove_waiter(self.waits_for.pop(rid), rid)
+            self._edge_cell.pop(rid, None)
+        for rid in [rid for rid in self.waiters if rid not in wh.robots]:
+            changed.add(rid)
+            del self.waiters[rid]
+        for rid in [rid for rid in self._blocker_cache if rid not in wh.robots]:
+            del self._blocker_cache[rid]
+        return changed
+
+    def _remove_waiter(self, blocker: str, rid: str):
+        waiters = self.waiters.get(blocker)
+        if waiters is not None:
+            waiters.discard(rid)
+            if not waiters:
+                del self.waiters[blocker]
+
+    def _blocker(self, rid: str, robot) -> Optional[str]:
+        """机器人想进入的下一格的占用者，不在等待其他机器人时返回None"""
+        position = robot.position
+        if robot.future_route:
+            step = robot.future_route[0]
+            if step != position:
+                occupant = self.wHouse.occupancy.robot_at(step)
+                return occupant if occupant != rid else None
+            if not self.wHouse.dynamic_planner.is_holding(rid):
+                return None  # 路线中计划好的原地等待
+            # 规划失败后的原地等待与没有路线相同，按到目标的搜索找出挡路的机器人
+        target = robot.target
+        if not isinstance(target, Position) or target == position:
+            return None
+        version = self.wHouse.occupancy.version
+        cached = self._blocker_cache.get(rid)
+        if cached is not None and cached[0] == version and cached[1] == position and cached[2] == target:
+            return cached[3]
+        blocker = self._search_blocker(position, target)
+        self._blocker_cache[rid] = (version, position, target, blocker)
+        return blocker
+
+    def _search_blocker(self, position: Position, target: Position) -> Optional[str]:
+        """
+        没有路线（规划失败或等待重新规划）的机器人：从所在格子出发，按到目标的距离在空闲格子中做最佳优先搜索
+        （最多展开region_limit格）。能到达目标则不在等待；目标被其他机器人占用时等待该机器人；
+        否则等待挡在前面的机器人：搜索遇到的机器人中离目标最近、且比到达过的所有空闲格子都更近的一台
+        """
+        wh = self.wHouse
+        occupied = wh.occupancy.cell_to_robot
+        obstacles = wh.distance_fields.static_obstacles
+        field = wh.distance_fields.get(target)
+        width, height = wh.width, wh.height
+        gx, gy = target.x, target.y
+
+        def distance(x, y):
+            if field is not None and field[y * width + x] >= 0:
+                return field[y * width + x]
+            return abs(x - gx) + abs(y - gy)
+
+        start = (position.x, position.y)
+        nearest_free = distance(*start)
+        blocker, blocker_distance = None, nearest_free
+        seen = {start}
+        open_list = [(nearest_free, start)]
+        expanded = 0
+        while open_list and expanded < self.region_limit:
+            _, (x, y) = heapq.heappop(open_list)
+            expanded += 1
+            for dx, dy in Direction.get_directions():
+                nx, ny = x + dx, y + dy
+                cell = (nx, ny)
+                if cell in seen or not (0 <= nx < width and 0 <= ny < height) or cell in obstacles:
+                    continue
+                seen.add(cell)
+                occupant = occupied.get(cell)
+                if nx == gx and ny == gy:
+                    return occupant
+                d = distance(nx, ny)
+                if occupant is not None:
+                    if d < blocker_distance:
+                        blocker, blocker_distance = occupant, d
+                else:
+                    nearest_free = min(nearest_free, d)
+                    heapq.heappush(open_list, (d, cell))
+        return blocker if blocker_distance < nearest_free else None
+
+    def _cycle_from(self, rid: str) -> Optional[FrozenSet[str]]:
+        """沿出边从rid出发，回到路径上已经过的机器人时返回该环的成员"""
+        path = []
+        index = {}
+        current = rid
+        while current is not None and current not in index:
+            index[current] = len(path)
+            path.append(current)
+            current = self.waits_for.get(current)
+        if current is None:
+            return None
+        return frozenset(path[index[current]:])
+
+    def _update_chains(self, changed: Set[str], tick: int):
+        """重新统计出边变化所涉及的链头，链头及等待它的机器人不少于chain_length台时记录为链"""
+        heads = set()
+        for rid in changed:
+            if rid in self.chains:
+                heads.add(rid)
+            current = rid
+            seen = set()
+            while current in self.waits_for and current not in seen:
+                seen.add(current)
+                current = self.waits_for[current]
+            if current not in self.waits_for:
+                heads.add(current)
+        for head, record in self.chains.items():
+            # 链头移动过则队列已开始前进；成员的出边变化（含被移除）时重新统计成员
+            robot = self.wHouse.robots.get(head)
+            if (robot is None or (robot.position.x, robot.position.y) != self._head_cell[head] or
+                    not changed.isdisjoint(record.members)):
+                heads.add(head)
+
+        for head in heads:
+            robot = self.wHouse.robots.get(head)
+            members = self._tree(head) if robot is not None and head not in self.waits_for else set()
+            record = self.chains.get(head)
+            if len(members) >= self.chain_length:
+                cell = (robot.position.x, robot.position.y)
+                if record is not None and self._head_cell[head] == cell:
+                    record.members = frozenset(members)
+                    continue
+                if record is not None:
+                    self._close(record, tick)
+                self.chains[head] = self._open("chain", frozenset(members), head, tick)
+                self._head_cell[head] = cell
+            elif record is not None:
+                del self.chains[head]
+                del self._head_cell[head]
+                self._close(record, tick)
+
+    def _tree(self, head: str) -> Set[str]:
+        """链头及所有直接或间接等待它的机器人"""
+        members = {head}
+        queue = deque([head])
+        while queue:
+            for waiter in self.waiters.get(queue.popleft(), ()):
+                if waiter not in members:
+                    members.add(waiter)
+                    queue.append(waiter)
+        return members
+
+    def _open(self, kind: str, members: FrozenSet[str], head: Optional[str], tick: int) -> Deadlock:
+        """新出现的环或链；刚消失不久的同一个环或链（如处理过程中短暂变化）恢复原记录"""
+        key = members if kind == "cycle" else head
+        record = self._closing.pop(key, None)
+        if record is None:
+            return Deadlock(kind, members, head, tick)
+        record.members = members
+        record.closed_at = None
+        return record
+
+    def _close(self, record: Deadlock, tick: int):
+        """环或链消失，patience个tick内没有重新出现才算解除"""
+        record.closed_at = tick
+        previous = self._closing.get(record.key)
+        if previous is not None:
+            self._finish(previous)
+        self._closing[record.key] = record
+
+    def _finish(self, record: Deadlock):
+        """死锁解除，已确认的死锁记录持续时间"""
+        if not record.confirmed:
+            return
+        duration = record.closed_at - record.appeared_at
+        self.resolved += 1
+        self.total_ticks += duration
+        self.max_ticks = max(self.max_ticks, duration)
+        self.durations.append(duration)
+        logger.info("死锁（%s）解除，持续%d个tick：%s", record.kind, duration, sorted(record.members))
+
+    def _resolve(self, record: Deadlock):
+        """按处理方式与已处理次数选择本次的处理方式"""
+        order = self.POLICIES[self.POLICIES.index(self.policy):]
+        policy = order[record.attempts % len(order)]
+        record.attempts += 1
+        self.resolutions[policy] += 1
+        with self.wHouse.profiler.phase("deadlock_resolve"):
+            if policy == "priority_yield":
+                self._priority_yield(record)
+            elif policy == "joint_replan" and self._joint_replan(record):
+                pass
+            else:
+                self._back_off(record)
+
+    def _by_priority(self, members) -> List[str]:
+        """成员按优先级从低到高排序，优先级相同时按ID排序"""
+        planner = self.wHouse.dynamic_planner
+        return sorted(members, key=lambda rid: (planner.priority_calculator(rid), rid))
+
+    def _priority_yield(self, record: Deadlock):
+        """优先级最高的成员立即重新规划，其余成员原地让行，规划时视为障碍"""
+        planner = self.wHouse.dynamic_planner
+        ordered = self._by_priority(record.members)
+        winner = ordered[-1]
+        for rid in ordered[:-1]:
+            position = self.wHouse.robots[rid].position
+            planner.force_route(rid, [position] * self.hold_ticks)
+        planner.clear_backoff(winner)
+        planner.set_route(winner)
+        logger.info("死锁处理：机器人%s优先通行，%s让行", winner, ordered[:-1])
+
+    def _is_free(self, x: int, y: int) -> bool:
+        """在仓库内，没有机器人、不是静态障碍物也不是支付台"""
+        wh = self.wHouse
+        if not (0 <= x < wh.width and 0 <= y < wh.height):
+            return False
+        cell = (x, y)
+        return (cell not in wh.occupancy.cell_to_robot and
+                cell not in wh.distance_fields.static_obstacles and
+                cell not in wh.station_cells)
+
+    def _is_open(self, cell: Tuple[int, int]) -> bool:
+        """空闲格子至少与open_size个空闲格子连通，退入后不会把自己困在死角"""
+        seen = {cell}
+        queue = deque([cell])
+        while queue:
+            x, y = queue.popleft()
+            for dx, dy in Direction.get_directions():
+                neighbor = (x + dx, y + dy)
+                if neighbor not in seen and self._is_free(*neighbor):
+                    seen.add(neighbor)
+                    if len(seen) >= self.open_size:
+                        return True
+                    queue.append(neighbor)
+        return False
+
+    def _push_path(self, rid: str) -> Optional[List[Tuple[int, int]]]:
+        """
+        从机器人所在格子出发到最近的连通空闲格子（见_is_open）的最短路径，不超过max_push格
+        :return: 格子列表，第一个为机器人所在格子，最后一个为连通的空闲格子；找不到时返回None
+        """
+        start = self.wHouse.occupancy.cell_of(rid)
+        if start is None:
+            return None
+        occupied = self.wHouse.occupancy.cell_to_robot
+        came_from = {start: None}
+        queue = deque([(start, 0)])
+        while queue:
+            (x, y), depth = queue.popleft()
+            if depth >= self.max_push:
+                continue
+            for dx, dy in Direction.get_directions():
+                cell = (x + dx, y + dy)
+                if cell in came_from:
+                    continue
+                free = self._is_free(*cell)
+                if not free and cell not in occupied:
+                    continue
+                came_from[cell] = (x, y)
+                if free and self._is_open(cell):
+                    path = [cell]
+                    while came_from[path[-1]] is not None:
+                        path.append(came_from[path[-1]])
+                    path.reverse()
+                    return path
+                queue.append((cell, depth + 1))
+        return None
+
+    def _back_off(self, record: Deadlock):
+        """
+        有连通空闲相邻格子的成员退到该格子（链头优先，其次按优先级从低到高）；
+        都没有时选推开路径最短的成员，把路径上的机器人依次沿路径推到下一台机器人的位置，
+        最后一台推到空闲格子；离空闲格子越远的机器人多等待一个tick，保证进入的格子已经空出
+        """
+        candidates = self._by_priority(record.members)
+        if record.head is not None:
+            candidates.remove(record.head)
+            candidates.insert(0, record.head)
+        best = None
+        for rid in candidates:
+            path = self._push_path(rid)
+            if path is not None and (best is None or len(path) < len(best)):
+                best = path
+                if len(path) == 2:
+                    break
+        planner = self.wHouse.dynamic_planner
+        for rid in record.members:
+            planner.clear_backoff(rid)
+        if best is None:
+            logger.info("死锁处理：%s附近没有可退入的空闲格子", sorted(record.members))
+            return
+
+        occupied = self.wHouse.occupancy.cell_to_robot
+        stops = [i for i, cell in enumerate(best) if cell in occupied] + [len(best) - 1]
+        pushed = []
+        for n in range(len(stops) - 2, -1, -1):
+            start, end = stops[n], stops[n + 1]
+            rid = occupied[best[start]]
+            wait = len(stops) - 2 - n
+            route = [Position(*best[start])] * wait + [Position(*cell) for cell in best[start + 1:end + 1]]
+            # 退到空闲格子的机器人停留片刻，让被它挡住的机器人先通过
+            if n == len(stops) - 2:
+                route += [route[-1]] * self.hold_ticks
+            planner.force_route(rid, route)
+            pushed.append(rid)
+        logger.info("死锁处理：机器人%s依次退开，空出格子%s", pushed, best[0])
+
+    def _joint_replan(self, record: Deadlock) -> bool:
+        """成员与等待它们的机器人（按等待关系由近及远，最多max_group台）联合重新规划"""
+        group = sorted(record.members, key=lambda rid: (rid != record.head, rid))[:self.max_group]
+        queue = deque(group)
+        seen = set(group)
+        while queue and len(group) < self.max_group:
+            for waiter in sorted(self.waiters.get(queue.popleft(), ())):
+                if waiter not in seen and len(group) < self.max_group:
+                    seen.add(waiter)
+                    group.append(waiter)
+                    queue.append(waiter)
+        if self.wHouse.dynamic_planner.solve_jointly(group):
+            logger.info("死锁处理：%s联合重新规划", group)
+            return True
+        self.failed_joint_replans += 1
+        return False
+
+    def active(self) -> List[Deadlock]:
+        """当前已确认且尚未解除的死锁"""
+        return [record for record in list(self.cycles.values()) + list(self.chains.values())
+                if record.confirmed]
+
+    def report(self) -> Dict[str, object]:
+        """死锁次数与持续时间（tick）统计"""
+        ordered = sorted(self.durations)
+        return {
+            "detected": sum(self.detected.values()),
+            "cycles": self.detected["cycle"],
+            "chains": self.detected["chain"],
+            "resolved": self.resolved,
+            "active": len(self.active()),
+            "mean_ticks": round(self.total_ticks / self.resolved, 2) if self.resolved else 0.0,
+            "p95_ticks": percentile(ordered, 0.95),
+            "max_ticks": self.max_ticks,
+            "resolutions": dict(self.resolutions),
+            "failed_joint_replans": self.failed_joint_replans,
+        }
@@ -0,0 +1,227 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+from Direction import Direction
+from Position import Position
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryQueue:
+    """
+    支付台交付预约系统：
+    携带货物的机器人进入支付台radius步以内时按先到先申请的原则预约交付时间窗 [t, t+1]，
+    预约后在支付台入口后方的缓冲车道上按时间窗顺序排队（每个缓冲格子只停一台机器人），
+    队首依次获准进入支付台，交付后经出口格子与出口车道离开
+    缓冲车道与出口车道从空闲格子池中预留，不会生成货架，也不会作为随机停靠目标
+    有多个支付台时每个支付台一个队列，只为选择了该支付台的机器人预约
+    """
+
+    # 每台机器人占用支付台的估计tick数：进入一个tick，交付并离开一个tick
+    service_ticks = 2
+
+    def __init__(self, warehouse, station: Position, radius: int = 6, lane_length: int = 5,
+                 exit_length: int = 2):
+        """
+        :param warehouse: 所属仓库
+        :param station: 支付台位置
+        :param radius: 距支付台多少步以内申请预约（不小于3）
+        :param lane_length: 缓冲车道的格子数，第一个格子为与支付台相邻的入口
+        :param exit_length: 出口格子之后强制经过的出口车道格子数
+        """
+        self.wHouse = warehouse
+        self.station = station
+        self.radius = max(3, radius)
+        self.slot_ticks = 1
+
+        self.lane, self.exits, self.exit_lane = self._layout(lane_length, exit_length)
+        for cell in self.lane + self.exits + self.exit_lane:
+            warehouse.free_cells.occupy(cell)
+
+        # 已预约、按时间窗排序的机器人；队首之后第i台等在缓冲车道第i个格子
+        self.queue: List[str] = []
+        # rid -> (预约的tick, 预约的交付时间窗起点)
+        self.bookings: Dict[str, Tuple[int, int]] = {}
+        # 缓冲车道已满时排在后面的机器人原地等待的位置
+        self.holds: Dict[str, Position] = {}
+        # 已获准进入支付台、尚未交付的机器人
+        self.admitted: Optional[str] = None
+        self._last_slot = -1
+
+        # 统计
+        self.booked = 0
+        self.served = 0
+        self.total_wait = 0  # 预约到获准进入的tick数之和
+        self.total_delay = 0  # 获准进入晚于预约时间窗的tick数之和
+        self.ticks = 0
+        self.busy_ticks = 0  # 支付台上有机器人的tick数
+        self.queue_ticks = 0  # 每个tick队列长度之和
+        self.max_queue = 0
+
+    def _layout(self, lane_length: int, exit_length: int):
+        """
+        入口为支付台的第一个可用相邻格子，缓冲车道从入口沿远离支付台的方向延伸；
+        出口优先取与入口相对的相邻格子，没有时取其余相邻格子，出口车道沿远离支付台的方向延伸
+        障碍物、其他支付台以及已建队列的车道都不可用
+        """
+        wh = self.wHouse
+        taken = set(wh.distance_fields.static_obstacles) | wh.station_cells
+        for queue in wh.delivery_queues.values():
+            taken.update(queue.reserved_cells())
+        sx, sy = self.station.x, self.station.y
+
+        def usable(x, y):
+            return 0 <= x < wh.width and 0 <= y < wh.height and (x, y) not in taken
+
+        def straight(x, y, dx, dy, length):
+            cells = []
+            while len(cells) < length and usable(x, y):
+                cells.append((x, y))
+                x, y = x + dx, y + dy
+            return cells
+
+        directions = [(dx, dy) for dx, dy in Direction.get_directions() if usable(sx + dx, sy + dy)]
+        if not directions:
+            return [], [], []
+        ex, ey = directions[0]
+        lane = straight(sx + ex, sy + ey, ex, ey, lane_length)
+        others = [d for d in directions[1:] if d == (-ex, -ey)] + [d for d in directions[1:] if d != (-ex, -ey)]
+        exits = [(sx + dx, sy + dy) for dx, dy in others]
+        exit_lane = []
+        if others:
+            dx, dy = others[0]
+            exit_lane = straight(sx + 2 * dx, sy + 2 * dy, dx, dy, exit_length)
+        return lane, exits, exit_lane
+
+    def _distance(self, position: Position) -> int:
+        field = self.wHouse.distance_fields.get(self.station)
+        if field is not None:
+            return field[position.y * self.wHouse.width + position.x]
+        return abs(position.x - self.station.x) + abs(position.y - self.station.y)
+
+    def target_of(self, rid: str) -> Position:
+        """携带货物的机器人当前应前往的位置：获准进入或未预约时为支付台，否则为排队位置"""
+        if rid not in self.bookings:
+            return self.station
+        i = self.queue.index(rid)
+        if i < len(self.lane):
+            return Position(*self.lane[i])
+        return self.holds.get(rid, self.wHouse.robots[rid].position)
+
+    def holds_booking(self, rid: str) -> bool:
+        """机器人是否已预约（正在排队）或已获准进入该支付台"""
+        return rid in self.bookings or rid == self.admitted
+
+    def remove(self, rid: str):
+        """机器人被移除或不再携带货物时取消预约"""
+        if rid in self.bookings:
+            self.queue.remove(rid)
+            del self.bookings[rid]
+        self.holds.pop(rid, None)
+        if self.admitted == rid:
+            self.admitted = None
+
+    def update(self):
+        """每个tick调用一次：预约、放行队首、调整排队机器人的目标并统计"""
+        wh = self.wHouse
+        robots = wh.robots
+        tick = wh.tick_count
+
+        for rid in [rid for rid in self.queue if rid not in robots or robots[rid].carrying_item is None]:
+            self.remove(rid)
+        if self.admitted is not None:
+            robot = robots.get(self.admitted)
+            if robot is None or robot.carrying_item is None:
+                self.admitted = None
+
+        # 先到先申请：本tick新进入范围的机器人按距离排序，距离相同按ID
+        arrivals = []
+        for rid, station in wh.station_choice.items():
+            if station != self.station or rid in self.bookings or rid == self.admitted:
+                continue
+            robot = robots[rid]
+            d = self._distance(robot.position)
+            if 0 <= d <= self.radius:
+                arrivals.append((d, rid))
+        for d, rid in sorted(arrivals):
+            slot = max(tick + d, self._last_slot + self.slot_ticks)
+            self._last_slot = slot
+            self.bookings[rid] = (tick, slot)
+            self.queue.append(rid)
+            self.booked += 1
+            logger.debug("机器人%s预约交付时间窗[%d, %d]", rid, slot, slot + 1)
+
+        # 队首到达入口、且上一台获准进入的机器人已到达支付台（或已交付）后放行队首，
+        # 所有机器人都经入口进入，获准的机器人不会被入口上排队的机器人挡住
+        if (self.queue and (not self.lane or robots[self.queue[0]].position == self.lane[0]) and
+                (self.admitted is None or robots[self.admitted].position == self.station)):
+            rid = self.queue.pop(0)
+            booked_at, slot = self.bookings.pop(rid)
+            self.holds.pop(rid, None)
+            self.admitted = rid
+            self.served += 1
+            self.total_wait += tick - booked_at
+            self.total_delay += max(0, tick - slot)
+            self._retarget(rid, self.station)
+
+        planner = wh.dynamic_planner
+        reserved = planner.uses_reservations()
+        for i, rid in enumerate(self.queue):
+            if i < len(self.lane):
+                self.holds.pop(rid, None)
+                self._retarget(rid, Position(*self.lane[i]))
+            else:
+                hold = self.holds.setdefault(rid, robots[rid].position)
+                self._retarget(rid, hold)
+            # 不维护预约表时，路线下一步被排队或等待的机器人占用就重新规划，绕开车道上的其他机器人
+            route = robots[rid].future_route
+            if not reserved and route and wh.occupancy.robot_at(route[0]) not in (None, rid):
+                planner.cancel_route(rid)
+
+        self.ticks += 1
+        self.busy_ticks += wh.occupancy.is_occupied(self.station)
+        self.queue_ticks += len(self.queue)
+        self.max_queue = max(self.max_queue, len(self.queue))
+
+    def _retarget(self, rid: str, target: Position):
+        """
+        目标变化时立即重新规划：按放行与排队顺序依次规划，
+        维护预约表时后面的机器人可以预约前面的机器人刚让出的格子，整队同时前移
+        """
+        robot = self.wHouse.robots[rid]
+        if robot.target != target:
+            robot.target = target
+            self.wHouse.dynamic_planner.set_route(rid)
+
+    def depart(self, rid: str):
+        """
+        交付完成后立即离开支付台：经第一个空闲的出口格子离开（都被占用时仍取首选出口），
+        经首选出口时继续走完出口车道，之后按新目标重新规划
+        """
+        if self.admitted == rid:
+            self.admitted = None
+        if not self.exits:
+            return
+        occupancy = self.wHouse.occupancy
+        exit_cell = next((cell for cell in self.exits if not occupancy.is_occupied(Position(*cell))),
+                         self.exits[0])
+        route = [exit_cell]
+        if exit_cell == self.exits[0]:
+            route += self.exit_lane
+        self.wHouse.dynamic_planner.force_route(rid, [Position(*cell) for cell in route])
+
+    def reserved_cells(self) -> List[Tuple[int, int]]:
+        """缓冲车道、出口与出口车道的格子"""
+        return self.lane + self.exits + self.exit_lane
+
+    def report(self) -> Dict[str, object]:
+        """队列长度与支付台利用率统计"""
+        return {
+            "queue_length": len(self.queue),
+            "mean_queue_length": round(self.queue_ticks / self.ticks, 3) if self.ticks else 0.0,
+            "max_queue_length": self.max_queue,
+            "booked": self.booked,
+            "served": self.served,
+            "mean_wait_ticks": round(self.total_wait / self.served, 2) if self.served else 0.0,
+            "mean_slot_delay": round(self.total_delay / self.served, 2) if self.served else 0.0,
+            "station_utilization": round(self.busy_ticks / self.ticks, 4) if self.ticks else 0.0,
+        }
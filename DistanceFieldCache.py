@@ -0,0 +1,143 @@
+from collections import OrderedDict, deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from Direction import Direction
+from Position import Position
+
+
+class DistanceFieldCache:
+    """
+    固定目标（支付台、取货点）的距离场缓存
+    每个距离场由目标出发反向广度优先搜索得到，记录静态布局下每个格子到目标的真实步数，
+    可作为规划器的精确启发值，也可按距离递减O(1)地取出下一步
+    静态布局（障碍物）变化时所有距离场失效，按需重建
+    """
+
+    UNREACHABLE = -1
+
+    def __init__(self, width: int, height: int, transient_capacity: int = 32):
+        """
+        :param transient_capacity: field_for为未登记的终点（如随机停靠位置）缓存的临时距离场数量
+        """
+        self.width = width
+        self.height = height
+        self.static_obstacles: Set[Tuple[int, int]] = set()
+        # 静态布局版本号，每次布局变化加一
+        self.layout_version = 0
+        # 需要维护距离场的目标格子
+        self._targets: Set[Tuple[int, int]] = set()
+        # 目标格子 -> 距离场（按 y * width + x 展开的列表，不可达为UNREACHABLE）
+        self._fields: Dict[Tuple[int, int], List[int]] = {}
+        # 未登记终点的临时距离场，按最近使用顺序淘汰
+        self.transient_capacity = transient_capacity
+        self._transient: "OrderedDict[Tuple[int, int], List[int]]" = OrderedDict()
+        self.builds = 0
+
+    def set_static_obstacles(self, cells: Iterable[Tuple[int, int]]):
+        """替换静态障碍物，所有距离场失效"""
+        self.static_obstacles = set(cells)
+        self.invalidate()
+
+    def invalidate(self):
+        """静态布局变化：版本号加一并丢弃所有距离场，之后按需重建"""
+        self.layout_version += 1
+        self._fields.clear()
+        self._transient.clear()
+
+    def add_target(self, position: Position):
+        """目标出现时立即建立距离场"""
+        cell = (position.x, position.y)
+        self._targets.add(cell)
+        if cell not in self._fields:
+            self._fields[cell] = self._build(cell)
+
+    def remove_target(self, position: Position):
+        cell = (position.x, position.y)
+        self._targets.discard(cell)
+        self._fields.pop(cell, None)
+
+    def has_target(self, position: Position) -> bool:
+        return (position.x, position.y) in self._targets
+
+    def get(self, position: Position) -> Optional[List[int]]:
+        """
+        获取目标的距离场
+        :return: 展开后的距离列表，目标未登记时返回None
+        """
+        cell = (position.x, position.y)
+        if cell not in self._targets:
+            return None
+        field = self._fields.get(cell)
+        if field is None:
+            field = self._fields[cell] = self._build(cell)
+        return field
+
+    def field_for(self, position: Position) -> Optional[List[int]]:
+        """
+        任意终点的距离场：已登记的目标直接返回，否则建立临时距离场并缓存，
+        供需要在任意终点上使用精确启发值的规划器（如窗口化时空A*窗口外的部分）使用
+        :return: 没有静态障碍物时未登记的终点返回None，此时曼哈顿距离就是真实步数
+        """
+        field = self.get(position)
+        if field is not None or not self.static_obstacles:
+            return field
+        cell = (position.x, position.y)
+        field = self._transient.get(cell)
+        if field is not None:
+            self._transient.move_to_end(cell)
+            return field
+        field = self._transient[cell] = self._build(cell)
+        if len(self._transient) > self.transient_capacity:
+            self._transient.popitem(last=False)
+        return field
+
+    def distance(self, target: Position, position: Position) -> Optional[int]:
+        """position到target的真实步数，目标未登记时返回None，不可达返回UNREACHABLE"""
+        field = self.get(target)
+        if field is None:
+            return None
+        return field[position.y * self.width + position.x]
+
+    def next_steps(self, target: Position, position: Position) -> List[Position]:
+        """
+        沿距离场下降的所有相邻格子，每次查询只检查四个相邻格子
+        :return: 距离比当前格子小1的相邻格子，已在目标或目标未登记/不可达时为空
+        """
+        field = self.get(target)
+        if field is None:
+            return []
+        width, height = self.width, self.height
+        d = field[position.y * width + position.x]
+        if d <= 0:
+            return []
+        steps = []
+        for dx, dy in Direction.get_directions():
+            nx, ny = position.x + dx, position.y + dy
+            if 0 <= nx < width and 0 <= ny < height and field[ny * width + nx] == d - 1:
+                steps.append(Position(nx, ny))
+        return steps
+
+    def _build(self, target: Tuple[int, int]) -> List[int]:
+        """从目标出发反向广度优先搜索（四连通网格上边是对称的）"""
+        width, height = self.width, self.height
+        field = [self.UNREACHABLE] * (width * height)
+        tx, ty = target
+        if not (0 <= tx < width and 0 <= ty < height) or target in self.static_obstacles:
+            return field
+        obstacles = self.static_obstacles
+        directions = Direction.get_directions()
+        field[ty * width + tx] = 0
+        queue = deque([target])
+        while queue:
+            x, y = queue.popleft()
+            d = field[y * width + x] + 1
+            for dx, dy in directions:
+                nx, ny = x + dx, y + dy
+                if not (0 <= nx < width and 0 <= ny < height):
+                    continue
+                index = ny * width + nx
+                if field[index] != self.UNREACHABLE or (nx, ny) in obstacles:
+                    continue
+                field[index] = d
+                queue.append((nx, ny))
+        self.builds += 1
+        return field
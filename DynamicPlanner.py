@@ -1,12 +1,26 @@
 # from WareHouse_system import Warehouse
+import logging
 from math import sqrt
 from time import sleep
+from typing import List, Optional
 from AStar import AStar
 from AStarPlanning import AStarPlanning
+from PathCache import PathCache
+from ConflictBasedSearch import ConflictBasedSearch
+from Direction import Direction
+from DStarLite import DStarLite
+from HPAStar import HPAStar
 from Position import Position
+from ReservationTable import ReservationTable
+from SpaceTimeAStar import SpaceTimeAStar
+
+logger = logging.getLogger(__name__)
 
 
 class DynamicPlanner:
+    # 支持的路径规划方式，见 __init__ 中的说明
+    PLANNER_TYPES = ("space_time", "astar", "cbs", "ecbs", "greedy", "dstar_lite", "windowed", "hpa")
+
     def __init__(self, warehouse):
         self.wHouse = warehouse
         self.all_robot_count = len(self.wHouse.robots)
@@ -24,6 +38,73 @@ class DynamicPlanner:
         self.close_toDelivery_width = int(self.wHouse.width / 10) + 1
         self.close_toDelivery_height = int(self.wHouse.height / 10) + 1
 
+        """
+        路径规划方式：
+        "space_time" 时空A*，规划后在共享预约表中一次性预约整条路线
+        "astar" 以当前其他机器人位置作为静态障碍的A*
+        "cbs" / "ecbs" 对所有缺少有效路线的机器人用（有界次优的）基于冲突的搜索联合规划
+        "greedy" 目标有距离场时每次只沿距离场下降走一步（O(1)），否则退回 "astar"
+        "dstar_lite" 障碍物与 "astar" 相同，但每台机器人保留D* Lite搜索状态，只增量修复变化的格子
+        "windowed" 窗口化协同规划（WHCA*）：只在window_size个tick内与预约表解决冲突并预约，
+                   每replan_interval个tick按错开的相位滚动重新规划，每个tick只有约1/replan_interval的机器人规划
+        "hpa" 障碍物与 "astar" 相同，使用分层寻路（HPA*）：在预先计算的区域入口图上搜索再细化，适合很大的仓库；
+              路线不保证最短，平均比 "astar" 长1%~2%，单条路线可能长几十个百分点（见HPAStar）；
+              不预约路线，其他机器人按当前位置每hpa_repair_horizon步局部绕行一次，
+              相向而行的机器人只在碰撞时处理，需要配合死锁处理（deadlock_policy不为 "none"）使用
+        """
+        self.planner_type = "space_time"
+        # 货架、墙等静态障碍物与每次规划时传入的其他机器人位置分开，构造各规划器时一次性给出
+        self.static_obstacles = self.wHouse.static_obstacles
+        self.reservation_table = ReservationTable(slack=1)
+        # 各支付台及其相邻格子为瓶颈节点，不使用时间窗松弛，允许紧跟排队
+        for station in self.wHouse.delivery_stations:
+            self.reservation_table.critical_cells.add((station.x, station.y))
+            for dx, dy in Direction.get_directions():
+                self.reservation_table.critical_cells.add((station.x + dx, station.y + dy))
+        self.space_time_astar = SpaceTimeAStar(self.wHouse.width, self.wHouse.height, self.reservation_table,
+                                               self.wHouse.distance_fields, self.static_obstacles)
+        # rid -> 最近一次完成行动的tick
+        self._turn_done = {}
+        # 规划失败后按指数退避等待再重试，避免被围堵的机器人每个tick都做一次失败的搜索
+        self.max_replan_backoff = 8
+        # 单次时空A*最多展开的状态数：终点被长时间占用时，不设上限的搜索要展开整个 (x, y, t) 空间才能失败，
+        # 超过上限视为失败并进入退避
+        self.max_plan_expansions = self.wHouse.width * self.wHouse.height
+        self._replan_failures = {}
+        self._retry_at = {}
+        # 规划失败后正在原地等待重试的机器人，见_hold
+        self._holding = set()
+
+        # 联合规划：每次最多与距离最近的joint_group_size-1台待规划机器人一起求解
+        self.joint_group_size = 4
+        self.cbs = ConflictBasedSearch(self.wHouse.width, self.wHouse.height, self.reservation_table,
+                                       distance_fields=self.wHouse.distance_fields,
+                                       static_obstacles=self.static_obstacles)
+        self.ecbs = ConflictBasedSearch(self.wHouse.width, self.wHouse.height, self.reservation_table,
+                                        suboptimality=1.5, time_limit=0.1,
+                                        distance_fields=self.wHouse.distance_fields,
+                                        static_obstacles=self.static_obstacles)
+        self._joint_retry_at = 0
+
+        # "astar" 方式的寻路结果缓存：等待或移动失败的机器人反复以相同起终点重新规划时直接复用
+        self.path_cache = PathCache(capacity=256)
+        self.astar = AStar(self.path_cache, self.wHouse.width, self.wHouse.height, self.static_obstacles)
+        # "dstar_lite" 方式：rid -> 该机器人当前终点的增量规划器
+        self.incremental_planners = {}
+
+        # "windowed" 方式：冲突检测与预约的时间窗口、滚动重新规划的间隔（不大于窗口，路线用完前即重新规划）
+        self.window_size = 8
+        self.replan_interval = 4
+        # rid -> 重新规划的相位，按加入顺序错开，使各tick重新规划的机器人数量均匀
+        self._window_phase = {}
+        self._window_serial = 0
+
+        # "hpa" 方式：区域边长与首次使用时按静态障碍物构建的分层寻路器
+        self.hpa_cluster_size = 16
+        self.hierarchical: Optional[HPAStar] = None
+        # 其他机器人只在路线前hpa_repair_horizon步内绕行；rid -> 检查过的部分走完时剩余路线的长度，到达时重新绕行
+        self.hpa_repair_horizon = 2 * self.hpa_cluster_size
+        self._hpa_repair_at = {}
 
     def priority_calculator(self, r: str) -> float:
         """
@@ -32,23 +113,34 @@ class DynamicPlanner:
         :return:
         """
         robot = self.wHouse.robots[r]
-        task_time = 0
+        # 自上次位于取货点或支付台以来经过的tick数，由历史路径增量维护
+        task_time = robot.history_route.ticks_since_status
         remaining_time = len(robot.future_route)
-        for pos, status in reversed(robot.history_route):
-            if status:
-                break
-            task_time += 1
+        if remaining_time == 0:
+            # 没有路线（如规划失败）时以到目标的曼哈顿距离估计剩余时间
+            remaining_time = max(1, AStar.manhattan_distance(robot.position, robot.target))
 
         return task_time / remaining_time
 
-    def check_close_toDelivery(self) -> int:
+    def close_toDelivery_area(self, station: Position):
+        """
+        支付台附近的拥挤检测区域：以支付台为中心、向四周各延伸 close_toDelivery_width/height - 1 格并截断到仓库内，
+        角落里的支付台即为角落处 close_toDelivery_width * close_toDelivery_height 的矩形
+        :return: (left, top, right, bottom)，均包含在区域内
+        """
         wH = self.wHouse
+        return (max(0, station.x - self.close_toDelivery_width + 1),
+                max(0, station.y - self.close_toDelivery_height + 1),
+                min(wH.width - 1, station.x + self.close_toDelivery_width - 1),
+                min(wH.height - 1, station.y + self.close_toDelivery_height - 1))
+
+    def check_close_toDelivery(self, station: Optional[Position] = None) -> int:
+        wH = self.wHouse
+        left, top, right, bottom = self.close_toDelivery_area(station or wH.delivery_station)
         close_toDelivery_count = 0
 
-        wH.flash_robots_position()
         for rx, ry in wH.robot_positions:
-            if (wH.width - self.close_toDelivery_width <= rx <= wH.width - 1 and
-                    wH.height - self.close_toDelivery_height <= ry <= wH.height - 1):
+            if left <= rx <= right and top <= ry <= bottom:
                 close_toDelivery_count += 1
         # rx = wH.width - check_width
         # ry = wH.height - check_height
@@ -57,9 +149,15 @@ class DynamicPlanner:
         return close_toDelivery_count
 
     def check(self):
+        # 交付预约队列每个tick都要推进：预约、放行队首并调整排队机器人的目标
+        for queue in self.wHouse.delivery_queues.values():
+            queue.update()
         if self.wHouse.tick_count % self.check_close_toDelivery_delay == 0:
-            if self.check_close_toDelivery() >= int(sqrt(self.close_toDelivery_width * self.close_toDelivery_height)):
-                self.assignment_type(None, None, "overcrowded_at_delivery")
+            # 每个支付台单独检测拥挤
+            limit = int(sqrt(self.close_toDelivery_width * self.close_toDelivery_height))
+            for station in self.wHouse.delivery_stations:
+                if self.check_close_toDelivery(station) >= limit:
+                    self.assignment_type(None, None, "overcrowded_at_delivery", station)
 
     def collision(self, main_robot: str, robot2: str) -> str:
         r1 = self.wHouse.robots[main_robot]
@@ -99,68 +197,452 @@ class DynamicPlanner:
         r.future_route.insert(0,r.position)
         return True
 
-    def assignment_type(self, main_robot: str, robot2: str, types: str) -> str:
+    def assignment_type(self, main_robot: str, robot2: str, types: str,
+                        station: Optional[Position] = None) -> str:
         """
         当不知道使用哪种规划方法时使用此方法可自动找出应使用的动态规划方法
         :param main_robot:
         :param robot2:
         :param types:
+        :param station: "overcrowded_at_delivery" 时拥挤的支付台，默认第一个支付台
         :return:
         """
         if types == "collision":
             return self.collision(main_robot, robot2)
         if types == "overcrowded_at_delivery":
-            return self.solve_overcrowded_at_delivery()
+            return self.solve_overcrowded_at_delivery(station)
+
+    def solve_overcrowded_at_delivery(self, station: Optional[Position] = None) -> str:
+        """
+        支付台附近拥挤：携带货物的机器人已由交付预约队列安排在缓冲车道上排队，
+        这里把停在附近、没有任务的空闲机器人移到拥挤区域外的随机空闲格子，腾出进出支付台的通道
+        :return: "cleared" 有空闲机器人被移走，"queued" 拥挤只来自排队与交付的机器人
+        """
+        wH = self.wHouse
+        left, top, right, bottom = self.close_toDelivery_area(station or wH.delivery_station)
+
+        def inside(x, y):
+            return left <= x <= right and top <= y <= bottom
+
+        cleared = False
+        for rid, robot in wH.robots.items():
+            if (robot.carrying_item is not None or rid in wH.task_assignment or robot.future_route or
+                    not inside(robot.position.x, robot.position.y)):
+                continue
+            cell = None
+            for _ in range(8):
+                cell = wH.free_cells.sample(wH.rng)
+                if cell is None or not inside(*cell):
+                    break
+            if cell is None or inside(*cell):
+                continue
+            robot.target = Position(*cell)
+            self.set_route(rid)
+            cleared = True
+            logger.info("支付台附近拥挤，空闲机器人%s移动到(%s, %s)", rid, cell[0], cell[1])
+        return "cleared" if cleared else "queued"
+
+    def start_time(self, rid: str) -> int:
+        """
+        机器人当前位置所对应的tick：本tick已行动过的机器人位置属于下一个tick
+        """
+        if self._turn_done.get(rid) == self.wHouse.tick_count:
+            return self.wHouse.tick_count + 1
+        return self.wHouse.tick_count
+
+    def register_robot(self, rid: str):
+        """新机器人加入或被放置到新位置时，先在预约表中原地停留"""
+        robot = self.wHouse.robots[rid]
+        self.reservation_table.park(rid, robot.position, self.start_time(rid))
+        if rid not in self._window_phase:
+            self._window_phase[rid] = self._window_serial % self.replan_interval
+            self._window_serial += 1
+
+    def cancel_route(self, rid: str):
+        """机器人的路线被外部清空（如分配了新任务）时，在预约表中改为原地停留，等待重新规划"""
+        self.wHouse.robots[rid].future_route = []
+        self._holding.discard(rid)
+        if self.uses_reservations():
+            self.reservation_table.park(rid, self.wHouse.robots[rid].position, self.start_time(rid))
+
+    def unregister_robot(self, rid: str):
+        self.reservation_table.release(rid)
+        self._turn_done.pop(rid, None)
+        self._replan_failures.pop(rid, None)
+        self._retry_at.pop(rid, None)
+        self._holding.discard(rid)
+        self.incremental_planners.pop(rid, None)
+        self._hpa_repair_at.pop(rid, None)
+        self._window_phase.pop(rid, None)
+
+    def end_turn(self, rid: str):
+        """
+        机器人本tick行动结束后调用，保证预约表与实际位置一致：
+        没有路线或规划失败后原地等待重试的机器人原地停留；
+        移动失败被延误的机器人将剩余路线整体顺延后重新预约，顺延后冲突则重新规划；
+        "windowed" 方式下尚未到达终点的机器人轮到自己的相位时滚动重新规划下一个窗口；
+        "hpa" 方式下走完已检查过的路线前段时对剩余路线重新绕行
+        """
+        self._turn_done[rid] = self.wHouse.tick_count
+        if self.planner_type == "hpa":
+            self._repair_hierarchical(rid)
+        if not self.uses_reservations():
+            return
+
+        robot = self.wHouse.robots[rid]
+        table = self.reservation_table
+        t = self.wHouse.tick_count + 1
+        cell = (robot.position.x, robot.position.y)
+
+        if not robot.future_route or rid in self._holding:
+            # 没有路线或规划失败后原地等待：停留在当前格子
+            if not table.is_parked(rid) or table.position_at(rid, t) != cell:
+                table.park(rid, robot.position, t)
+            return
+
+        if (self.planner_type == "windowed" and robot.future_route[-1] != robot.target and
+                (self.wHouse.tick_count + self._window_phase.get(rid, 0)) % self.replan_interval == 0):
+            self.set_route(rid)
+            return
+
+        if self._on_schedule(rid, t):
+            return
+
+        # 被延误：剩余路线整体顺延
+        cells = [cell] + [(p.x, p.y) for p in robot.future_route]
+        if table.is_route_free(rid, cells, t):
+            table.book_route(rid, cells, t, self._parks_at_goal(robot))
+        elif self.planner_type in ("cbs", "ecbs"):
+            self._set_route_joint(rid)
+        elif self.planner_type == "windowed":
+            self._set_route_windowed(rid)
+        else:
+            self._set_route_space_time(rid)
+
+    @property
+    def planner_type(self) -> str:
+        return self._planner_type
+
+    @planner_type.setter
+    def planner_type(self, planner_type: str):
+        # 未知的名称会落入 "astar" 分支而uses_reservations仍为True，结果记在错误的规划方式名下
+        if planner_type not in self.PLANNER_TYPES:
+            raise ValueError(f"unknown planner type: {planner_type}")
+        self._planner_type = planner_type
+
+    def uses_reservations(self) -> bool:
+        """当前规划方式是否维护共享预约表"""
+        return self.planner_type not in ("astar", "greedy", "dstar_lite", "hpa")
+
+    def _on_schedule(self, rid: str, t: int) -> bool:
+        """机器人t时刻的位置与剩余路线长度是否与预约一致"""
+        table = self.reservation_table
+        plan = table.plans.get(rid)
+        if plan is None or table.is_parked(rid):
+            return False
+        robot = self.wHouse.robots[rid]
+        t0, cells = plan
+        return (table.position_at(rid, t) == (robot.position.x, robot.position.y) and
+                t0 + len(cells) - 1 - t == len(robot.future_route))
+
+    def _parks_at_goal(self, robot) -> bool:
+        """目标不是支付台也不是取货点时，机器人到达后会一直停留；窗口化规划的路线未到目标时不停留"""
+        if robot.target in self.wHouse.station_cells:
+            return False
+        if self.planner_type == "windowed" and robot.future_route and robot.future_route[-1] != robot.target:
+            return False
+        return (robot.target.x, robot.target.y) not in self.wHouse.pickup_at
+
+    def _set_route_space_time(self, rid: str) -> bool:
+        """
+        使用时空A*规划路径并一次性预约整条路线，规划失败则原地停留
+        """
+        robot = self.wHouse.robots[rid]
+        table = self.reservation_table
+        t0 = self.start_time(rid)
+        if t0 < self._retry_at.get(rid, t0):
+            return self._hold(rid, t0)
+
+        route = self.space_time_astar.find_path(rid, robot.position, robot.target, t0,
+                                                check_reachable=rid in self._replan_failures,
+                                                max_expansions=self.max_plan_expansions)
+        return self._book_route(rid, route, t0)
+
+    def _set_route_windowed(self, rid: str) -> bool:
+        """
+        窗口化时空A*（WHCA*）：只在window_size个tick内避开预约，窗口外按距离场的真实步数估计，
+        只预约路线的前window_size步；搜索规模只与窗口有关，与路线长度和机器人数量无关
+        """
+        robot = self.wHouse.robots[rid]
+        t0 = self.start_time(rid)
+        if t0 < self._retry_at.get(rid, t0):
+            return self._hold(rid, t0)
+
+        route = self.space_time_astar.find_path(rid, robot.position, robot.target, t0, window=self.window_size)
+        return self._book_route(rid, route, t0)
+
+    def _book_route(self, rid: str, route: list, t0: int) -> bool:
+        """
+        把规划结果写入机器人路线并预约；路线为空时按指数退避推迟下一次规划，并在退避期间原地等待
+        :return: True，规划失败时机器人得到原地等待的路线（见_hold），失败次数计入profiler的plan_failures
+        """
+        robot = self.wHouse.robots[rid]
+        table = self.reservation_table
+        if not route:
+            failures = self._replan_failures.get(rid, 0) + 1
+            self._replan_failures[rid] = failures
+            self._retry_at[rid] = t0 + min(2 ** (failures - 1), self.max_replan_backoff)
+            self.wHouse.profiler.count("plan_failures")
+            return self._hold(rid, t0)
+        robot.future_route = route
+        self._holding.discard(rid)
+        self._replan_failures.pop(rid, None)
+        self._retry_at.pop(rid, None)
+        cells = [(robot.position.x, robot.position.y)] + [(p.x, p.y) for p in route]
+        table.book_route(rid, cells, t0, self._parks_at_goal(robot))
+        return True
+
+    def _hold(self, rid: str, t0: int) -> bool:
+        """
+        规划失败或处于退避中的机器人原地等待到下一次重试：路线为若干原地等待步，预约表中停留在当前格子。
+        等待步执行时不算移动失败，等待结束前也不会每个tick重新搜索
+        :return: True，机器人已有可执行的（等待）路线
+        """
+        robot = self.wHouse.robots[rid]
+        robot.future_route = [robot.position] * max(1, self._retry_at.get(rid, t0 + 1) - t0)
+        self.reservation_table.park(rid, robot.position, t0)
+        self._holding.add(rid)
+        return True
+
+    def is_holding(self, rid: str) -> bool:
+        """机器人当前的原地等待是否来自规划失败（而不是路线中计划好的等待），死锁检测时仍视为在等待他人"""
+        return rid in self._holding
+
+    def clear_backoff(self, rid: str):
+        """
+        取消规划失败后的退避等待，下一次规划立即执行；
+        连续失败次数保留到规划成功为止，再次失败时退避时间继续加倍
+        """
+        self._retry_at.pop(rid, None)
+
+    def force_route(self, rid: str, route: List[Position]):
+        """
+        不经过搜索直接指定机器人的路线（如死锁处理中的让行与后退），并取消规划退避；
+        维护预约表时按该路线预约，走完后在终点停留直到重新规划
+        """
+        robot = self.wHouse.robots[rid]
+        robot.future_route = list(route)
+        self._holding.discard(rid)
+        self._hpa_repair_at.pop(rid, None)
+        self.clear_backoff(rid)
+        if self.uses_reservations():
+            cells = [(robot.position.x, robot.position.y)] + [(p.x, p.y) for p in route]
+            self.reservation_table.book_route(rid, cells, self.start_time(rid), park_at_goal=True)
+
+    def solve_jointly(self, group: List[str]) -> bool:
+        """
+        用ECBS为一组机器人（如死锁环上的机器人）联合重新规划，组外机器人视为障碍：
+        维护预约表时组外机器人的预约保持不变，否则视为在当前位置一直停留
+        :return: 是否求得解；无解时组内机器人的路线被清空，等待各自重新规划
+        """
+        robots = self.wHouse.robots
+        agents = {}
+        for rid in group:
+            r = robots[rid]
+            target = r.target if isinstance(r.target, Position) else r.position
+            agents[rid] = (r.position, target, self.start_time(rid), self._parks_at_goal(r))
+
+        if self.uses_reservations():
+            solver = self.ecbs
+            for rid in group:
+                self.reservation_table.release(rid)
+        else:
+            table = ReservationTable(slack=0)
+            for rid, r in robots.items():
+                if rid not in agents:
+                    table.park(rid, r.position, self.wHouse.tick_count)
+            solver = ConflictBasedSearch(self.wHouse.width, self.wHouse.height, table,
+                                         suboptimality=self.ecbs.suboptimality,
+                                         time_limit=self.ecbs.time_limit,
+                                         distance_fields=self.wHouse.distance_fields,
+                                         static_obstacles=self.static_obstacles)
+
+        routes = solver.solve(agents)
+        if routes is None:
+            for rid in group:
+                robots[rid].future_route = []
+                if self.uses_reservations():
+                    self.reservation_table.park(rid, robots[rid].position, agents[rid][2])
+            return False
+        for rid in group:
+            self.clear_backoff(rid)
+            if self.uses_reservations():
+                self._book_route(rid, routes.get(rid, []), agents[rid][2])
+            else:
+                robots[rid].future_route = routes.get(rid, [])
+        return True
+
+    def _needs_route(self, rid: str) -> bool:
+        """机器人有目标但没有路线，或路线与预约不一致"""
+        robot = self.wHouse.robots[rid]
+        if not isinstance(robot.target, Position) or robot.target == robot.position:
+            return False
+        return not robot.future_route or not self._on_schedule(rid, self.start_time(rid))
+
+    def _set_route_joint(self, rid: str) -> bool:
+        """
+        以rid为核心，与附近所有缺少有效路线的机器人一起用CBS/ECBS联合规划并预约，
+        联合求解超时则退回单机时空A*，并在一段时间内不再尝试联合求解
+        """
+        robots = self.wHouse.robots
+        robot = robots[rid]
+        table = self.reservation_table
+        t0 = self.start_time(rid)
+        if t0 < self._retry_at.get(rid, t0):
+            return self._hold(rid, t0)
+        if self.wHouse.tick_count < self._joint_retry_at:
+            return self._set_route_space_time(rid)
+
+        candidates = [other for other in robots if other != rid and self._needs_route(other)]
+        candidates.sort(key=lambda other: AStar.manhattan_distance(robots[other].position, robot.position))
+        group = [rid] + candidates[:self.joint_group_size - 1]
+        agents = {}
+        for member in group:
+            r = robots[member]
+            agents[member] = (r.position, r.target, self.start_time(member), self._parks_at_goal(r))
+            table.release(member)
+
+        solver = self.cbs if self.planner_type == "cbs" else self.ecbs
+        routes = solver.solve(agents)
+        if routes is None:
+            self._joint_retry_at = self.wHouse.tick_count + self.max_replan_backoff
+            for member in group[1:]:
+                robots[member].future_route = []
+                table.park(member, robots[member].position, agents[member][2])
+            return self._set_route_space_time(rid)
+
+        for member in group[1:]:
+            self._book_route(member, routes.get(member, []), agents[member][2])
+        return self._book_route(rid, routes.get(rid, []), t0)
+
+    def _robot_obstacles(self, robot) -> set:
+        """获取其他机器人的位置作为动态障碍物，不包括自己的位置、目标位置和支付台；静态障碍物由各规划器自己保存"""
+        own = (robot.position.x, robot.position.y)
+        target = (robot.target.x, robot.target.y)
+        obstacles = set(self.wHouse.robot_positions)
+        obstacles.difference_update((own, target))
+        obstacles.difference_update(self.wHouse.station_cells)
+        return obstacles
+
+    def _set_route_incremental(self, rid: str) -> bool:
+        """
+        D* Lite增量规划：终点不变时复用该机器人上一次的搜索状态，
+        只修复与上一次相比障碍物发生变化的格子以及起点的移动
+        """
+        robot = self.wHouse.robots[rid]
+        planner = self.incremental_planners.get(rid)
+        if planner is None or planner.goal != (robot.target.x, robot.target.y):
+            planner = DStarLite(self.wHouse.width, self.wHouse.height, robot.target, self.static_obstacles)
+            self.incremental_planners[rid] = planner
+        robot.future_route = planner.plan(robot.position, self._robot_obstacles(robot))
+        return len(robot.future_route) > 0
+
+    def _set_route_hierarchical(self, rid: str) -> bool:
+        """
+        分层寻路：抽象图与区域内距离只在首次使用时构建一次，每次规划只接入起终点并细化用到的区域，
+        其他机器人只在路线前hpa_repair_horizon步内局部绕行，走完这段后由_repair_hierarchical继续检查
+        """
+        if self.hierarchical is None:
+            self.hierarchical = HPAStar(self.wHouse.width, self.wHouse.height, self.static_obstacles,
+                                        self.hpa_cluster_size)
+        robot = self.wHouse.robots[rid]
+        robot.future_route = self.hierarchical.find_path(robot.position, robot.target, self._robot_obstacles(robot),
+                                                         self.hpa_repair_horizon)
+        self._hpa_repair_at[rid] = len(robot.future_route) - self.hpa_repair_horizon
+        return len(robot.future_route) > 0
+
+    def _repair_hierarchical(self, rid: str):
+        """
+        "hpa" 方式不预约路线：上一次检查过的前hpa_repair_horizon步走完后，
+        以其他机器人的当前位置对剩余路线的下一段重新局部绕行，绕不过时截断到障碍物之前，走完后重新规划；
+        指定的路线（见force_route）不做检查
+        """
+        robot = self.wHouse.robots[rid]
+        route = robot.future_route
+        if not route or len(route) > self._hpa_repair_at.get(rid, 0):
+            return
+        with self.wHouse.profiler.phase("plan"):
+            robot.future_route = self.hierarchical.repair(robot.position, route, self._robot_obstacles(robot),
+                                                          self.hpa_repair_horizon)
+        self._hpa_repair_at[rid] = len(robot.future_route) - self.hpa_repair_horizon
+        self.wHouse.profiler.count("hpa_repairs")
+
+    def _set_route_greedy(self, rid: str) -> bool:
+        """
+        沿目标距离场下降走一步：在距离减小的相邻格子中选一个当前没有机器人的格子，
+        每步只查询四个相邻格子，不做搜索；都被占用时原地等待
+        """
+        robot = self.wHouse.robots[rid]
+        for step in self.wHouse.distance_fields.next_steps(robot.target, robot.position):
+            if step == robot.target or not self.wHouse.occupancy.is_occupied(step):
+                robot.future_route = [step]
+                return True
+        robot.future_route = []
+        return False
 
-    def solve_overcrowded_at_delivery(self) -> str:
-       pass
     def set_route(self, rid: str) -> bool:
+        """为机器人规划到其目标的路径，耗时计入profiler的plan阶段"""
+        profiler = self.wHouse.profiler
+        profiler.count_replan(rid)
+        with profiler.phase("plan"):
+            return self._set_route(rid)
+
+    def _set_route(self, rid: str) -> bool:
         robot = self.wHouse.robots[rid]
 
         # 确保 target 是 Position 对象
         if not isinstance(robot.target, Position):
-            print(f"警告：机器人{rid}的目标不是Position对象")
+            logger.warning("警告：机器人%s的目标不是Position对象", rid)
             return False
 
         # 如果目标就是当前位置，不需要规划路径
         if robot.target == robot.position:
             robot.future_route = []
+            if self.uses_reservations():
+                self.reservation_table.park(rid, robot.position, self.start_time(rid))
             return True
 
-        self.wHouse.flash_robots_position()
-        bounds = (0, min(self.wHouse.width - 1, self.wHouse.height - 1))
-        astar = AStar()
-        
-        # 获取其他机器人的位置作为障碍物
-        obstacles = set()
-        for x, y in self.wHouse.robot_positions:
-            # 不把自己的位置和目标位置添加为障碍物
-            if (x, y) != (robot.position.x, robot.position.y) and \
-               (x, y) != (robot.target.x, robot.target.y) and \
-               (x, y) != (self.wHouse.delivery_station.x, self.wHouse.delivery_station.y):
-                obstacles.add(Position(x, y))
-
-        # 尝试找到路径
-        robot.future_route = astar.find_path(
+        if self.planner_type == "space_time":
+            return self._set_route_space_time(rid)
+        if self.planner_type == "windowed":
+            return self._set_route_windowed(rid)
+        if self.planner_type in ("cbs", "ecbs"):
+            return self._set_route_joint(rid)
+        if self.planner_type == "greedy" and self.wHouse.distance_fields.has_target(robot.target):
+            return self._set_route_greedy(rid)
+        if self.planner_type == "dstar_lite":
+            return self._set_route_incremental(rid)
+        if self.planner_type == "hpa":
+            return self._set_route_hierarchical(rid)
+
+        obstacles = self._robot_obstacles(robot)
+
+        # 尝试找到路径，目标有距离场时以其作为启发值
+        robot.future_route = self.astar.find_path(
             robot.position,
             robot.target,
             obstacles,
-            bounds
+            None,
+            self.wHouse.distance_fields.get(robot.target),
+            self.wHouse.distance_fields.layout_version
         )
 
-        # 调试信息
-        if True:
-            print("\n\neeeeeeeeeeeeeeeeeeeeeeeeeeee")
-            print(f"rid:{robot.robot_id}")
-            print(f"rPos:{robot.position}")
-            print(f"rTgt:{robot.target}")
-            print(f"allRobotPos:{self.wHouse.robot_positions}")
-            print(f"zhangaiwu:{obstacles}")
-            print(f"unpickPos:{self.wHouse.unpicked_positions}")
-            print(f"picked_she{self.wHouse.picked_shelves}")
-            print(f"bounds:{bounds}")
-            print(f"futureRoute:{robot.future_route}")
-            print("eeeeeeeeeeeeeeeeeeeeeeeeeeee\n\n")
+        # 调试信息，只有开启DEBUG级别时才格式化（障碍物集合等较大）
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("rid:%s rPos:%s rTgt:%s allRobotPos:%s zhangaiwu:%s unpicked:%s picked_she:%s "
+                         "futureRoute:%s", robot.robot_id, robot.position, robot.target,
+                         list(self.wHouse.robot_positions), obstacles, self.wHouse.unpicked_shelves,
+                         self.wHouse.picked_shelves, robot.future_route)
 
         return len(robot.future_route) > 0
 
@@ -0,0 +1,255 @@
+import csv
+import logging
+import multiprocessing
+import time
+from dataclasses import asdict, dataclass, fields
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from DynamicPlanner import DynamicPlanner
+from TickProfiler import percentile
+from WareHouse_system import Warehouse
+from WarehouseMap import WarehouseMap
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ExperimentConfig:
+    """一次仿真的参数，seed 相同的两次仿真结果一致"""
+    width: int = 20
+    height: int = 20
+    robot_count: int = 5
+    max_ticks: int = 1000
+    planner_type: str = "space_time"
+    seed: int = 0
+    deadlock_policy: str = "back_off"
+    station_count: int = 1  # 支付台数量，位置见Warehouse.default_stations
+    map_path: str = ""  # MovingAI格式的静态布局文件，给出时仓库尺寸取自地图，支付台见Warehouse.layout_stations
+
+    def __post_init__(self):
+        # 在分发到工作进程之前检查来自命令行或CSV的规划方式名称
+        if self.planner_type not in DynamicPlanner.PLANNER_TYPES:
+            raise ValueError(f"unknown planner type: {self.planner_type}")
+
+    @classmethod
+    def from_row(cls, row: Dict[str, object]) -> "ExperimentConfig":
+        """从结果行（如读回的CSV行）恢复仿真参数，用于复现某次较慢或死锁的仿真"""
+        values = {}
+        for f in fields(cls):
+            value = row[f.name]
+            values[f.name] = value if f.type is str or f.type == "str" else int(value)
+        return cls(**values)
+
+
+# 每次仿真输出的指标，按此顺序写入CSV
+METRIC_FIELDS = ["deliveries", "moves", "failed_moves", "wall_ms",
+                 "tick_mean_ms", "tick_p50_ms", "tick_p95_ms", "tick_max_ms",
+                 "deadlocks", "deadlock_mean_ticks", "deadlock_max_ticks",
+                 "deliveries_per_tick", "mean_queue_length", "max_queue_length", "station_utilization"]
+# 汇总时参与统计的指标
+SUMMARY_FIELDS = ["deliveries", "moves", "failed_moves", "tick_mean_ms", "tick_p95_ms", "deadlocks",
+                  "deliveries_per_tick", "station_utilization"]
+
+
+def build_warehouse(config: ExperimentConfig) -> Warehouse:
+    """按仿真参数新建仓库并添加机器人，相同参数得到完全相同的初始状态"""
+    if config.map_path:
+        layout = WarehouseMap.load(config.map_path)
+        width, height = layout.width, layout.height
+        stations = Warehouse.layout_stations(layout, config.station_count)
+    else:
+        layout = None
+        width, height = config.width, config.height
+        stations = Warehouse.default_stations(width, height, config.station_count)
+    warehouse = Warehouse(width, height, headless=True, seed=config.seed,
+                          deadlock_policy=config.deadlock_policy, delivery_stations=stations, layout=layout)
+    warehouse.dynamic_planner.planner_type = config.planner_type
+    for i in range(1, config.robot_count + 1):
+        warehouse.add_robot_with_pickup(f"R{i}")
+    return warehouse
+
+
+def replay(config: ExperimentConfig, max_ticks: Optional[int] = None) -> Warehouse:
+    """
+    在当前进程中复现一次仿真，便于对较慢或死锁的仿真做性能分析或调试
+    :param max_ticks: 只运行前max_ticks个tick，默认与原仿真相同
+    :return: 运行结束后的仓库
+    """
+    warehouse = build_warehouse(config)
+    for _ in range(config.max_ticks if max_ticks is None else max_ticks):
+        warehouse.tick()
+    return warehouse
+
+
+def run_experiment(config: ExperimentConfig) -> Dict[str, object]:
+    """
+    运行一次无界面仿真，复用 Warehouse.tick 循环，在工作进程中执行
+    :param config: 仿真参数
+    :return: 参数与指标合并后的一行结果
+    """
+    warehouse = build_warehouse(config)
+
+    start_time = time.perf_counter()
+    tick_ms = [warehouse.tick() for _ in range(config.max_ticks)]
+    wall_ms = (time.perf_counter() - start_time) * 1000
+
+    ordered = sorted(tick_ms)
+    deadlocks = warehouse.deadlock_detector.report()
+    stations = warehouse.station_report()
+    row = asdict(config)
+    row.update({
+        "deliveries": warehouse.delivery_count,
+        "moves": warehouse.tick_successMoveCount,
+        "failed_moves": warehouse.tick_failedMoveCount,
+        "wall_ms": round(wall_ms, 3),
+        "tick_mean_ms": round(sum(tick_ms) / len(tick_ms), 4) if tick_ms else 0.0,
+        "tick_p50_ms": round(percentile(ordered, 0.5), 4),
+        "tick_p95_ms": round(percentile(ordered, 0.95), 4),
+        "tick_max_ms": round(ordered[-1], 4) if ordered else 0.0,
+        "deadlocks": deadlocks["detected"],
+        "deadlock_mean_ticks": deadlocks["mean_ticks"],
+        "deadlock_max_ticks": deadlocks["max_ticks"],
+        "deliveries_per_tick": stations["deliveries_per_tick"],
+        "mean_queue_length": stations["mean_queue_length"],
+        "max_queue_length": stations["max_queue_length"],
+        "station_utilization": stations["station_utilization"],
+    })
+    return row
+
+
+def _run_safely(config: ExperimentConfig) -> Dict[str, object]:
+    """工作进程入口：单次仿真出错时返回带错误信息的结果行，不中断整批实验"""
+    try:
+        row = run_experiment(config)
+        row["error"] = ""
+    except Exception as e:
+        row = asdict(config)
+        row.update({name: None for name in METRIC_FIELDS})
+        row["error"] = f"{type(e).__name__}: {e}"
+    return row
+
+
+class MonteCarloRunner:
+    """
+    多进程蒙特卡洛实验：把一批带种子的仿真分发到进程池，
+    每完成一次仿真立即把结果行追加写入CSV，结束后按参数组合汇总
+    """
+
+    def __init__(self, processes: Optional[int] = None, chunksize: int = 1):
+        """
+        :param processes: 工作进程数，默认CPU核数；1表示在当前进程中顺序执行
+        :param chunksize: 每次分发给工作进程的仿真数
+        """
+        self.processes = processes or multiprocessing.cpu_count()
+        self.chunksize = chunksize
+
+    @staticmethod
+    def grid(widths: Iterable[int] = (20,), heights: Optional[Iterable[int]] = None,
+             robot_counts: Iterable[int] = (5,), max_ticks: int = 1000,
+             planner_types: Iterable[str] = ("space_time",), repeats: int = 10,
+             base_seed: int = 0,
+             deadlock_policies: Iterable[str] = ("back_off",),
+             station_counts: Iterable[int] = (1,),
+             map_paths: Iterable[str] = ("",)) -> List[ExperimentConfig]:
+        """
+        生成参数网格，每个参数组合重复repeats次，种子依次为 base_seed, base_seed + 1, ...
+        :param heights: 默认与宽相同（正方形仓库）
+        :param deadlock_policies: 死锁处理方式，见DeadlockDetector.POLICIES
+        :param station_counts: 支付台数量，用于比较吞吐量随支付台数量的变化
+        :param map_paths: 静态布局文件，空字符串表示没有静态障碍物的空仓库；
+                          给出地图时仓库尺寸取自地图，widths与heights只对空仓库有效
+        """
+        sizes = [(width, height) for width in widths
+                 for height in (heights if heights is not None else (width,))]
+        configs = []
+        for map_path in map_paths:
+            if map_path:
+                layout = WarehouseMap.load(map_path)
+                map_sizes = [(layout.width, layout.height)]
+            else:
+                map_sizes = sizes
+            for width, height in map_sizes:
+                for robot_count in robot_counts:
+                    for planner_type in planner_types:
+                        for policy in deadlock_policies:
+                            for station_count in station_counts:
+                                for i in range(repeats):
+                                    configs.append(ExperimentConfig(width, height, robot_count, max_ticks,
+                                                                    planner_type, base_seed + i, policy,
+                                                                    station_count, map_path))
+        return configs
+
+    def run(self, configs: Sequence[ExperimentConfig], csv_path: Optional[str] = None,
+            summary_path: Optional[str] = None) -> List[Dict[str, object]]:
+        """
+        运行一批仿真
+        :param configs: 仿真参数列表
+        :param csv_path: 每次仿真一行的结果文件，按完成顺序流式写入
+        :param summary_path: 按参数组合（不含种子）汇总的结果文件
+        :return: 所有结果行（按完成顺序）
+        """
+        columns = [f.name for f in fields(ExperimentConfig)] + METRIC_FIELDS + ["error"]
+        rows = []
+        csv_file = open(csv_path, "w", newline="", encoding="utf-8") if csv_path else None
+        try:
+            writer = csv.DictWriter(csv_file, fieldnames=columns) if csv_file else None
+            if writer:
+                writer.writeheader()
+            for row in self._results(configs):
+                rows.append(row)
+                if writer:
+                    writer.writerow(row)
+                    csv_file.flush()
+                if row["error"]:
+                    logger.warning("仿真失败（种子%s）：%s", row["seed"], row["error"])
+                else:
+                    logger.info("仿真完成 %d/%d：%sx%s，%s台机器人，%s，种子%s，交付%s次",
+                                len(rows), len(configs), row["width"], row["height"], row["robot_count"],
+                                row["planner_type"], row["seed"], row["deliveries"])
+        finally:
+            if csv_file:
+                csv_file.close()
+
+        summary = self.aggregate(rows)
+        if summary_path and summary:
+            with open(summary_path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=list(summary[0]))
+                writer.writeheader()
+                writer.writerows(summary)
+        return rows
+
+    def _results(self, configs: Sequence[ExperimentConfig]):
+        if self.processes <= 1:
+            for config in configs:
+                yield _run_safely(config)
+            return
+        with multiprocessing.Pool(self.processes) as pool:
+            yield from pool.imap_unordered(_run_safely, configs, self.chunksize)
+
+    @staticmethod
+    def aggregate(rows: Iterable[Dict[str, object]]) -> List[Dict[str, object]]:
+        """
+        按参数组合（不含种子）汇总成功的仿真：次数、各指标的平均值与标准差
+        :return: 每个参数组合一行
+        """
+        keys = ["width", "height", "robot_count", "max_ticks", "planner_type", "deadlock_policy", "station_count",
+                "map_path"]
+        groups: Dict[tuple, List[Dict[str, object]]] = {}
+        for row in rows:
+            if row.get("error"):
+                continue
+            groups.setdefault(tuple(row[k] for k in keys), []).append(row)
+
+        summary = []
+        for group_key in sorted(groups):
+            group = groups[group_key]
+            entry = dict(zip(keys, group_key))
+            entry["runs"] = len(group)
+            for name in SUMMARY_FIELDS:
+                values = [float(row[name]) for row in group]
+                mean = sum(values) / len(values)
+                variance = sum((v - mean) ** 2 for v in values) / (len(values) - 1) if len(values) > 1 else 0.0
+                entry[f"{name}_mean"] = round(mean, 4)
+                entry[f"{name}_std"] = round(variance ** 0.5, 4)
+            summary.append(entry)
+        return summary
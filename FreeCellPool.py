@@ -0,0 +1,60 @@
+import random
+from typing import Dict, List, Optional, Tuple
+
+
+class FreeCellPool:
+    """
+    空闲格子池：可随机访问的数组加 格子 -> 下标 映射，删除时与末尾元素交换
+    支持O(1)的均匀随机抽样、插入与删除
+    格子上每出现一个占用者（机器人、货架、支付台）计数加一，计数归零时回到池中
+    """
+
+    def __init__(self, width: int, height: int):
+        self.cells: List[Tuple[int, int]] = [(x, y) for y in range(height) for x in range(width)]
+        self.index: Dict[Tuple[int, int], int] = {cell: i for i, cell in enumerate(self.cells)}
+        # 格子 -> 占用者数量，只记录非零项
+        self.occupants: Dict[Tuple[int, int], int] = {}
+
+    def occupy(self, cell: Tuple[int, int]):
+        """格子上增加一个占用者"""
+        count = self.occupants.get(cell, 0)
+        self.occupants[cell] = count + 1
+        if count == 0:
+            self._remove(cell)
+
+    def vacate(self, cell: Tuple[int, int]):
+        """格子上减少一个占用者，没有占用者时回到池中"""
+        count = self.occupants.get(cell, 0)
+        if count <= 1:
+            self.occupants.pop(cell, None)
+            if count == 1:
+                self._add(cell)
+        else:
+            self.occupants[cell] = count - 1
+
+    def sample(self, rng: Optional[random.Random] = None) -> Optional[Tuple[int, int]]:
+        """均匀随机取一个空闲格子（不移出池），池为空时返回None"""
+        if not self.cells:
+            return None
+        return (rng or random).choice(self.cells)
+
+    def _add(self, cell: Tuple[int, int]):
+        if cell in self.index:
+            return
+        self.index[cell] = len(self.cells)
+        self.cells.append(cell)
+
+    def _remove(self, cell: Tuple[int, int]):
+        i = self.index.pop(cell, None)
+        if i is None:
+            return
+        last = self.cells.pop()
+        if last != cell:
+            self.cells[i] = last
+            self.index[last] = i
+
+    def __contains__(self, cell: Tuple[int, int]) -> bool:
+        return cell in self.index
+
+    def __len__(self) -> int:
+        return len(self.cells)
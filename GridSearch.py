@@ -0,0 +1,141 @@
+from collections import OrderedDict
+from typing import Container, Iterable, List, Optional, Sequence, Tuple
+import heapq
+from Direction import Direction
+
+
+class GridSearch:
+    """
+    整数格子索引上的A*搜索核心，支持矩形网格
+    格子编号为 y * width + x，相邻格子表、g值与父节点数组在构造时一次性分配，
+    每次搜索通过递增的搜索编号区分数组中的新旧数据，无需重新初始化
+    同一实例不能在多个线程中同时搜索
+    """
+
+    # (width, height) -> 共享实例，按最近使用排序，最多保留shared_capacity个尺寸：
+    # 不限边界的查询按起终点与障碍物的外接矩形确定网格尺寸，尺寸可能每次都不同
+    _shared: "OrderedDict[Tuple[int, int], GridSearch]" = OrderedDict()
+    shared_capacity = 8
+    # 被淘汰的共享实例累计展开的格子数，见total_expansions
+    _evicted_expansions = 0
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        size = width * height
+        self.xs = [cell % width for cell in range(size)]
+        self.ys = [cell // width for cell in range(size)]
+        directions = Direction.get_directions()
+        self.neighbors: List[Tuple[int, ...]] = []
+        for cell in range(size):
+            x, y = self.xs[cell], self.ys[cell]
+            self.neighbors.append(tuple((y + dy) * width + x + dx for dx, dy in directions
+                                        if 0 <= x + dx < width and 0 <= y + dy < height))
+        self._g = [0] * size
+        self._parent = [-1] * size
+        self._seen = [0] * size
+        self._closed = [0] * size
+        self._search_id = 0
+        # 累计展开的格子数
+        self.expansions = 0
+
+    @classmethod
+    def shared(cls, width: int, height: int) -> "GridSearch":
+        """获取指定尺寸的共享实例，避免每次搜索重新构建相邻格子表"""
+        key = (width, height)
+        grid = cls._shared.get(key)
+        if grid is not None:
+            cls._shared.move_to_end(key)
+            return grid
+        grid = cls._shared[key] = cls(width, height)
+        while len(cls._shared) > cls.shared_capacity:
+            _, evicted = cls._shared.popitem(last=False)
+            cls._evicted_expansions += evicted.expansions
+        return grid
+
+    @classmethod
+    def total_expansions(cls) -> int:
+        """所有共享实例（包括已淘汰的）累计展开的格子数"""
+        return cls._evicted_expansions + sum(grid.expansions for grid in cls._shared.values())
+
+    def cell(self, x: int, y: int) -> int:
+        return y * self.width + x
+
+    def contains(self, x: int, y: int) -> bool:
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def neighbors_excluding(self, cells: Iterable[int]) -> List[Tuple[int, ...]]:
+        """
+        去掉指定格子后的相邻格子表，用于静态障碍物：
+        静态障碍物在建表时一次性去掉，搜索时不必再逐个检查
+        """
+        excluded = set(cells)
+        return [() if cell in excluded else tuple(n for n in neighbors if n not in excluded)
+                for cell, neighbors in enumerate(self.neighbors)]
+
+    def find_path(self, start: int, goal: int, blocked: Container[int],
+                  distance_field: Optional[Sequence[int]] = None,
+                  neighbors: Optional[Sequence[Tuple[int, ...]]] = None) -> List[int]:
+        """
+        A*寻路
+        :param start: 起点格子编号
+        :param goal: 终点格子编号
+        :param blocked: 障碍物格子编号集合
+        :param distance_field: 按本网格编号展开的到终点距离（负数为不可达），作为启发值；默认曼哈顿距离
+        :param neighbors: 替代的相邻格子表（如neighbors_excluding去掉静态障碍物后的表），默认完整网格
+        :return: 路径格子编号列表（不包含起点），无解时为空列表
+        """
+        if start == goal:
+            return []
+        self._search_id += 1
+        search_id = self._search_id
+        g, parent, seen, closed = self._g, self._parent, self._seen, self._closed
+        xs, ys = self.xs, self.ys
+        if neighbors is None:
+            neighbors = self.neighbors
+        gx, gy = xs[goal], ys[goal]
+        field = distance_field
+
+        h0 = field[start] if field is not None else abs(xs[start] - gx) + abs(ys[start] - gy)
+        if h0 < 0:
+            return []
+        seen[start] = search_id
+        g[start] = 0
+        parent[start] = -1
+        # 堆元素为 (f, h, 格子)，f相同时优先扩展离终点更近的格子
+        open_list = [(h0, h0, start)]
+        expansions = 0
+
+        while open_list:
+            _, _, current = heapq.heappop(open_list)
+            if closed[current] == search_id:
+                continue
+            if current == goal:
+                self.expansions += expansions
+                path = []
+                while current != start:
+                    path.append(current)
+                    current = parent[current]
+                return path[::-1]
+            closed[current] = search_id
+            expansions += 1
+
+            next_g = g[current] + 1
+            for neighbor in neighbors[current]:
+                if closed[neighbor] == search_id or neighbor in blocked:
+                    continue
+                if seen[neighbor] == search_id and next_g >= g[neighbor]:
+                    continue
+                if field is not None:
+                    h = field[neighbor]
+                    if h < 0:
+                        continue
+                else:
+                    h = abs(xs[neighbor] - gx) + abs(ys[neighbor] - gy)
+                seen[neighbor] = search_id
+                g[neighbor] = next_g
+                parent[neighbor] = current
+                heapq.heappush(open_list, (next_g + h, h, neighbor))
+
+        self.expansions += expansions
+        return []
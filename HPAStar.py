@@ -0,0 +1,388 @@
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import heapq
+from Direction import Direction
+from Position import Position
+
+Cell = Tuple[int, int]
+Cluster = Tuple[int, int]
+
+
+class HPAStar:
+    """
+    分层寻路（HPA*，Botea等）：把网格划分为 cluster_size x cluster_size 的区域，
+    相邻区域边界上每段连续可通行的格子对设置入口（段长不小于LONG_ENTRANCE时在两端各设一个，否则在中间设一个），
+    预先计算每个区域内入口之间的距离，构成抽象图；
+    查询时只把起点和终点接入所在区域，在抽象图上A*，再逐段细化抽象路径用到的边，
+    区域内入口之间的路线按需计算并缓存
+    只考虑静态障碍物，静态障碍物变化时只重建受影响区域的入口与区域内距离
+    路线不保证最短：必须经过区域边界上的入口。20%随机障碍物、区域边长16时，60x60上平均比最短路线长约2%，
+    单条路线最多长约40%（多为较短的路线，长度不少于两个区域边长的路线最多长约20%）；200x200上平均长约1%，最多长约8%
+    """
+
+    LONG_ENTRANCE = 6
+
+    def __init__(self, width: int, height: int, static_obstacles: Iterable[Cell] = (), cluster_size: int = 16):
+        """
+        :param width: 网格宽
+        :param height: 网格高
+        :param static_obstacles: 静态障碍物坐标
+        :param cluster_size: 区域边长，越大抽象图越小、区域内的搜索越大
+        """
+        if cluster_size < 2:
+            raise ValueError(f"cluster_size must be at least 2, got {cluster_size}")
+        self.width = width
+        self.height = height
+        self.cluster_size = cluster_size
+        self.blocked: Set[Cell] = set(static_obstacles)
+        self.directions = Direction.get_directions()
+        self.columns = (width + cluster_size - 1) // cluster_size
+        self.rows = (height + cluster_size - 1) // cluster_size
+        # (区域, 右侧或下方相邻区域) -> 入口格子对列表 (前一区域中的格子, 后一区域中的格子)
+        self._transitions: Dict[Tuple[Cluster, Cluster], List[Tuple[Cell, Cell]]] = {}
+        # 区域 -> 区域内的入口格子（抽象图节点）
+        self._nodes: Dict[Cluster, Set[Cell]] = {}
+        # 入口格子 -> {同区域内的其他入口格子: 区域内距离}
+        self._intra: Dict[Cell, Dict[Cell, int]] = {}
+        # 入口格子 -> 边界另一侧与之相邻的入口格子
+        self._inter: Dict[Cell, Set[Cell]] = {}
+        # 入口格子 -> 抽象图的全部出边 [(相邻入口, 代价)]，区域重建时与_intra一起更新
+        self._edges: Dict[Cell, List[Tuple[Cell, int]]] = {}
+        # 区域 -> {(入口, 入口): 区域内路线}，细化时按需填充
+        self._segments: Dict[Cluster, Dict[Tuple[Cell, Cell], List[Cell]]] = {}
+        # 统计：累计展开的抽象节点数、重建过的区域数
+        self.abstract_expansions = 0
+        self.rebuilt_clusters = 0
+
+        for cluster in self._clusters():
+            for neighbor in self._forward_neighbors(cluster):
+                self._build_border(cluster, neighbor)
+        for cluster in self._clusters():
+            self._build_cluster(cluster)
+
+    def _clusters(self):
+        for cy in range(self.rows):
+            for cx in range(self.columns):
+                yield cx, cy
+
+    def _forward_neighbors(self, cluster: Cluster) -> List[Cluster]:
+        """右侧与下方的相邻区域，每条边界只由其左侧或上方的区域负责"""
+        cx, cy = cluster
+        neighbors = []
+        if cx + 1 < self.columns:
+            neighbors.append((cx + 1, cy))
+        if cy + 1 < self.rows:
+            neighbors.append((cx, cy + 1))
+        return neighbors
+
+    def _borders(self, cluster: Cluster) -> List[Tuple[Cluster, Cluster]]:
+        """区域四周的边界，以 (左侧或上方区域, 右侧或下方区域) 表示"""
+        cx, cy = cluster
+        borders = [(cluster, neighbor) for neighbor in self._forward_neighbors(cluster)]
+        if cx > 0:
+            borders.append(((cx - 1, cy), cluster))
+        if cy > 0:
+            borders.append(((cx, cy - 1), cluster))
+        return borders
+
+    def cluster_of(self, cell: Cell) -> Cluster:
+        return cell[0] // self.cluster_size, cell[1] // self.cluster_size
+
+    def _bounds(self, cluster: Cluster) -> Tuple[int, int, int, int]:
+        """区域的 (left, top, right, bottom)，均包含在区域内"""
+        size = self.cluster_size
+        left, top = cluster[0] * size, cluster[1] * size
+        return left, top, min(left + size, self.width) - 1, min(top + size, self.height) - 1
+
+    def _build_border(self, first: Cluster, second: Cluster):
+        """重新计算两个相邻区域之间的入口"""
+        for a, b in self._transitions.pop((first, second), ()):
+            self._inter.get(a, set()).discard(b)
+            self._inter.get(b, set()).discard(a)
+
+        left, top, right, bottom = self._bounds(first)
+        if second[0] != first[0]:
+            pairs = [((right, y), (right + 1, y)) for y in range(top, bottom + 1)]
+        else:
+            pairs = [((x, bottom), (x, bottom + 1)) for x in range(left, right + 1)]
+
+        transitions = []
+        run: List[Tuple[Cell, Cell]] = []
+        for pair in pairs + [None]:
+            if pair is not None and pair[0] not in self.blocked and pair[1] not in self.blocked:
+                run.append(pair)
+                continue
+            if run:
+                if len(run) >= self.LONG_ENTRANCE:
+                    transitions.extend((run[0], run[-1]))
+                else:
+                    transitions.append(run[len(run) // 2])
+                run = []
+        self._transitions[(first, second)] = transitions
+        for a, b in transitions:
+            self._inter.setdefault(a, set()).add(b)
+            self._inter.setdefault(b, set()).add(a)
+
+    def _build_cluster(self, cluster: Cluster):
+        """由四周边界的入口重新确定区域内的抽象节点，并计算节点之间的区域内距离"""
+        for node in self._nodes.get(cluster, ()):
+            self._intra.pop(node, None)
+            self._edges.pop(node, None)
+        nodes = set()
+        for border in self._borders(cluster):
+            for a, b in self._transitions.get(border, ()):
+                nodes.add(a if self.cluster_of(a) == cluster else b)
+        self._nodes[cluster] = nodes
+        self._segments[cluster] = {}
+        for node, distances in self._node_distances(cluster, nodes).items():
+            self._intra[node] = distances
+            self._edges[node] = list(distances.items()) + [(other, 1) for other in self._inter.get(node, ())]
+        self.rebuilt_clusters += 1
+
+    def _node_distances(self, cluster: Cluster, nodes: Set[Cell]) -> Dict[Cell, Dict[Cell, int]]:
+        """
+        区域内每对抽象节点之间的步数：区域内的格子按 (y - top) * 宽 + (x - left) 编号后广度优先，
+        找到全部其他节点即停止，不可达的节点不出现在结果中
+        """
+        left, top, right, bottom = self._bounds(cluster)
+        span_x, span_y = right - left + 1, bottom - top + 1
+        blocked = self.blocked
+        free = [(left + index % span_x, top + index // span_x) not in blocked for index in range(span_x * span_y)]
+        adjacent = []
+        for index in range(span_x * span_y):
+            x, y = index % span_x, index // span_x
+            adjacent.append(tuple(index + dy * span_x + dx for dx, dy in self.directions
+                                  if 0 <= x + dx < span_x and 0 <= y + dy < span_y and
+                                  free[index + dy * span_x + dx]))
+        index_of = {node: (node[1] - top) * span_x + node[0] - left for node in nodes}
+        node_at = {index: node for node, index in index_of.items()}
+        result = {}
+        for node, source in index_of.items():
+            distances = {}
+            remaining = len(nodes) - 1
+            depth = [-1] * len(free)
+            depth[source] = 0
+            frontier = [source]
+            step = 0
+            while frontier and remaining:
+                step += 1
+                next_frontier = []
+                for index in frontier:
+                    for neighbor in adjacent[index]:
+                        if depth[neighbor] < 0:
+                            depth[neighbor] = step
+                            next_frontier.append(neighbor)
+                            other = node_at.get(neighbor)
+                            if other is not None:
+                                distances[other] = step
+                                remaining -= 1
+                frontier = next_frontier
+            result[node] = distances
+        return result
+
+    def _search(self, source: Cell, bounds: Tuple[int, int, int, int],
+                obstacles: Optional[Set[Cell]] = None, target: Optional[Cell] = None):
+        """
+        在矩形范围内从source广度优先搜索，给出target时到达即停止
+        :return: (格子 -> 步数, 格子 -> 父格子)
+        """
+        left, top, right, bottom = bounds
+        blocked = self.blocked
+        distances = {source: 0}
+        parents: Dict[Cell, Optional[Cell]] = {source: None}
+        queue = deque([source])
+        while queue:
+            cell = queue.popleft()
+            if cell == target:
+                break
+            x, y = cell
+            d = distances[cell] + 1
+            for dx, dy in self.directions:
+                nx, ny = x + dx, y + dy
+                neighbor = (nx, ny)
+                if not (left <= nx <= right and top <= ny <= bottom) or neighbor in distances:
+                    continue
+                if neighbor in blocked or (obstacles is not None and neighbor in obstacles):
+                    continue
+                distances[neighbor] = d
+                parents[neighbor] = cell
+                queue.append(neighbor)
+        return distances, parents
+
+    @staticmethod
+    def _trace(parents: Dict[Cell, Optional[Cell]], cell: Cell) -> List[Cell]:
+        """沿父格子回溯，返回从搜索起点之后到cell的路线"""
+        path = []
+        while parents[cell] is not None:
+            path.append(cell)
+            cell = parents[cell]
+        return path[::-1]
+
+    def set_static_obstacles(self, cells: Iterable[Cell]):
+        """
+        替换静态障碍物，只重建包含变化格子的区域及其相邻区域：
+        变化格子所在区域四周的入口重新计算，入口变化会影响相邻区域的抽象节点，相邻区域的区域内距离一并重算
+        """
+        cells = set(cells)
+        changed = cells ^ self.blocked
+        if not changed:
+            return
+        self.blocked = cells
+        touched = {self.cluster_of(cell) for cell in changed}
+        borders = {border for cluster in touched for border in self._borders(cluster)}
+        for first, second in borders:
+            self._build_border(first, second)
+        for cluster in {cluster for border in borders for cluster in border}:
+            self._build_cluster(cluster)
+
+    def find_path(self, start: Position, goal: Position, obstacles: Iterable[Cell] = (),
+                  repair_horizon: Optional[int] = None) -> List[Position]:
+        """
+        分层寻路
+        :param start: 起点
+        :param goal: 终点
+        :param obstacles: 动态障碍物（如其他机器人），不进入抽象图，只在路线前repair_horizon步内局部绕行
+        :param repair_horizon: 检查动态障碍物的步数，默认两个区域边长；绕不过时只返回到障碍物之前的部分
+        :return: 路径列表（不包含起点），不可达时为空列表
+        """
+        start_cell, goal_cell = (start.x, start.y), (goal.x, goal.y)
+        if start_cell == goal_cell:
+            return []
+        if (start_cell in self.blocked or goal_cell in self.blocked or
+                not (0 <= goal.x < self.width and 0 <= goal.y < self.height)):
+            return []
+        cells = self._refine(start_cell, goal_cell)
+        if cells and obstacles:
+            cells = self._repair(start_cell, cells, set(obstacles),
+                                 repair_horizon if repair_horizon is not None else 2 * self.cluster_size)
+        return [Position(x, y) for x, y in cells]
+
+    def repair(self, start: Position, route: List[Position], obstacles: Iterable[Cell],
+               repair_horizon: Optional[int] = None) -> List[Position]:
+        """
+        对已有路线的前repair_horizon步重新检查动态障碍物并局部绕行，不重新做分层搜索；
+        用于沿路线前进、已检查过的部分走完之后
+        :param start: 当前位置
+        :param route: 剩余路线（不包含起点）
+        :param obstacles: 动态障碍物
+        :param repair_horizon: 检查的步数，默认两个区域边长
+        :return: 绕行后的路线，绕不过时只返回到障碍物之前的部分
+        """
+        cells = [(p.x, p.y) for p in route]
+        if not cells or not obstacles:
+            return list(route)
+        cells = self._repair((start.x, start.y), cells, set(obstacles),
+                             repair_horizon if repair_horizon is not None else 2 * self.cluster_size)
+        return [Position(x, y) for x, y in cells]
+
+    def _refine(self, start: Cell, goal: Cell) -> List[Cell]:
+        """接入起终点、在抽象图上搜索并细化为格子路线"""
+        start_cluster, goal_cluster = self.cluster_of(start), self.cluster_of(goal)
+        start_distances, start_parents = self._search(start, self._bounds(start_cluster))
+        goal_distances, goal_parents = self._search(goal, self._bounds(goal_cluster))
+        start_links = {node: start_distances[node] for node in self._nodes[start_cluster] if node in start_distances}
+        goal_links = {node: goal_distances[node] for node in self._nodes[goal_cluster] if node in goal_distances}
+        direct = start_distances.get(goal) if start_cluster == goal_cluster else None
+
+        abstract = self._abstract_search(start, goal, start_links, goal_links, direct)
+        if not abstract:
+            return []
+
+        path: List[Cell] = []
+        for u, v in zip(abstract, abstract[1:]):
+            if v in self._inter.get(u, ()) and self.cluster_of(u) != self.cluster_of(v):
+                path.append(v)
+            elif u == start:
+                path.extend(self._trace(start_parents, v))
+            elif v == goal:
+                # 终点出发的搜索树沿父格子走向终点
+                cell = goal_parents[u]
+                while cell is not None:
+                    path.append(cell)
+                    cell = goal_parents[cell]
+            else:
+                path.extend(self._segment(u, v))
+        return path
+
+    def _abstract_search(self, start: Cell, goal: Cell, start_links: Dict[Cell, int],
+                         goal_links: Dict[Cell, int], direct: Optional[int]) -> List[Cell]:
+        """抽象图上的A*，起点与终点作为临时节点接入，启发值为曼哈顿距离"""
+        gx, gy = goal
+        g = {start: 0}
+        parents: Dict[Cell, Optional[Cell]] = {start: None}
+        closed = set()
+        edges_of = self._edges
+        # 堆元素为 (f, -g, 节点)，f相同时优先扩展走得更远的节点
+        open_list = [(abs(start[0] - gx) + abs(start[1] - gy), 0, start)]
+        expansions = 0
+        while open_list:
+            _, neg_cost, node = heapq.heappop(open_list)
+            cost = -neg_cost
+            if node in closed:
+                continue
+            if node == goal:
+                self.abstract_expansions += expansions
+                path = []
+                while node is not None:
+                    path.append(node)
+                    node = parents[node]
+                return path[::-1]
+            closed.add(node)
+            expansions += 1
+
+            edges = edges_of.get(node, ())
+            if node == start:
+                # 起点本身是入口时同时保留入口的边
+                edges = list(edges) + list(start_links.items())
+                if direct is not None:
+                    edges.append((goal, direct))
+            elif node in goal_links:
+                edges = edges + [(goal, goal_links[node])]
+            for neighbor, weight in edges:
+                next_cost = cost + weight
+                if neighbor in closed or next_cost >= g.get(neighbor, next_cost + 1):
+                    continue
+                g[neighbor] = next_cost
+                parents[neighbor] = node
+                heapq.heappush(open_list, (next_cost + abs(neighbor[0] - gx) + abs(neighbor[1] - gy),
+                                           -next_cost, neighbor))
+        self.abstract_expansions += expansions
+        return []
+
+    def _segment(self, u: Cell, v: Cell) -> List[Cell]:
+        """同一区域内两个入口之间的路线，首次用到时搜索并缓存"""
+        cluster = self.cluster_of(u)
+        segments = self._segments[cluster]
+        path = segments.get((u, v))
+        if path is None:
+            _, parents = self._search(u, self._bounds(cluster), target=v)
+            path = segments[(u, v)] = self._trace(parents, v)
+        return path
+
+    def _repair(self, start: Cell, path: List[Cell], obstacles: Set[Cell], horizon: int) -> List[Cell]:
+        """
+        路线前horizon步内被动态障碍物挡住时，在挡住部分周围一个区域边长的矩形内局部绕行，
+        绕不过时截断到障碍物之前
+        """
+        margin = self.cluster_size
+        index = 0
+        while index < min(horizon, len(path)):
+            if path[index] not in obstacles or path[index] == path[-1]:
+                index += 1
+                continue
+            resume = index
+            while resume < len(path) - 1 and path[resume] in obstacles:
+                resume += 1
+            before = path[index - 1] if index > 0 else start
+            after = path[resume]
+            xs = [before[0], after[0]] + [cell[0] for cell in path[index:resume]]
+            ys = [before[1], after[1]] + [cell[1] for cell in path[index:resume]]
+            bounds = (max(0, min(xs) - margin), max(0, min(ys) - margin),
+                      min(self.width - 1, max(xs) + margin), min(self.height - 1, max(ys) + margin))
+            _, parents = self._search(before, bounds, obstacles, target=after)
+            if after not in parents:
+                return path[:index]
+            detour = self._trace(parents, after)
+            path = path[:index] + detour + path[resume + 1:]
+            index += len(detour)
+        return path
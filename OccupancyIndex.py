@@ -0,0 +1,55 @@
+from typing import Dict, Optional, Tuple
+from FreeCellPool import FreeCellPool
+from Position import Position
+
+
+class OccupancyIndex:
+    """
+    机器人占用索引：格子 -> 机器人ID 与 机器人ID -> 格子 双向映射
+    由机器人移动、放置、移除时增量更新，查询均为O(1)
+    """
+
+    def __init__(self, free_cells: Optional[FreeCellPool] = None):
+        """
+        :param free_cells: 空闲格子池，机器人进出格子时同步更新
+        """
+        self.cell_to_robot: Dict[Tuple[int, int], str] = {}
+        self.robot_to_cell: Dict[str, Tuple[int, int]] = {}
+        self.free_cells = free_cells
+        # 每次放置、移动或移除机器人加一，用于判断基于占用情况的缓存是否失效
+        self.version = 0
+
+    def place(self, rid: str, position: Position):
+        """把机器人放到position（已在索引中时视为移动）"""
+        old_cell = self.robot_to_cell.get(rid)
+        if old_cell is not None and self.cell_to_robot.get(old_cell) == rid:
+            del self.cell_to_robot[old_cell]
+        cell = (position.x, position.y)
+        self.version += 1
+        self.cell_to_robot[cell] = rid
+        self.robot_to_cell[rid] = cell
+        if self.free_cells is not None:
+            if old_cell is not None:
+                self.free_cells.vacate(old_cell)
+            self.free_cells.occupy(cell)
+
+    def remove(self, rid: str):
+        cell = self.robot_to_cell.pop(rid, None)
+        self.version += 1
+        if cell is not None and self.cell_to_robot.get(cell) == rid:
+            del self.cell_to_robot[cell]
+        if cell is not None and self.free_cells is not None:
+            self.free_cells.vacate(cell)
+
+    def robot_at(self, position: Position) -> Optional[str]:
+        """获取position处的机器人ID，空格子返回None"""
+        return self.cell_to_robot.get((position.x, position.y))
+
+    def is_occupied(self, position: Position) -> bool:
+        return (position.x, position.y) in self.cell_to_robot
+
+    def cell_of(self, rid: str) -> Optional[Tuple[int, int]]:
+        return self.robot_to_cell.get(rid)
+
+    def __len__(self) -> int:
+        return len(self.robot_to_cell)
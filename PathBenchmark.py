@@ -0,0 +1,383 @@
+import argparse
+import json
+import logging
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from collections import deque
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from AStar import AStar
+from AStarPlanning import AStarPlanning
+from DStarLite import DStarLite
+from GridSearch import GridSearch
+from HPAStar import HPAStar
+from Position import Position
+from ReservationTable import ReservationTable
+from SpaceTimeAStar import SpaceTimeAStar
+from TickProfiler import percentile
+from WarehouseMap import WarehouseMap, load_scenarios
+
+logger = logging.getLogger(__name__)
+
+
+class Scenario:
+    """一次寻路查询：正方形网格、静态障碍物、起点与终点"""
+
+    def __init__(self, size: int, obstacles: Set[Tuple[int, int]], start: Position, goal: Position,
+                 reachable: bool):
+        self.size = size
+        self.obstacles = obstacles
+        self.obstacle_positions = {Position(x, y) for x, y in obstacles}
+        self.start = start
+        self.goal = goal
+        self.reachable = reachable
+
+
+def make_scenario(size: int, density: float, reachable: bool, rng: random.Random) -> Scenario:
+    """
+    随机生成一次查询
+    :param size: 网格边长
+    :param density: 障碍物占格子总数的比例
+    :param reachable: True时终点从起点所在连通区域中选取；False时用障碍物围住终点，
+                      起点所在连通区域必须被完整搜索一遍才能判定无解（最坏情况）
+    """
+    cells = size * size
+    while True:
+        obstacles = {(x, y) for x, y in ((rng.randrange(size), rng.randrange(size))
+                                         for _ in range(int(cells * density)))}
+        start = (rng.randrange(size), rng.randrange(size))
+        if start in obstacles:
+            continue
+        component = _component(size, obstacles, start)
+        if reachable:
+            candidates = [cell for cell in component if cell != start]
+            if not candidates:
+                continue
+            goal = rng.choice(candidates)
+        else:
+            goal = (rng.randrange(size), rng.randrange(size))
+            gx, gy = goal
+            ring = {(gx + dx, gy + dy) for dx, dy in ((0, -1), (1, 0), (0, 1), (-1, 0))
+                    if 0 <= gx + dx < size and 0 <= gy + dy < size}
+            if goal == start or goal in obstacles or start in ring:
+                continue
+            obstacles |= ring
+        return Scenario(size, obstacles, Position(*start), Position(*goal), reachable)
+
+
+def _component(size: int, obstacles: Set[Tuple[int, int]], start: Tuple[int, int]) -> List[Tuple[int, int]]:
+    """起点所在的四连通区域"""
+    seen = {start}
+    queue = deque([start])
+    while queue:
+        x, y = queue.popleft()
+        for nx, ny in ((x, y - 1), (x + 1, y), (x, y + 1), (x - 1, y)):
+            if 0 <= nx < size and 0 <= ny < size and (nx, ny) not in seen and (nx, ny) not in obstacles:
+                seen.add((nx, ny))
+                queue.append((nx, ny))
+    return list(seen)
+
+
+def _component_labels(size: int, obstacles: Set[Tuple[int, int]]) -> Dict[Tuple[int, int], int]:
+    """给每个可通行格子标上所在四连通区域的编号，一次遍历整张地图"""
+    labels: Dict[Tuple[int, int], int] = {}
+    for y in range(size):
+        for x in range(size):
+            if (x, y) in labels or (x, y) in obstacles:
+                continue
+            label = len(labels)
+            for cell in _component(size, obstacles, (x, y)):
+                labels[cell] = label
+    return labels
+
+
+def movingai_scenarios(map_path: str, scen_path: str, limit: Optional[int] = None) -> List[Scenario]:
+    """
+    读取MovingAI的地图与场景文件，生成标准查询
+    非正方形地图在右侧或下方补上障碍物变为正方形；
+    场景文件中的最优长度按八连通计算，这里的规划器都是四连通，只用起终点，
+    起终点不在同一四连通区域时记为不可达
+    :param limit: 最多读取的查询数，默认全部
+    """
+    layout = WarehouseMap.load(map_path)
+    size = max(layout.width, layout.height)
+    obstacles = set(layout.obstacles)
+    obstacles.update((x, y) for y in range(size) for x in range(size)
+                     if x >= layout.width or y >= layout.height)
+    labels = _component_labels(size, obstacles)
+    scenarios = []
+    for entry in load_scenarios(scen_path)[:limit]:
+        start, goal = entry.start, entry.goal
+        if (start.x, start.y) in obstacles or (goal.x, goal.y) in obstacles:
+            logger.warning("跳过起点%s或终点%s位于障碍物上的查询", start, goal)
+            continue
+        reachable = labels[(start.x, start.y)] == labels[(goal.x, goal.y)]
+        scenarios.append(Scenario(size, obstacles, start, goal, reachable))
+    return scenarios
+
+
+def _grid_expansions() -> int:
+    """所有共享GridSearch实例累计展开的格子数"""
+    return GridSearch.total_expansions()
+
+
+def _astar(s: Scenario) -> Tuple[List[Position], Optional[int]]:
+    before = _grid_expansions()
+    path = AStar(None, s.size, s.size).find_path(s.start, s.goal, s.obstacles)
+    return path, _grid_expansions() - before
+
+
+def _astar_planning(s: Scenario) -> Tuple[List[Position], Optional[int]]:
+    before = _grid_expansions()
+    path = AStarPlanning.find_path(s.start, s.goal, s.obstacle_positions, (0, s.size - 1))
+    return path, _grid_expansions() - before
+
+
+def _astar_planning_1(s: Scenario) -> Tuple[List[Position], Optional[int]]:
+    before = _grid_expansions()
+    path = AStarPlanning.find_path_1(s.start, s.goal, s.obstacle_positions, (0, s.size - 1))
+    return path, _grid_expansions() - before
+
+
+def _dstar_lite(s: Scenario) -> Tuple[List[Position], Optional[int]]:
+    planner = DStarLite(s.size, s.size, s.goal)
+    path = planner.plan(s.start, s.obstacles)
+    return path, planner.expansions
+
+
+def _space_time(s: Scenario) -> Tuple[List[Position], Optional[int]]:
+    table = ReservationTable()
+    for i, (x, y) in enumerate(s.obstacles):
+        table.park(f"#{i}", Position(x, y), 0)
+    path = SpaceTimeAStar(s.size, s.size, table).find_path("bench", s.start, s.goal, 0)
+    return path, None
+
+
+# 最近一次查询所用的 (障碍物集合, 分层寻路器)：同一地图的查询共享障碍物集合，预处理只做一次
+_hierarchical: Optional[Tuple[Set[Tuple[int, int]], HPAStar]] = None
+
+
+def _hpa(s: Scenario) -> Tuple[List[Position], Optional[int]]:
+    global _hierarchical
+    if _hierarchical is None or _hierarchical[0] is not s.obstacles:
+        _hierarchical = (s.obstacles, HPAStar(s.size, s.size, s.obstacles))
+    planner = _hierarchical[1]
+    before = planner.abstract_expansions
+    path = planner.find_path(s.start, s.goal)
+    return path, planner.abstract_expansions - before
+
+
+# 规划器名称 -> 查询函数，返回 (路径, 展开格子数；不统计时为None)
+PLANNERS: Dict[str, Callable[[Scenario], Tuple[List[Position], Optional[int]]]] = {
+    "AStar.find_path": _astar,
+    "AStarPlanning.find_path": _astar_planning,
+    "AStarPlanning.find_path_1": _astar_planning_1,
+    "DStarLite.plan": _dstar_lite,
+    "SpaceTimeAStar.find_path": _space_time,
+    "HPAStar.find_path": _hpa,
+}
+
+# 需要按地图预处理的规划器：run_suite的每次查询都是新地图，只在显式指定时运行，run_map_suite默认运行
+PREPROCESSING_PLANNERS = {"HPAStar.find_path"}
+
+
+def register_planner(name: str, query: Callable[[Scenario], Tuple[List[Position], Optional[int]]]):
+    """登记新的规划器，之后的基准测试会一并计时"""
+    PLANNERS[name] = query
+
+
+def default_queries(size: int) -> int:
+    """每个测试组合的查询次数，网格越大次数越少"""
+    return max(3, min(50, 20000 // (size * size) + 3))
+
+
+def run_case(name: str, scenarios: List[Scenario]) -> Dict[str, object]:
+    """
+    对同一组查询计时一个规划器
+    :return: 查询次数、找到路径的次数、延迟分位数（毫秒）、每秒展开格子数、单次查询的峰值内存（KB）
+    """
+    query = PLANNERS[name]
+    # 预热：共享网格的相邻格子表等一次性开销不计入延迟
+    query(scenarios[0])
+    latencies = []
+    expansions = 0
+    found = 0
+    for scenario in scenarios:
+        start_time = time.perf_counter()
+        path, expanded = query(scenario)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        found += bool(path)
+        if expanded is None:
+            expansions = None
+        elif expansions is not None:
+            expansions += expanded
+
+    # 峰值内存单独测量，tracemalloc会显著拖慢计时
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    query(scenarios[0])
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    total_ms = sum(latencies)
+    ordered = sorted(latencies)
+    return {
+        "queries": len(scenarios),
+        "found": found,
+        "mean_ms": round(total_ms / len(latencies), 4),
+        "p50_ms": round(percentile(ordered, 0.5), 4),
+        "p95_ms": round(percentile(ordered, 0.95), 4),
+        "p99_ms": round(percentile(ordered, 0.99), 4),
+        "expansions": expansions,
+        "expansions_per_sec": round(expansions / (total_ms / 1000)) if expansions and total_ms > 0 else None,
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def run_suite(sizes=(20, 100, 500, 1000), densities=(0.0, 0.1, 0.2, 0.3, 0.4),
+              planners: Optional[List[str]] = None, queries: Optional[int] = None,
+              seed: int = 0) -> Dict[str, object]:
+    """
+    运行整套基准测试，每个 (网格边长, 障碍物密度, 是否可达) 组合生成一组相同的查询交给所有规划器
+    :param queries: 每个组合的查询次数，默认按网格大小递减
+    :return: 可直接保存为JSON的结果
+    """
+    if planners is None:
+        planners = [name for name in PLANNERS if name not in PREPROCESSING_PLANNERS]
+    # 基准测试测量的是完整搜索，临时关闭find_path_1的缓存
+    saved_cache, AStarPlanning.path_cache = AStarPlanning.path_cache, None
+    results = []
+    try:
+        for size in sizes:
+            for density in densities:
+                for reachable in (True, False):
+                    rng = random.Random(f"{seed}-{size}-{density}-{reachable}")
+                    count = queries or default_queries(size)
+                    scenarios = [make_scenario(size, density, reachable, rng) for _ in range(count)]
+                    for name in planners:
+                        entry = {"planner": name, "size": size, "density": density, "reachable": reachable}
+                        entry.update(run_case(name, scenarios))
+                        results.append(entry)
+                        logger.info("%s %dx%d 密度%.0f%% %s：p50 %.3fms，p95 %.3fms，峰值内存%.1fKB",
+                                    name, size, size, density * 100, "可达" if reachable else "不可达",
+                                    entry["p50_ms"], entry["p95_ms"], entry["peak_kb"])
+    finally:
+        AStarPlanning.path_cache = saved_cache
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": seed,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def run_map_suite(map_path: str, scen_path: str, planners: Optional[List[str]] = None,
+                  limit: Optional[int] = None) -> Dict[str, object]:
+    """
+    在MovingAI标准地图与场景上运行基准测试，可达与不可达的查询分别计时
+    :return: 格式与run_suite相同的结果，每条结果附带地图名
+    """
+    planners = list(PLANNERS) if planners is None else planners
+    scenarios = movingai_scenarios(map_path, scen_path, limit)
+    saved_cache, AStarPlanning.path_cache = AStarPlanning.path_cache, None
+    results = []
+    try:
+        for reachable in (True, False):
+            group = [scenario for scenario in scenarios if scenario.reachable == reachable]
+            if not group:
+                continue
+            size = group[0].size
+            density = round(len(group[0].obstacles) / (size * size), 3)
+            for name in planners:
+                entry = {"planner": name, "map": map_path, "size": size, "density": density,
+                         "reachable": reachable}
+                entry.update(run_case(name, group))
+                results.append(entry)
+                logger.info("%s %s %s：p50 %.3fms，p95 %.3fms，峰值内存%.1fKB",
+                            name, map_path, "可达" if reachable else "不可达",
+                            entry["p50_ms"], entry["p95_ms"], entry["peak_kb"])
+    finally:
+        AStarPlanning.path_cache = saved_cache
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "map": map_path,
+            "scen": scen_path,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, object], baseline: Dict[str, object],
+            tolerance: float = 0.2) -> List[str]:
+    """
+    与基线结果比较
+    :param tolerance: 允许的延迟增幅，超过 基线 * (1 + tolerance) 视为性能退化
+    :return: 退化描述列表，找到路径的次数不同也视为退化
+    """
+    def key(entry):
+        return entry["planner"], entry.get("map", ""), entry["size"], entry["density"], entry["reachable"]
+
+    previous = {key(entry): entry for entry in baseline["results"]}
+    regressions = []
+    for entry in current["results"]:
+        old = previous.get(key(entry))
+        if old is None:
+            continue
+        label = "%s %dx%d 密度%.0f%% %s" % (entry["planner"], entry["size"], entry["size"],
+                                          entry["density"] * 100, "可达" if entry["reachable"] else "不可达")
+        if entry["found"] != old["found"]:
+            regressions.append(f"{label}：找到路径{old['found']}次 -> {entry['found']}次")
+        for metric in ("p50_ms", "p95_ms"):
+            if entry[metric] > old[metric] * (1 + tolerance):
+                regressions.append(f"{label}：{metric} {old[metric]:.3f} -> {entry[metric]:.3f}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="寻路算法基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 100, 500, 1000])
+    parser.add_argument("--densities", type=float, nargs="+", default=[0.0, 0.1, 0.2, 0.3, 0.4])
+    parser.add_argument("--planners", nargs="+", choices=list(PLANNERS), default=None)
+    parser.add_argument("--queries", type=int, default=None, help="每个组合的查询次数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_results.json", help="结果JSON文件")
+    parser.add_argument("--baseline", default=None, help="基线JSON文件，存在退化时返回码为1")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--map", default=None, help="MovingAI .map 文件，与--scen一起使用时代替随机网格")
+    parser.add_argument("--scen", default=None, help="MovingAI .scen 文件")
+    parser.add_argument("--limit", type=int, default=None, help="最多使用的场景查询数")
+    args = parser.parse_args(argv)
+    if (args.map is None) != (args.scen is None):
+        parser.error("--map and --scen must be given together")
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.map is not None:
+        report = run_map_suite(args.map, args.scen, args.planners, args.limit)
+    else:
+        report = run_suite(args.sizes, args.densities, args.planners, args.queries, args.seed)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logger.info("结果已保存到%s", args.out)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            logger.warning("性能退化：%s", line)
+        if regressions:
+            return 1
+        logger.info("与基线%s相比没有性能退化", args.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+from Position import Position
+
+
+class PathCacheEntry:
+    def __init__(self, route: List[Tuple[int, int]], obstacles: FrozenSet[Tuple[int, int]]):
+        # 路线格子（不包含起点），空列表表示上次搜索无解
+        self.route = route
+        self.route_cells = frozenset(route)
+        # 缓存时的障碍物集合，复用时只检查与当前障碍物相比发生变化的格子
+        self.obstacles = obstacles
+
+
+class PathCache:
+    """
+    A*寻路结果的LRU缓存，键为 (起点, 终点, 边界, 静态布局版本)
+    复用时只检查缓存之后发生变化的障碍物格子：
+    有路线的条目要求新增的障碍物都不在路线上；无解的条目要求没有障碍物被移除
+    """
+
+    def __init__(self, capacity: int = 256):
+        """
+        :param capacity: 最多缓存的路线条数，超过时淘汰最久未使用的条目
+        """
+        self.capacity = capacity
+        self._entries: "OrderedDict[tuple, PathCacheEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # 条目存在但因障碍物变化而失效的次数（计入misses）
+        self.stale = 0
+        self.evictions = 0
+
+    @staticmethod
+    def obstacle_cells(obstacles: Iterable) -> FrozenSet[Tuple[int, int]]:
+        """把Position或坐标元组组成的障碍物集合统一为坐标元组集合"""
+        return frozenset((o.x, o.y) if isinstance(o, Position) else (o[0], o[1]) for o in obstacles)
+
+    @staticmethod
+    def _key(start: Position, goal: Position, bounds, layout_version: int) -> tuple:
+        return start.x, start.y, goal.x, goal.y, bounds, layout_version
+
+    def get(self, start: Position, goal: Position, bounds, layout_version: int,
+            obstacles: FrozenSet[Tuple[int, int]]) -> Optional[List[Position]]:
+        """
+        查找可复用的路线
+        :param obstacles: 当前障碍物坐标集合
+        :return: 路线（新的Position列表，可由调用方修改），无解条目仍有效时返回空列表，未命中返回None
+        """
+        key = self._key(start, goal, bounds, layout_version)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.route:
+            valid = (obstacles - entry.obstacles).isdisjoint(entry.route_cells)
+        else:
+            valid = entry.obstacles <= obstacles
+        if not valid:
+            del self._entries[key]
+            self.stale += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return [Position(x, y) for x, y in entry.route]
+
+    def put(self, start: Position, goal: Position, bounds, layout_version: int,
+            obstacles: FrozenSet[Tuple[int, int]], route: List[Position]):
+        key = self._key(start, goal, bounds, layout_version)
+        self._entries[key] = PathCacheEntry([(p.x, p.y) for p in route], obstacles)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """命中统计，用于调整缓存容量"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
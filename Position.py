@@ -1,20 +1,14 @@
-from dataclasses import dataclass
+from typing import NamedTuple
 
 
-@dataclass
-class Position():
+class Position(NamedTuple):
+    """
+    不可变坐标，基于元组实现：没有实例字典，哈希与相等比较由解释器内置的元组实现完成
+    与坐标元组 (x, y) 相等且哈希相同，可直接查询以坐标元组为键的字典和集合
+    """
     x: int
     y: int
 
-    def __hash__(self):
-        # 使用坐标的元组生成哈希值
-        return hash((self.x, self.y))
-
     def __add__(self, other):
         x, y = other
         return Position(self.x + x, self.y + y)
-
-    def __eq__(self, other):
-        if not isinstance(other, Position):
-            return False
-        return self.x == other.x and self.y == other.y
@@ -0,0 +1,144 @@
+from typing import Dict, List, Optional, Set, Tuple
+from Position import Position
+
+
+class ReservationTable:
+    """
+    全仓库共享的时空预约表
+    记录 (格子, tick) 与 (边, tick) 的占用情况，机器人规划路径后一次性预约整条路线
+    """
+
+    def __init__(self, slack: int = 1, goal_dwell: int = 1):
+        """
+        :param slack: 时间窗松弛量，非关键节点上两台机器人占用同一格子的时间差必须大于slack
+        :param goal_dwell: 路线终点额外保留的tick数（到达后交付/拾取所需的停留时间）
+        """
+        self.slack = slack
+        self.goal_dwell = goal_dwell
+        # 关键节点（如支付台及其相邻格子）不使用时间窗松弛
+        self.critical_cells: Set[Tuple[int, int]] = set()
+        # (x, y, t) -> rid
+        self.cells: Dict[Tuple[int, int, int], str] = {}
+        # (x1, y1, x2, y2, t) -> rid，表示在t时刻从(x1, y1)到达(x2, y2)
+        self.edges: Dict[Tuple[int, int, int, int, int], str] = {}
+        # (x, y) -> (rid, 开始停留的tick)，停留的机器人在其后所有时刻都占用该格子
+        self.parked: Dict[Tuple[int, int], Tuple[str, int]] = {}
+        # rid -> (起始tick, 路线格子列表，第一个元素为起点)
+        self.plans: Dict[str, Tuple[int, List[Tuple[int, int]]]] = {}
+        self._owned_cells: Dict[str, List[Tuple[int, int, int]]] = {}
+        self._owned_edges: Dict[str, List[Tuple[int, int, int, int, int]]] = {}
+        self._parked_at: Dict[str, Tuple[int, int]] = {}
+        # 所有路线预约中最晚的tick，此后只有停留的机器人会占用格子
+        self.latest_time = 0
+
+    def is_cell_free(self, x: int, y: int, t: int, rid: str) -> bool:
+        """检查t时刻格子(x, y)对机器人rid是否可用"""
+        cell = (x, y)
+        parked = self.parked.get(cell)
+        if parked is not None and parked[0] != rid and t >= parked[1] - self.slack:
+            return False
+        slack = 0 if cell in self.critical_cells else self.slack
+        cells = self.cells
+        for dt in range(-slack, slack + 1):
+            owner = cells.get((x, y, t + dt))
+            if owner is not None and owner != rid:
+                return False
+        return True
+
+    def is_edge_free(self, x1: int, y1: int, x2: int, y2: int, t: int, rid: str) -> bool:
+        """检查机器人rid在t时刻从(x1, y1)到达(x2, y2)是否与他人对向交换位置"""
+        owner = self.edges.get((x2, y2, x1, y1, t))
+        return owner is None or owner == rid
+
+    def is_route_free(self, rid: str, cells: List[Tuple[int, int]], t0: int) -> bool:
+        """
+        检查一条路线（第一个元素为t0时刻所在格子）是否与他人预约冲突
+        """
+        for i in range(1, len(cells)):
+            x, y = cells[i]
+            t = t0 + i
+            if not self.is_cell_free(x, y, t, rid):
+                return False
+            px, py = cells[i - 1]
+            if not self.is_edge_free(px, py, x, y, t, rid):
+                return False
+        gx, gy = cells[-1]
+        t_end = t0 + len(cells) - 1
+        for t in range(t_end + 1, t_end + self.goal_dwell + 1):
+            if not self.is_cell_free(gx, gy, t, rid):
+                return False
+        return True
+
+    def book_route(self, rid: str, cells: List[Tuple[int, int]], t0: int, park_at_goal: bool = False):
+        """
+        预约整条路线，会先释放该机器人之前的全部预约
+        :param rid: 机器人ID
+        :param cells: 路线格子列表，第一个元素为t0时刻所在格子
+        :param t0: 路线起始tick
+        :param park_at_goal: 到达终点后是否一直停留（无后续任务）
+        """
+        self.release(rid)
+        owned_cells = []
+        owned_edges = []
+        for i, (x, y) in enumerate(cells):
+            key = (x, y, t0 + i)
+            self.cells[key] = rid
+            owned_cells.append(key)
+            if i > 0:
+                px, py = cells[i - 1]
+                if (px, py) != (x, y):
+                    edge = (px, py, x, y, t0 + i)
+                    self.edges[edge] = rid
+                    owned_edges.append(edge)
+        gx, gy = cells[-1]
+        t_end = t0 + len(cells) - 1
+        if park_at_goal:
+            self.parked[(gx, gy)] = (rid, t_end)
+            self._parked_at[rid] = (gx, gy)
+        else:
+            for t in range(t_end + 1, t_end + self.goal_dwell + 1):
+                key = (gx, gy, t)
+                self.cells[key] = rid
+                owned_cells.append(key)
+        self._owned_cells[rid] = owned_cells
+        self._owned_edges[rid] = owned_edges
+        self.latest_time = max(self.latest_time, t_end + self.goal_dwell)
+        self.plans[rid] = (t0, list(cells))
+
+    def park(self, rid: str, position: Position, t: int):
+        """机器人在position处停留，从t时刻开始一直占用该格子"""
+        self.release(rid)
+        cell = (position.x, position.y)
+        self.parked[cell] = (rid, t)
+        self._parked_at[rid] = cell
+        self.plans[rid] = (t, [cell])
+        self.latest_time = max(self.latest_time, t)
+
+    def is_parked(self, rid: str) -> bool:
+        return rid in self._parked_at
+
+    def release(self, rid: str):
+        """释放机器人的全部预约"""
+        for key in self._owned_cells.pop(rid, ()):
+            if self.cells.get(key) == rid:
+                del self.cells[key]
+        for key in self._owned_edges.pop(rid, ()):
+            if self.edges.get(key) == rid:
+                del self.edges[key]
+        cell = self._parked_at.pop(rid, None)
+        if cell is not None and self.parked.get(cell, (None,))[0] == rid:
+            del self.parked[cell]
+        self.plans.pop(rid, None)
+
+    def position_at(self, rid: str, t: int) -> Optional[Tuple[int, int]]:
+        """按预约计算机器人在t时刻应处的格子，没有预约时返回None"""
+        plan = self.plans.get(rid)
+        if plan is None:
+            return None
+        t0, cells = plan
+        index = t - t0
+        if index < 0:
+            return cells[0]
+        if index >= len(cells):
+            return cells[-1]
+        return cells[index]
@@ -0,0 +1,117 @@
+from array import array
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+from Position import Position
+
+
+class RouteHistory:
+    """
+    机器人历史路径的紧凑存储
+    每条记录打包为一个32位整数：(y * width + x) * 4 + 状态（0 = 其他位置，1 = 取货点，2 = 支付台）；
+    capacity 为None时保留全部记录，否则只在内存中保留最近 capacity 条（环形缓冲区），
+    设置 spill_path 时被覆盖前的记录按时间顺序追加写入该文件
+    同时维护最近一次状态非0之后的记录数，供优先级计算O(1)读取
+    """
+
+    TYPECODE = "I"
+
+    def __init__(self, width: int = 1 << 16, capacity: Optional[int] = None, spill_path: Optional[str] = None):
+        """
+        :param width: 仓库宽，用于把坐标打包为格子编号
+        :param capacity: 内存中保留的最大记录数，None表示不限
+        :param spill_path: 溢出文件路径，仅在设置capacity时生效
+        """
+        self.width = width
+        self.capacity = capacity
+        self.spill_path = spill_path if capacity else None
+        self._buffer = array(self.TYPECODE, [0] * capacity) if capacity else array(self.TYPECODE)
+        self._next = 0  # 环形缓冲区中下一条记录的写入位置
+        self.total = 0  # 累计记录数（包括已被覆盖或写入文件的记录）
+        self._spilled = 0  # 已写入溢出文件的记录数
+        self._spill_file: Optional[BinaryIO] = None
+        # 最近一次状态非0（位于取货点或支付台）之后的记录数
+        self.ticks_since_status = 0
+
+    def append(self, position: Position, status: int):
+        packed = ((position.y * self.width + position.x) << 2) | status
+        if status:
+            self.ticks_since_status = 0
+        else:
+            self.ticks_since_status += 1
+        self.total += 1
+        if not self.capacity:
+            self._buffer.append(packed)
+            return
+        self._buffer[self._next] = packed
+        self._next += 1
+        if self._next == self.capacity:
+            self._next = 0
+            # 缓冲区写满一圈，下一条记录会覆盖最旧的记录，先把未写入文件的记录写出
+            if self.spill_path is not None:
+                self.flush()
+
+    def _decode(self, packed: int) -> Tuple[Position, int]:
+        cell = packed >> 2
+        return Position(cell % self.width, cell // self.width), packed & 3
+
+    def _ordered(self, count: int) -> array:
+        """内存中最近count条记录，按时间顺序"""
+        if not self.capacity:
+            return self._buffer[len(self._buffer) - count:]
+        start = (self._next - count) % self.capacity
+        if start + count <= self.capacity:
+            return self._buffer[start:start + count]
+        return self._buffer[start:] + self._buffer[:self._next]
+
+    def flush(self):
+        """把尚未写入溢出文件的记录追加到文件"""
+        if self.spill_path is None:
+            return
+        pending = self.total - self._spilled
+        if pending <= 0:
+            return
+        if self._spill_file is None:
+            self._spill_file = open(self.spill_path, "ab")
+        self._ordered(pending).tofile(self._spill_file)
+        self._spill_file.flush()
+        self._spilled = self.total
+
+    def close(self):
+        """写出剩余记录并关闭溢出文件"""
+        self.flush()
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    @classmethod
+    def read_spilled(cls, path: str, width: int) -> List[Tuple[Position, int]]:
+        """读取溢出文件中的全部记录"""
+        packed = array(cls.TYPECODE)
+        with open(path, "rb") as f:
+            data = f.read()
+        packed.frombytes(data[:len(data) - len(data) % packed.itemsize])
+        history = cls(width)
+        return [history._decode(value) for value in packed]
+
+    def __len__(self) -> int:
+        """内存中保留的记录数"""
+        return min(self.total, self.capacity) if self.capacity else self.total
+
+    def __iter__(self) -> Iterator[Tuple[Position, int]]:
+        """按时间顺序遍历内存中的记录 (位置, 状态)"""
+        for packed in self._ordered(len(self)):
+            yield self._decode(packed)
+
+    def __reversed__(self) -> Iterator[Tuple[Position, int]]:
+        for packed in reversed(self._ordered(len(self))):
+            yield self._decode(packed)
+
+    def __getitem__(self, index: int) -> Tuple[Position, int]:
+        """按时间顺序取内存中的第index条记录，支持负数下标"""
+        size = len(self)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("history index out of range")
+        if not self.capacity:
+            return self._decode(self._buffer[index])
+        return self._decode(self._buffer[(self._next - size + index) % self.capacity])
@@ -0,0 +1,220 @@
+from typing import Dict, Iterable, List, Tuple, Optional
+import heapq
+from DistanceFieldCache import DistanceFieldCache
+from Direction import Direction
+from Position import Position
+from ReservationTable import ReservationTable
+
+
+class SpaceTimeAStar:
+    """
+    时空A*：在 (x, y, t) 状态空间中搜索，允许原地等待，
+    通过共享的预约表避开其他机器人在对应时刻占用的格子与边
+    给出window时为窗口化的WHCA*：只在前window个时间步内解决冲突，
+    窗口外以距离场的真实步数估计剩余代价，返回路线的前window步
+    """
+
+    def __init__(self, width: int, height: int, table: ReservationTable,
+                 distance_fields: Optional[DistanceFieldCache] = None,
+                 static_obstacles: Iterable[Tuple[int, int]] = ()):
+        """
+        :param distance_fields: 固定目标的距离场，目标有距离场时用作启发值，否则使用曼哈顿距离
+        :param static_obstacles: 静态障碍物（货架、墙）坐标，从可达格子表中去掉，不进入预约表
+        """
+        self.width = width
+        self.height = height
+        self.table = table
+        self.distance_fields = distance_fields
+        self.static_obstacles = frozenset(static_obstacles)
+        # 累计展开的状态数
+        self.expansions = 0
+        # 四个移动方向加原地等待
+        self.moves = Direction.get_directions() + ((0, 0),)
+        # 去掉静态障碍物后的可达格子表，没有静态障碍物时使用共享表
+        self._static_moves = None
+        if self.static_obstacles:
+            moves = self._tables()[3]
+            blocked = {x * height + y for x, y in self.static_obstacles if 0 <= x < width and 0 <= y < height}
+            self._static_moves = [() if column in blocked else
+                                  tuple(next_column for next_column in moves[column] if next_column not in blocked)
+                                  for column in range(width * height)]
+
+    # (width, height) -> 按 x * height + y 编号的格子表，见 _tables
+    _shared_tables: Dict[Tuple[int, int], tuple] = {}
+
+    def _tables(self) -> tuple:
+        """
+        按 x * height + y 编号的格子表，同尺寸的实例共享
+        :return: (编号 -> x, 编号 -> y, 编号 -> 距离场下标 y * width + x, 编号 -> 按self.moves顺序的可达格子编号)
+        """
+        width, height = self.width, self.height
+        tables = SpaceTimeAStar._shared_tables.get((width, height))
+        if tables is None:
+            size = width * height
+            xs = [column // height for column in range(size)]
+            ys = [column % height for column in range(size)]
+            flat = [ys[column] * width + xs[column] for column in range(size)]
+            moves = [tuple((xs[column] + dx) * height + ys[column] + dy for dx, dy in self.moves
+                           if 0 <= xs[column] + dx < width and 0 <= ys[column] + dy < height)
+                     for column in range(size)]
+            tables = SpaceTimeAStar._shared_tables[(width, height)] = (xs, ys, flat, moves)
+        return tables
+
+    @staticmethod
+    def manhattan_distance(x1: int, y1: int, x2: int, y2: int) -> int:
+        return abs(x1 - x2) + abs(y1 - y2)
+
+    def find_path(self, rid: str, start: Position, goal: Position, start_time: int,
+                  max_steps: Optional[int] = None, check_reachable: bool = False,
+                  window: Optional[int] = None, max_expansions: Optional[int] = None) -> List[Position]:
+        """
+        时空A*寻路
+        :param rid: 规划路径的机器人ID，自己的预约不视为障碍
+        :param start: start_time时刻所在位置
+        :param goal: 终点
+        :param start_time: 起始tick
+        :param max_steps: 最大搜索时间步数，默认曼哈顿距离加上仓库长宽之和
+        :param check_reachable: 搜索前先检查终点是否被停留的机器人完全围住，围住时直接返回
+        :param window: 冲突检测的时间窗口，窗口内到不了终点时返回前window步（以 window + 剩余距离 最小为准）；
+                       启发值使用任意终点的距离场（DistanceFieldCache.field_for），
+                       搜索规模只与窗口有关，不做check_reachable的全图检查
+        :param max_expansions: 最多展开的状态数，超过时视为规划失败；终点被长时间占用时
+                               不设上限的搜索要展开整个 (x, y, t) 空间才能失败
+        :return: 路径列表（不包含起点），第i个元素为start_time+i+1时刻所在位置，可能包含原地等待
+        """
+        if start == goal:
+            return []
+
+        table = self.table
+        width, height = self.width, self.height
+        gx, gy = goal.x, goal.y
+        if not (0 <= gx < width and 0 <= gy < height) or (gx, gy) in self.static_obstacles:
+            return []
+        parked = table.parked.get((gx, gy))
+        if parked is not None and parked[0] != rid:
+            return []
+        if check_reachable and window is None and not self._statically_reachable(rid, start, goal):
+            return []
+
+        if self.distance_fields is None:
+            field = None
+        elif window is not None:
+            field = self.distance_fields.field_for(goal)
+        else:
+            field = self.distance_fields.get(goal)
+        if field is not None:
+            h0 = field[start.y * width + start.x]
+            if h0 < 0:
+                return []
+        else:
+            h0 = self.manhattan_distance(start.x, start.y, gx, gy)
+        if max_steps is None:
+            max_steps = h0 + width + height
+        if window is not None:
+            max_steps = min(max_steps, window)
+        # 超过预约表中最晚时刻后，格子是否可用与时间无关，之后的时间层合并为同一层
+        t_cap = max(table.latest_time + table.slack + 1, start_time + 1)
+
+        # 状态打包为整数 (x * height + y) * span + (t - start_time)，整数的大小顺序与 (x, y, t) 元组一致，
+        # 因此堆中相同 (f, -g) 的状态出队顺序与按元组存储时相同；数值较小，不需要多位的大整数
+        xs, ys, flat, moves = self._tables()
+        if self._static_moves is not None:
+            moves = self._static_moves
+        span = max_steps + 1
+        start_state = (start.x * height + start.y) * span
+        came_from = {}
+        # 合并的时间层中同一状态可以由不同的g到达（g不再等于 t - start_time），
+        # 因此记录每个状态的最小g，出队时关闭，更小的g到达时重新入堆
+        best_g = {start_state: 0}
+        closed = set()
+        # 堆元素为 (f, -g, 状态)，f相同时优先扩展走得更远的状态
+        open_list = [(h0, 0, start_state)]
+        budget = max_expansions if max_expansions is not None else -1
+
+        while open_list and budget != 0:
+            budget -= 1
+            self.expansions += 1
+            f, neg_g, state = heapq.heappop(open_list)
+            if state in closed:
+                continue
+            closed.add(state)
+            g = -neg_g
+            column, t = divmod(state, span)
+            t += start_time
+            x, y = xs[column], ys[column]
+
+            if x == gx and y == gy and self._goal_holdable(rid, x, y, t):
+                return self._reconstruct(came_from, state, span, xs, ys)
+            # 到达窗口边界：窗口外不再检测冲突，f = window + 剩余距离最小的状态即为结果
+            if window is not None and g >= window and self._goal_holdable(rid, x, y, t):
+                return self._reconstruct(came_from, state, span, xs, ys)
+
+            # 以g而不是t计算深度：合并的时间层中t停在t_cap不再增加
+            if g >= max_steps:
+                continue
+            nt = min(t + 1, t_cap)
+            ng = g + 1
+            for next_column in moves[column]:
+                next_state = next_column * span + nt - start_time
+                if next_state in closed or best_g.get(next_state, ng + 1) <= ng:
+                    continue
+                nx, ny = xs[next_column], ys[next_column]
+                if not table.is_cell_free(nx, ny, nt, rid):
+                    continue
+                if next_column != column and not table.is_edge_free(x, y, nx, ny, nt, rid):
+                    continue
+                if field is not None:
+                    h = field[flat[next_column]]
+                    if h < 0:
+                        continue
+                else:
+                    h = abs(nx - gx) + abs(ny - gy)
+                best_g[next_state] = ng
+                came_from[next_state] = state
+                heapq.heappush(open_list, (ng + h, -ng, next_state))
+
+        return []
+
+    def _statically_reachable(self, rid: str, start: Position, goal: Position) -> bool:
+        """忽略时间维度，把其他停留的机器人与静态障碍物视为墙，广度优先检查终点是否可达"""
+        parked = self.table.parked
+        height = self.height
+        xs, ys, _, moves = self._tables()
+        if self._static_moves is not None:
+            moves = self._static_moves
+        target = goal.x * height + goal.y
+        source = start.x * height + start.y
+        visited = {source}
+        frontier = [source]
+        while frontier:
+            next_frontier = []
+            for column in frontier:
+                for next_column in moves[column]:
+                    if next_column == target:
+                        return True
+                    if next_column in visited:
+                        continue
+                    visited.add(next_column)
+                    owner = parked.get((xs[next_column], ys[next_column]))
+                    if owner is not None and owner[0] != rid:
+                        continue
+                    next_frontier.append(next_column)
+            frontier = next_frontier
+        return False
+
+    def _goal_holdable(self, rid: str, x: int, y: int, t: int) -> bool:
+        """到达终点后需要在终点停留goal_dwell个tick"""
+        for dt in range(1, self.table.goal_dwell + 1):
+            if not self.table.is_cell_free(x, y, t + dt, rid):
+                return False
+        return True
+
+    @staticmethod
+    def _reconstruct(came_from: Dict[int, int], state: int, span: int,
+                     xs: List[int], ys: List[int]) -> List[Position]:
+        path = []
+        while state in came_from:
+            column = state // span
+            path.append(Position(xs[column], ys[column]))
+            state = came_from[state]
+        return path[::-1]
@@ -0,0 +1,183 @@
+from typing import Dict, List, Optional
+from DistanceFieldCache import DistanceFieldCache
+from Position import Position
+
+
+class TaskAssigner:
+    """
+    空闲机器人与未拾取货架的最小代价匹配
+    代价为机器人到货架的真实步数（货架的距离场），没有距离场时退回曼哈顿距离；
+    小批量用匈牙利算法求最优解，大批量用后悔值贪心近似
+    """
+
+    def __init__(self, distance_fields: Optional[DistanceFieldCache] = None, hungarian_limit: int = 100):
+        """
+        :param distance_fields: 货架距离场
+        :param hungarian_limit: 机器人数与货架数都不超过该值时使用匈牙利算法
+        """
+        self.distance_fields = distance_fields
+        self.hungarian_limit = hungarian_limit
+        # 统计：求解批次、各方法使用次数、分配的任务数与总代价
+        self.batches = 0
+        self.hungarian_batches = 0
+        self.regret_batches = 0
+        self.assigned = 0
+        self.total_cost = 0
+
+    def cost(self, robot_position: Position, task_position: Position) -> Optional[int]:
+        """机器人到货架的步数，静态布局下不可达时返回None"""
+        if self.distance_fields is not None:
+            distance = self.distance_fields.distance(task_position, robot_position)
+            if distance is not None:
+                return None if distance < 0 else distance
+        return abs(robot_position.x - task_position.x) + abs(robot_position.y - task_position.y)
+
+    def assign(self, robots: Dict[str, Position], tasks: Dict[str, Position]) -> Dict[str, str]:
+        """
+        一次性为一批空闲机器人分配货架，每个货架最多分给一台机器人
+        :param robots: 机器人ID -> 当前位置
+        :param tasks: 货架ID -> 位置
+        :return: 机器人ID -> 货架ID，机器人多于货架或货架不可达时部分机器人不出现在结果中
+        """
+        if not robots or not tasks:
+            return {}
+        robot_ids = list(robots)
+        task_ids = list(tasks)
+        # 不可达的组合使用一个大于任何可行解的代价，求解后再剔除
+        unreachable = (len(robot_ids) + 1) * (self._max_cost(tasks) + 1)
+        cost = []
+        for rid in robot_ids:
+            row = []
+            for tid in task_ids:
+                c = self.cost(robots[rid], tasks[tid])
+                row.append(unreachable if c is None else c)
+            cost.append(row)
+
+        self.batches += 1
+        if max(len(robot_ids), len(task_ids)) <= self.hungarian_limit:
+            self.hungarian_batches += 1
+            matching = self.hungarian(cost)
+        else:
+            self.regret_batches += 1
+            matching = self.regret_greedy(cost)
+
+        result = {}
+        for row, col in enumerate(matching):
+            if col is None or cost[row][col] >= unreachable:
+                continue
+            result[robot_ids[row]] = task_ids[col]
+            self.total_cost += cost[row][col]
+        self.assigned += len(result)
+        return result
+
+    def _max_cost(self, tasks: Dict[str, Position]) -> int:
+        if self.distance_fields is not None:
+            return self.distance_fields.width * self.distance_fields.height
+        xs = [p.x for p in tasks.values()]
+        ys = [p.y for p in tasks.values()]
+        return (max(xs) - min(xs) + 1) * (max(ys) - min(ys) + 1) * 4
+
+    @staticmethod
+    def hungarian(cost: List[List[int]]) -> List[Optional[int]]:
+        """
+        匈牙利算法（带势函数的最短增广路实现，O(n^2 m)），支持矩形代价矩阵
+        :param cost: cost[i][j] 为第i台机器人执行第j个任务的代价
+        :return: 每台机器人分到的任务下标，机器人多于任务时未分到的为None
+        """
+        n = len(cost)
+        m = len(cost[0])
+        if n > m:
+            # 机器人多于任务：转置后求解，再映射回机器人
+            transposed = [[cost[i][j] for i in range(n)] for j in range(m)]
+            result: List[Optional[int]] = [None] * n
+            for j, i in enumerate(TaskAssigner.hungarian(transposed)):
+                result[i] = j
+            return result
+
+        inf = float("inf")
+        # 下标从1开始，0为虚拟节点
+        u = [0] * (n + 1)
+        v = [0] * (m + 1)
+        match = [0] * (m + 1)
+        way = [0] * (m + 1)
+        for i in range(1, n + 1):
+            match[0] = i
+            j0 = 0
+            min_v = [inf] * (m + 1)
+            used = [False] * (m + 1)
+            while True:
+                used[j0] = True
+                i0 = match[j0]
+                row = cost[i0 - 1]
+                delta = inf
+                j1 = 0
+                for j in range(1, m + 1):
+                    if used[j]:
+                        continue
+                    current = row[j - 1] - u[i0] - v[j]
+                    if current < min_v[j]:
+                        min_v[j] = current
+                        way[j] = j0
+                    if min_v[j] < delta:
+                        delta = min_v[j]
+                        j1 = j
+                for j in range(m + 1):
+                    if used[j]:
+                        u[match[j]] += delta
+                        v[j] -= delta
+                    else:
+                        min_v[j] -= delta
+                j0 = j1
+                if match[j0] == 0:
+                    break
+            while j0:
+                j1 = way[j0]
+                match[j0] = match[j1]
+                j0 = j1
+
+        result = [None] * n
+        for j in range(1, m + 1):
+            if match[j]:
+                result[match[j] - 1] = j - 1
+        return result
+
+    @staticmethod
+    def regret_greedy(cost: List[List[int]]) -> List[Optional[int]]:
+        """
+        后悔值贪心（O(n^2 + nm log m)）：每轮选择“最优任务被抢走后损失最大”的机器人，
+        把它当前最优的空闲任务分给它
+        :return: 每台机器人分到的任务下标，未分到的为None
+        """
+        n = len(cost)
+        m = len(cost[0])
+        # 每台机器人的任务按代价排序，指针跳过已被分配的任务
+        preferences = [sorted(range(m), key=row.__getitem__) for row in cost]
+        pointers = [0] * n
+        taken = [False] * m
+        result: List[Optional[int]] = [None] * n
+        remaining = set(range(n))
+
+        def next_free(i: int, start: int) -> int:
+            order = preferences[i]
+            k = start
+            while k < m and taken[order[k]]:
+                k += 1
+            return k
+
+        for _ in range(min(n, m)):
+            best_robot = None
+            best_key = None
+            for i in remaining:
+                k = pointers[i] = next_free(i, pointers[i])
+                first = cost[i][preferences[i][k]]
+                k2 = next_free(i, k + 1)
+                second = cost[i][preferences[i][k2]] if k2 < m else first
+                # 后悔值相同时优先代价更小的机器人
+                key = (second - first, -first)
+                if best_key is None or key > best_key:
+                    best_robot, best_key = i, key
+            task = preferences[best_robot][pointers[best_robot]]
+            taken[task] = True
+            result[best_robot] = task
+            remaining.discard(best_robot)
+        return result
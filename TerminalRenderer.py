@@ -0,0 +1,127 @@
+import sys
+import threading
+import time
+from typing import Dict, Optional, TextIO, Tuple
+from TickProfiler import TimerStats
+
+
+class TerminalRenderer:
+    """
+    差分终端渲染器：在独立线程中按固定帧率读取仓库快照，
+    只用ANSI光标移动重写与上一帧不同的格子，渲染不占用仿真线程的时间
+    画面布局与 Warehouse.display_warehouse 一致
+    """
+
+    CELL_WIDTH = 8
+    # 表头与上边框各占一行，第y行格子位于终端第 3 + y 行
+    FIRST_ROW = 3
+
+    def __init__(self, warehouse, fps: float = 10.0, stream: Optional[TextIO] = None):
+        """
+        :param warehouse: 要显示的仓库，需提供 snapshot()
+        :param fps: 每秒渲染帧数
+        :param stream: 输出流，默认标准输出
+        """
+        self.warehouse = warehouse
+        self.fps = fps
+        self.stream = stream if stream is not None else sys.stdout
+        self.frames = 0
+        self.cells_written = 0
+        # 每帧渲染耗时（毫秒），只由渲染线程写入，不与仿真线程共用profiler
+        self.timings = TimerStats(1000)
+        self._previous: Optional[Dict[Tuple[int, int], str]] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def _row_prefix_width(self) -> int:
+        """每行开头的 "NN   |" 所占列数，行号位数随仓库高度增加；第x个格子从第 prefix + 1 + 8x 列开始（终端行列从1开始）"""
+        return self.warehouse.row_label_width + 4
+
+    @property
+    def _status_row(self) -> int:
+        """tick数所在的终端行：地图、下边框、图例与一个空行之后"""
+        return self.FIRST_ROW + self.warehouse.height + 1 + len(self.warehouse.LEGEND) + 1
+
+    def start(self):
+        """启动渲染线程"""
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="TerminalRenderer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止渲染线程，补画最后一帧并把光标移到画面下方"""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self.render_once()
+        self.stream.write(f"\033[{self._status_row + 2};1H\n")
+        self.stream.flush()
+
+    def _run(self):
+        interval = 1.0 / self.fps
+        next_frame = time.perf_counter()
+        while not self._stop_event.is_set():
+            self.render_once()
+            next_frame += interval
+            delay = next_frame - time.perf_counter()
+            if delay < 0:
+                # 渲染跟不上帧率时丢帧，不累计欠下的帧
+                next_frame = time.perf_counter()
+                delay = 0
+            self._stop_event.wait(delay)
+
+    def render_once(self) -> int:
+        """
+        渲染一帧，第一帧完整绘制，之后只重写变化的格子
+        :return: 本帧写出的格子数
+        """
+        start_time = time.perf_counter()
+        cells, tick_count, move_count = self.warehouse.snapshot()
+        if self._previous is None:
+            frame, written = self._full_frame(cells), self.warehouse.width * self.warehouse.height
+        else:
+            frame, written = self._diff_frame(cells)
+        frame += self._status(tick_count, move_count)
+        self.stream.write(frame)
+        self.stream.flush()
+        self._previous = cells
+        self.frames += 1
+        self.cells_written += written
+        self.timings.add((time.perf_counter() - start_time) * 1000)
+        return written
+
+    def _full_frame(self, cells: Dict[Tuple[int, int], str]) -> str:
+        warehouse = self.warehouse
+        empty = warehouse.EMPTY_CELL
+        digits = warehouse.row_label_width
+        indent = " " * (digits + 3)
+        lines = [indent + "".join(f"{i:^8}" for i in range(warehouse.width)),
+                 indent + "+" + "--------" * warehouse.width + "+"]
+        for y in range(warehouse.height):
+            lines.append(f"{y:{digits}}   |" + "".join(cells.get((x, y), empty) for x in range(warehouse.width)) + "|")
+        lines.append(indent + "+" + "--------" * warehouse.width + "+")
+        lines.extend(warehouse.LEGEND)
+        return "\033[2J\033[H" + "\n".join(lines)
+
+    def _diff_frame(self, cells: Dict[Tuple[int, int], str]) -> Tuple[str, int]:
+        empty = self.warehouse.EMPTY_CELL
+        previous = self._previous
+        column = self._row_prefix_width + 1
+        parts = []
+        for cell in previous.keys() | cells.keys():
+            content = cells.get(cell, empty)
+            if content == previous.get(cell, empty):
+                continue
+            x, y = cell
+            parts.append(f"\033[{self.FIRST_ROW + y};{column + x * self.CELL_WIDTH}H{content}")
+        return "".join(parts), len(parts)
+
+    def _status(self, tick_count: int, move_count: int) -> str:
+        row = self._status_row
+        return (f"\033[{row};1H当前tick数: {tick_count}\033[K"
+                f"\033[{row + 1};1H成功移动次数: {move_count}\033[K")
@@ -0,0 +1,159 @@
+import json
+from collections import deque
+from time import perf_counter
+from typing import Deque, Dict, Optional, Sequence
+
+
+def percentile(ordered: Sequence[float], q: float) -> float:
+    """已排序数据的分位数（最近秩），q取值0~1"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class _NullPhase:
+    """关闭计时时使用的空上下文，进入和退出都不做任何事"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "TickProfiler", name: str):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.record(self.name, (perf_counter() - self.start) * 1000)
+        return False
+
+
+class TimerStats:
+    """一个命名计时器：累计次数、总耗时、最大值，以及最近window次耗时的滚动窗口（用于分位数）"""
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.recent: Deque[float] = deque(maxlen=window)
+
+    def add(self, ms: float):
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+        self.recent.append(ms)
+
+    def as_dict(self) -> Dict[str, float]:
+        ordered = sorted(self.recent)
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 4) if self.count else 0.0,
+            "p50_ms": round(percentile(ordered, 0.5), 4),
+            "p95_ms": round(percentile(ordered, 0.95), 4),
+            "p99_ms": round(percentile(ordered, 0.99), 4),
+            "max_ms": round(self.max_ms, 4),
+        }
+
+
+class TickProfiler:
+    """
+    tick各阶段的计时与计数
+    计时器之间可以嵌套（如 move_all 内包含 plan 与 collision），每个计时器记录的都是包含子阶段的耗时；
+    关闭时 phase 返回共享的空上下文、count 直接返回，开销只有一次属性判断
+    """
+
+    def __init__(self, enabled: bool = False, window: int = 1000):
+        """
+        :param enabled: 是否记录
+        :param window: 每个计时器保留最近多少次耗时用于计算分位数
+        """
+        self.enabled = enabled
+        self.window = window
+        self.timers: Dict[str, TimerStats] = {}
+        self.counters: Dict[str, int] = {}
+        # 机器人ID -> 路径规划次数
+        self.replans: Dict[str, int] = {}
+
+    def phase(self, name: str):
+        """
+        计时上下文：with profiler.phase("plan"): ...
+        """
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def record(self, name: str, ms: float):
+        """记录一次耗时，可用于在外部已经测得耗时的阶段"""
+        if not self.enabled:
+            return
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = TimerStats(self.window)
+        timer.add(ms)
+
+    def count(self, name: str, n: int = 1):
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def count_replan(self, rid: str):
+        if not self.enabled:
+            return
+        self.replans[rid] = self.replans.get(rid, 0) + 1
+
+    def reset(self):
+        self.timers.clear()
+        self.counters.clear()
+        self.replans.clear()
+
+    def report(self) -> Dict[str, object]:
+        """可序列化的统计结果"""
+        return {
+            "timers": {name: timer.as_dict() for name, timer in sorted(self.timers.items())},
+            "counters": dict(sorted(self.counters.items())),
+            "replans": dict(sorted(self.replans.items(), key=lambda item: -item[1])),
+        }
+
+    def summary(self, top_robots: int = 10) -> str:
+        """
+        文本形式的统计摘要，计时器按总耗时降序排列
+        :param top_robots: 列出路径规划次数最多的前几台机器人
+        """
+        # 表头使用ASCII，中文字符在终端中占两列会破坏对齐
+        lines = [f"{'phase':<14}{'count':>9}{'total_ms':>12}{'mean_ms':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}"]
+        for name, timer in sorted(self.timers.items(), key=lambda item: -item[1].total_ms):
+            s = timer.as_dict()
+            lines.append(f"{name:<14}{s['count']:>9}{s['total_ms']:>12.1f}{s['mean_ms']:>10.3f}"
+                         f"{s['p50_ms']:>9.3f}{s['p95_ms']:>9.3f}{s['p99_ms']:>9.3f}{s['max_ms']:>9.3f}")
+        if self.counters:
+            lines.append("计数: " + ", ".join(f"{name}={value}" for name, value in sorted(self.counters.items())))
+        if self.replans:
+            busiest = sorted(self.replans.items(), key=lambda item: -item[1])[:top_robots]
+            lines.append("规划次数最多的机器人: " + ", ".join(f"{rid}={n}" for rid, n in busiest))
+        return "\n".join(lines)
+
+    def export(self, path: str, extra: Optional[Dict[str, object]] = None):
+        """
+        以JSON格式导出统计结果
+        :param extra: 一并写入的附加信息（如运行参数 Warehouse.run_config()）
+        """
+        data = self.report()
+        if extra:
+            data["run"] = extra
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,498 @@
+import time
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from Position import Position
+
+# 四个移动方向：上、下、左、右（与Direction一致）
+_DX = np.array([0, 0, -1, 1], dtype=np.int64)
+_DY = np.array([-1, 1, 0, 0], dtype=np.int64)
+
+
+class RobotView:
+    """VectorWarehouse中单个机器人的只读视图，提供与Robot相同的属性"""
+
+    def __init__(self, warehouse: 'VectorWarehouse', index: int):
+        self._wh = warehouse
+        self._index = index
+
+    @property
+    def robot_id(self) -> str:
+        return self._wh.robot_ids[self._index]
+
+    @property
+    def position(self) -> Position:
+        return self._wh.cell_to_position(int(self._wh.cell[self._index]))
+
+    @property
+    def target(self) -> Optional[Position]:
+        target = int(self._wh.target[self._index])
+        return None if target < 0 else self._wh.cell_to_position(target)
+
+    @property
+    def carrying_item(self) -> Optional[str]:
+        source = self.item_source
+        return None if source is None else source[1:]
+
+    @property
+    def item_source(self) -> Optional[str]:
+        if not self._wh.carrying[self._index]:
+            return None
+        return self._wh.pickup_ids[int(self._wh.assigned_pickup[self._index])]
+
+    @property
+    def future_route(self) -> List[Position]:
+        wh = self._wh
+        i = self._index
+        cells = wh.route[i, wh.route_cursor[i]:wh.route_len[i]]
+        return [wh.cell_to_position(int(c)) for c in cells]
+
+
+class _RobotsView(Mapping):
+    """robot_id -> RobotView 的映射视图"""
+
+    def __init__(self, warehouse: 'VectorWarehouse'):
+        self._wh = warehouse
+
+    def __getitem__(self, rid: str) -> RobotView:
+        return RobotView(self._wh, self._wh.robot_index[rid])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._wh.robot_index)
+
+    def __len__(self) -> int:
+        return len(self._wh.robot_index)
+
+
+class VectorWarehouse:
+    """
+    结构数组（struct-of-arrays）形式的仓库状态：
+    机器人位置、目标、携带标记、路线游标与网格占用都保存在NumPy数组中，
+    每个tick只做几步向量化运算：计算下一格、检测冲突、提交移动
+    用于上千台机器人、500x500规模的仿真；robots / tick / add_robot_with_pickup 与 Warehouse 保持一致
+    """
+
+    def __init__(self, width: int, height: int, robot_capacity: int = 64, route_capacity: int = 16,
+                 seed: Optional[int] = None):
+        self.width = width
+        self.height = height
+        self.delivery_station = Position(width - 1, height - 1)
+        self.station_cell = self.position_to_cell(self.delivery_station)
+        self.rng = np.random.default_rng(seed)
+
+        # 机器人数组，按下标存储
+        self.robot_ids: List[str] = []
+        self.robot_index: Dict[str, int] = {}
+        self.cell = np.full(robot_capacity, -1, dtype=np.int64)  # 所在格子（扁平下标 y*width+x）
+        self.target = np.full(robot_capacity, -1, dtype=np.int64)  # 目标格子，-1为无目标
+        self.carrying = np.zeros(robot_capacity, dtype=bool)
+        self.assigned_pickup = np.full(robot_capacity, -1, dtype=np.int64)  # 前往/携带的取货点下标
+        self.alive = np.zeros(robot_capacity, dtype=bool)
+        self.route = np.full((robot_capacity, route_capacity), -1, dtype=np.int64)
+        self.route_len = np.zeros(robot_capacity, dtype=np.int64)
+        self.route_cursor = np.zeros(robot_capacity, dtype=np.int64)
+        self.wait_ticks = np.zeros(robot_capacity, dtype=np.int64)  # 连续移动失败的tick数
+
+        # 取货点数组
+        self.pickup_ids: List[str] = []
+        self.pickup_index: Dict[str, int] = {}
+        self.pickup_cell = np.full(robot_capacity, -1, dtype=np.int64)
+        self.pickup_alive = np.zeros(robot_capacity, dtype=bool)
+        self.pickup_claimed = np.zeros(robot_capacity, dtype=bool)  # 已被拾取或已分配给机器人
+        self._pickup_counter = 0
+        # 已移除的取货点下标，新取货点优先复用，数组长度只随同时存在的取货点数量增长
+        self._free_pickup_slots: List[int] = []
+
+        # 网格占用：机器人下标 / 取货点下标，-1为空
+        self.grid = np.full(width * height, -1, dtype=np.int64)
+        self.pickup_grid = np.full(width * height, -1, dtype=np.int64)
+        # 支付台所在列作为离开支付台的单向出口通道，载货机器人不得进入，避免支付台被排队机器人围死
+        self.no_carry = np.zeros(width * height, dtype=bool)
+        self.no_carry[self.delivery_station.x:self.station_cell:width] = True
+
+        self.tick_count: int = 0
+        self.tick_successMoveCount: int = 0
+        self.failed_moves: int = 0
+        self.deliveries: int = 0
+        # 连续移动失败达到该次数的机器人随机避让到空闲相邻格子，用于打开支付台附近的僵局
+        self.patience: int = 3
+
+    # ---------- 坐标转换 ----------
+    def position_to_cell(self, position: Position) -> int:
+        return position.y * self.width + position.x
+
+    def cell_to_position(self, cell: int) -> Position:
+        return Position(cell % self.width, cell // self.width)
+
+    # ---------- 兼容Warehouse的接口 ----------
+    @property
+    def robots(self) -> Mapping:
+        return _RobotsView(self)
+
+    @property
+    def pickup_points(self) -> Dict[str, Position]:
+        return {pid: self.cell_to_position(int(self.pickup_cell[i]))
+                for pid, i in self.pickup_index.items()}
+
+    @property
+    def picked_shelves(self) -> set:
+        carried = self.assigned_pickup[self.alive & self.carrying]
+        return {self.pickup_ids[int(i)] for i in carried}
+
+    def add_pickup_point(self) -> Optional[str]:
+        """在随机空闲格子上添加取货点，返回取货点ID"""
+        cell = self._random_free_cell()
+        if cell < 0:
+            return None
+        self._pickup_counter += 1
+        pickup_id = f"P{self._int_to_letters(self._pickup_counter)}"
+        if self._free_pickup_slots:
+            index = self._free_pickup_slots.pop()
+            self.pickup_ids[index] = pickup_id
+        else:
+            if len(self.pickup_ids) == len(self.pickup_cell):
+                self._grow_pickups()
+            index = len(self.pickup_ids)
+            self.pickup_ids.append(pickup_id)
+        self.pickup_index[pickup_id] = index
+        self.pickup_cell[index] = cell
+        self.pickup_alive[index] = True
+        self.pickup_claimed[index] = False
+        self.pickup_grid[cell] = index
+        return pickup_id
+
+    def remove_pickup_point(self, pickup_id: str) -> bool:
+        index = self.pickup_index.get(pickup_id)
+        if index is None or self.grid[self.pickup_cell[index]] >= 0:
+            return False
+        assigned = self.alive & (self.assigned_pickup == index)
+        if np.any(assigned & self.carrying):
+            return False
+        # 前往该取货点的机器人重新等待分配，下标复用后不会被引到新的取货点
+        self.assigned_pickup[assigned] = -1
+        self.target[assigned] = -1
+        self.route_len[assigned] = 0
+        self._drop_pickup(index)
+        return True
+
+    def add_robot(self, robot_id: str, initial_position: Optional[Position] = None) -> bool:
+        if robot_id in self.robot_index:
+            return False
+        if initial_position is None:
+            cell = self._random_free_cell()
+            if cell < 0:
+                return False
+        else:
+            if not (0 <= initial_position.x < self.width and 0 <= initial_position.y < self.height):
+                return False
+            cell = self.position_to_cell(initial_position)
+            if self.grid[cell] >= 0:
+                return False
+        if len(self.robot_ids) == len(self.cell):
+            self._grow_robots()
+        index = len(self.robot_ids)
+        self.robot_ids.append(robot_id)
+        self.robot_index[robot_id] = index
+        self.cell[index] = cell
+        self.target[index] = -1
+        self.carrying[index] = False
+        self.assigned_pickup[index] = -1
+        self.alive[index] = True
+        self.route_len[index] = 0
+        self.route_cursor[index] = 0
+        self.wait_ticks[index] = 0
+        self.grid[cell] = index
+        return True
+
+    def add_robot_with_pickup(self, robot_id: str) -> Tuple[bool, Optional[str]]:
+        """创建取货点并把新机器人放在上面，机器人立即拾取物品并前往支付台"""
+        pickup_id = self.add_pickup_point()
+        if not pickup_id:
+            return False, None
+        pickup = self.pickup_index[pickup_id]
+        if not self.add_robot(robot_id, self.cell_to_position(int(self.pickup_cell[pickup]))):
+            self._drop_pickup(pickup)
+            return False, None
+        index = self.robot_index[robot_id]
+        self.carrying[index] = True
+        self.assigned_pickup[index] = pickup
+        self.pickup_claimed[pickup] = True
+        self.target[index] = self.station_cell
+        return True, pickup_id
+
+    def set_route(self, robot_id: str, route: List[Position]):
+        """写入外部规划器给出的路线（不包含起点），之后按路线游标逐格前进"""
+        index = self.robot_index[robot_id]
+        if len(route) > self.route.shape[1]:
+            self._grow_routes(len(route))
+        self.route[index, :len(route)] = [self.position_to_cell(p) for p in route]
+        self.route_len[index] = len(route)
+        self.route_cursor[index] = 0
+
+    def tick(self) -> float:
+        """
+        所有机器人向量化地前进一步
+        :return: 本次tick耗时，单位毫秒
+        """
+        start_time = time.perf_counter()
+        robots = np.flatnonzero(self.alive)
+        if len(robots):
+            self._handle_events(robots)
+            self._assign_tasks(robots)
+            proposed = self._propose(robots)
+            moving = self._resolve(robots, proposed)
+            self._commit(robots, proposed, moving)
+        self.tick_count += 1
+        return (time.perf_counter() - start_time) * 1000
+
+    # ---------- 向量化的tick步骤 ----------
+    def _handle_events(self, robots: np.ndarray):
+        """到达取货点的空载机器人拾取物品，到达支付台的载货机器人交付并生成新取货点"""
+        cell = self.cell[robots]
+        pickup = self.assigned_pickup[robots]
+
+        picking = robots[~self.carrying[robots] & (pickup >= 0) &
+                         (cell == self.pickup_cell[np.maximum(pickup, 0)])]
+        self.carrying[picking] = True
+        self.target[picking] = self.station_cell
+        self.route_len[picking] = 0
+
+        delivering = robots[self.carrying[robots] & (cell == self.station_cell)]
+        if len(delivering):
+            for pickup_index in self.assigned_pickup[delivering]:
+                self._drop_pickup(int(pickup_index))
+                self.add_pickup_point()
+            self.deliveries += len(delivering)
+            self.carrying[delivering] = False
+            self.assigned_pickup[delivering] = -1
+            self.target[delivering] = -1
+            self.route_len[delivering] = 0
+
+    def _assign_tasks(self, robots: np.ndarray):
+        """空闲机器人按曼哈顿距离贪心匹配未被认领的取货点；无任务且停在支付台上的机器人移到随机空格"""
+        idle = robots[~self.carrying[robots] & (self.assigned_pickup[robots] < 0)]
+        if not len(idle):
+            return
+        open_pickups = np.flatnonzero(self.pickup_alive[:len(self.pickup_ids)] &
+                                      ~self.pickup_claimed[:len(self.pickup_ids)])
+        if len(open_pickups):
+            rx, ry = self.cell[idle] % self.width, self.cell[idle] // self.width
+            px, py = self.pickup_cell[open_pickups] % self.width, self.pickup_cell[open_pickups] // self.width
+            cost = np.abs(rx[:, None] - px[None, :]) + np.abs(ry[:, None] - py[None, :])
+            rows, cols = np.unravel_index(np.argsort(cost, axis=None), cost.shape)
+            taken_rows = np.zeros(len(idle), dtype=bool)
+            taken_cols = np.zeros(len(open_pickups), dtype=bool)
+            remaining = min(len(idle), len(open_pickups))
+            for r, c in zip(rows, cols):
+                if taken_rows[r] or taken_cols[c]:
+                    continue
+                taken_rows[r] = taken_cols[c] = True
+                robot, pickup = idle[r], open_pickups[c]
+                self.assigned_pickup[robot] = pickup
+                self.pickup_claimed[pickup] = True
+                self.target[robot] = self.pickup_cell[pickup]
+                self.route_len[robot] = 0
+                remaining -= 1
+                if remaining == 0:
+                    break
+            idle = idle[~taken_rows]
+
+        parked_on_station = idle[(self.cell[idle] == self.station_cell) & (self.target[idle] < 0)]
+        for robot in parked_on_station:
+            self.target[robot] = self._random_free_cell()
+
+    def _propose(self, robots: np.ndarray) -> np.ndarray:
+        """
+        计算每个机器人的下一格：有路线时取路线游标处的格子，
+        否则贪心选择使曼哈顿距离减小的相邻格子，优先空闲格子；没有目标或已到达时原地不动
+        """
+        width, height = self.width, self.height
+        cell = self.cell[robots]
+        target = self.target[robots]
+        x, y = cell % width, cell // width
+        tx, ty = target % width, target // width
+
+        nx = x[:, None] + _DX[None, :]
+        ny = y[:, None] + _DY[None, :]
+        valid = (nx >= 0) & (nx < width) & (ny >= 0) & (ny < height)
+        ncell = np.where(valid, ny * width + nx, 0)
+        dist = np.abs(nx - tx[:, None]) + np.abs(ny - ty[:, None])
+        current = np.abs(x - tx) + np.abs(y - ty)
+        carrying = self.carrying[robots]
+        valid &= ~(self.no_carry[ncell] & carrying[:, None])
+        occupied = self.grid[ncell] >= 0
+        improving = valid & (dist < current[:, None])
+        # 处在出口通道上的载货机器人（如刚生成在通道上）任意方向离开通道都算前进
+        in_lane = carrying & self.no_carry[cell]
+        improving[in_lane] = valid[in_lane]
+        # 空载机器人在支付台或出口通道上时，沿通道向上也算前进
+        exiting = ~carrying & (self.no_carry[cell] | (cell == self.station_cell))
+        improving[exiting, 0] = valid[exiting, 0]
+        # 评分：优先使距离减小的空闲格子，同分时按(机器人下标+tick)轮换方向避免所有机器人走同一条线
+        rotation = (np.arange(4)[None, :] + robots[:, None] + self.tick_count) % 4
+        score = np.where(improving, occupied * 8 + rotation, 1 << 30)
+        best = np.argmin(score, axis=1)
+        rows = np.arange(len(robots))
+        proposed = np.where(improving[rows, best], ncell[rows, best], cell)
+        proposed = np.where((target < 0) | (target == cell), cell, proposed)
+
+        on_route = self.route_cursor[robots] < self.route_len[robots]
+        if on_route.any():
+            routed = robots[on_route]
+            proposed[on_route] = self.route[routed, self.route_cursor[routed]]
+
+        # 等待过久的机器人随机选择一个空闲相邻格子避让，同时放弃当前路线
+        stuck = self.wait_ticks[robots] >= self.patience
+        if stuck.any():
+            free = valid[stuck] & ~occupied[stuck]
+            pick = np.argmin(self.rng.random((int(stuck.sum()), 4)) + ~free * 2.0, axis=1)
+            rows = np.arange(len(pick))
+            has_free = free[rows, pick]
+            stuck_rows = np.flatnonzero(stuck)
+            proposed[stuck_rows[has_free]] = ncell[stuck][rows, pick][has_free]
+            self.route_len[robots[stuck_rows[has_free]]] = 0
+        return proposed
+
+    def _resolve(self, robots: np.ndarray, proposed: np.ndarray) -> np.ndarray:
+        """
+        检测冲突，返回可以移动的掩码：
+        多个机器人争抢同一格子时只保留载货优先、下标最小的一个；对向交换位置的双方都不动；
+        目标格子被不动的机器人占用时不动，迭代直到稳定
+        """
+        cell = self.cell[robots]
+        moving = proposed != cell
+
+        # 争抢同一格子
+        priority = (~self.carrying[robots]).astype(np.int64)
+        order = np.lexsort((robots, priority, proposed))
+        sorted_proposed = proposed[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = sorted_proposed[1:] != sorted_proposed[:-1]
+        winner = np.zeros(len(robots), dtype=bool)
+        winner[order[first]] = True
+        moving &= winner
+
+        # 对向交换
+        occupant = self.grid[proposed]
+        local = np.full(len(self.cell), -1, dtype=np.int64)
+        local[robots] = np.arange(len(robots))
+        occupant_local = np.where(occupant >= 0, local[np.maximum(occupant, 0)], -1)
+        has_occupant = moving & (occupant_local >= 0) & (occupant != robots)
+        swap = np.zeros(len(robots), dtype=bool)
+        candidates = np.flatnonzero(has_occupant)
+        swap[candidates] = proposed[occupant_local[candidates]] == cell[candidates]
+        if swap.any():
+            # 对向的两台机器人中让一台避让到空闲的相邻格子，另一台随后跟进；都无法避让时双方不动
+            claimed = set(proposed[moving & ~swap].tolist())
+            for i in np.flatnonzero(swap):
+                j = occupant_local[i]
+                if not (swap[i] and swap[j]):
+                    continue
+                swap[i] = swap[j] = False
+                for a, b in ((i, j), (j, i)):
+                    side = self._free_neighbor(int(cell[a]), claimed)
+                    if side >= 0:
+                        proposed[a] = side
+                        claimed.add(side)
+                        break
+                else:
+                    moving[i] = moving[j] = False
+
+        # 链式跟随：前方机器人不动则自己也不能动
+        occupant = self.grid[proposed]
+        occupant_local = np.where(occupant >= 0, local[np.maximum(occupant, 0)], -1)
+        blocked_by_robot = (occupant_local >= 0) & (occupant != robots)
+        while True:
+            blocked = moving & blocked_by_robot & ~moving[np.maximum(occupant_local, 0)]
+            if not blocked.any():
+                break
+            moving &= ~blocked
+
+        failed = (proposed != cell) & ~moving
+        self.failed_moves += int(np.count_nonzero(failed))
+        self.wait_ticks[robots[failed]] += 1
+        self.wait_ticks[robots[moving]] = 0
+        return moving
+
+    def _commit(self, robots: np.ndarray, proposed: np.ndarray, moving: np.ndarray):
+        movers = robots[moving]
+        new_cells = proposed[moving]
+        self.grid[self.cell[movers]] = -1
+        self.grid[new_cells] = movers
+        self.cell[movers] = new_cells
+        on_route = self.route_cursor[movers] < self.route_len[movers]
+        self.route_cursor[movers[on_route]] += 1
+        self.tick_successMoveCount += len(movers)
+
+    # ---------- 内部工具 ----------
+    def _free_neighbor(self, cell: int, claimed: set) -> int:
+        """cell的一个没有机器人且未被本tick其他移动占用的相邻格子，没有时返回-1"""
+        x, y = cell % self.width, cell // self.width
+        for dx, dy in zip(_DX, _DY):
+            nx, ny = x + int(dx), y + int(dy)
+            if 0 <= nx < self.width and 0 <= ny < self.height:
+                neighbor = ny * self.width + nx
+                if self.grid[neighbor] < 0 and neighbor not in claimed:
+                    return neighbor
+        return -1
+
+    def _drop_pickup(self, index: int):
+        if index < 0 or not self.pickup_alive[index]:
+            return
+        cell = self.pickup_cell[index]
+        if self.pickup_grid[cell] == index:
+            self.pickup_grid[cell] = -1
+        self.pickup_alive[index] = False
+        pickup_id = self.pickup_ids[index]
+        if self.pickup_index.get(pickup_id) == index:
+            del self.pickup_index[pickup_id]
+        self._free_pickup_slots.append(index)
+
+    def _random_free_cell(self) -> int:
+        """随机选一个没有机器人、取货点且不是支付台的格子；稀疏时拒绝采样，否则退回全表筛选"""
+        size = self.width * self.height
+        for _ in range(16):
+            cell = int(self.rng.integers(size))
+            if self.grid[cell] < 0 and self.pickup_grid[cell] < 0 and cell != self.station_cell:
+                return cell
+        free = np.flatnonzero((self.grid < 0) & (self.pickup_grid < 0))
+        free = free[free != self.station_cell]
+        if not len(free):
+            return -1
+        return int(free[self.rng.integers(len(free))])
+
+    @staticmethod
+    def _int_to_letters(n: int) -> str:
+        """1 -> A, 26 -> Z, 27 -> AA，与Warehouse的取货点命名一致"""
+        result = ""
+        n = n - 1
+        while n >= 0:
+            result = chr(65 + n % 26) + result
+            n = n // 26 - 1
+        return result
+
+    def _grow_robots(self):
+        size = len(self.cell) * 2
+        for name, fill in (("cell", -1), ("target", -1), ("carrying", False), ("assigned_pickup", -1),
+                           ("alive", False), ("route_len", 0), ("route_cursor", 0), ("wait_ticks", 0)):
+            old = getattr(self, name)
+            new = np.full(size, fill, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+        route = np.full((size, self.route.shape[1]), -1, dtype=np.int64)
+        route[:len(self.route)] = self.route
+        self.route = route
+
+    def _grow_pickups(self):
+        size = len(self.pickup_cell) * 2
+        for name, fill in (("pickup_cell", -1), ("pickup_alive", False), ("pickup_claimed", False)):
+            old = getattr(self, name)
+            new = np.full(size, fill, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _grow_routes(self, length: int):
+        size = max(length, self.route.shape[1] * 2)
+        route = np.full((len(self.route), size), -1, dtype=np.int64)
+        route[:, :self.route.shape[1]] = self.route
+        self.route = route
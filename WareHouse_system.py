@@ -1,4 +1,7 @@
+import logging
+import os
 import random
+import threading
 import time
 from datetime import time as dt_time
 from typing import List, Tuple, Dict, Optional
@@ -6,21 +9,40 @@ from Direction import Direction
 from Position import Position
 from DynamicPlanner import DynamicPlanner
 from AStarPlanning import AStarPlanning
+from OccupancyIndex import OccupancyIndex
+from FreeCellPool import FreeCellPool
+from DistanceFieldCache import DistanceFieldCache
+from TaskAssigner import TaskAssigner
+from TickProfiler import TickProfiler
+from RouteHistory import RouteHistory
+from DeadlockDetector import DeadlockDetector
+from DeliveryQueue import DeliveryQueue
+from WarehouseMap import WarehouseMap
+
+logger = logging.getLogger(__name__)
 
 class Robot:
-    def __init__(self, robot_id: str, initial_position: Position):
+    def __init__(self, robot_id: str, initial_position: Position, history: Optional[RouteHistory] = None):
         self.robot_id = robot_id
         self.position = initial_position
         self.carrying_item: Optional[str] = None  # 存储正在携带的货物ID（A, B, C...）
         self.item_source: Optional[str] = None  # 存储货物来源的取货点ID（PA, PB...）
         self.future_route: List[Position] = []  #存储机器人未来的路线
-        self.history_route: List[tuple] = []
+        # 每个tick一条 (位置, 状态) 记录，紧凑存储
+        self.history_route: RouteHistory = history if history is not None else RouteHistory()
         self.target: Position = None
+        self.occupancy: Optional[OccupancyIndex] = None  # 所在仓库的占用索引，加入仓库时设置
 
     def move(self, direction: Direction) -> Position:
         """移动机器人到新的位置"""
-        self.position = self.position + direction.value
-        return self.position
+        return self.move_to(self.position + direction.value)
+
+    def move_to(self, position: Position) -> Position:
+        """移动机器人到已计算好的相邻位置"""
+        self.position = position
+        if self.occupancy is not None:
+            self.occupancy.place(self.robot_id, position)
+        return position
 
     def pick_item(self, item_id: str):
         """拾取物品，只存储字母部分"""
@@ -48,18 +70,125 @@ class Goods:
         self.pos = initial_position
 
 class Warehouse:
-    def __init__(self, width: int, height: int):
+    CELL_WIDTH = 8
+    EMPTY_CELL = "   .    "  # 空格子，8个字符宽度
+    OBSTACLE_CELL = "   ##   "  # 静态障碍物
+    LEGEND = [
+        "",
+        "图例: .  = 空格子, D = 支付台, ## = 货架/墙（静态障碍物）",
+        "     PA* = 已被拾取的货架, PA = 未被拾取的货架",
+        "     R1/A = 机器人R1携带A货物",
+        "     R1/A/PB = 机器人R1携带A货物且位于PB货架位置",
+        "     R1/D = 机器人R1在支付台",
+    ]
+
+    def __init__(self, width: int, height: int, headless: bool = False, seed: Optional[int] = None,
+                 profile: bool = False, history_capacity: Optional[int] = None,
+                 history_spill_dir: Optional[str] = None, deadlock_policy: str = "back_off",
+                 delivery_stations: Optional[List[Tuple[int, int]]] = None,
+                 layout: Optional[WarehouseMap] = None):
+        """
+        :param width: 仓库宽
+        :param height: 仓库高
+        :param headless: 无界面模式，不渲染终端画面，用于高吞吐量仿真
+        :param seed: 随机种子，默认随机生成；种子与参数相同的两次运行完全一致，可用于复现
+        :param profile: 是否记录tick各阶段的耗时与计数，也可之后设置 profiler.enabled
+        :param history_capacity: 每台机器人在内存中保留的历史路径记录数，None表示全部保留
+        :param history_spill_dir: 设置history_capacity时，超出容量的历史记录写入该目录下的 <机器人ID>.hist 文件
+        :param deadlock_policy: 死锁处理方式，见DeadlockDetector.POLICIES，"none" 只检测不处理
+        :param delivery_stations: 支付台位置列表，默认只有右下角一个，可用default_stations生成；
+                                  给出layout时默认使用地图中标出的支付台，见layout_stations
+        :param layout: 静态布局（货架、墙等静态障碍物），尺寸须与width、height一致，可用from_map从地图文件读取
+        """
         self.width = width
         self.height = height
+        self.headless = headless
+        self.history_capacity = history_capacity
+        self.history_spill_dir = history_spill_dir
+        # tick各阶段（move_all、plan、collision、events、deadlock、assign、check、render）的计时与计数
+        self.profiler = TickProfiler(enabled=profile)
+        # 仓库内所有随机选择（货架、机器人放置位置与随机停靠目标）都使用该实例，不使用全局random
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.rng = random.Random(self.seed)
+        logger.info("仓库%sx%s的随机种子为%s", width, height, self.seed)
         self.robots: Dict[str, Robot] = {}
-        self.delivery_station = Position(width - 1, height - 1)
-        self.robot_positions = set() # 用于跟踪机器人位置的缓存
+        if layout is not None and (layout.width, layout.height) != (width, height):
+            raise ValueError(f"layout is {layout.width}x{layout.height}, warehouse is {width}x{height}")
+        self.layout = layout
+        # 静态障碍物：不放置机器人与取货点，规划器在构造时一次性去掉这些格子，与动态的机器人障碍物分开
+        self.static_obstacles = frozenset(layout.obstacles) if layout is not None else frozenset()
+        if delivery_stations is not None:
+            stations = delivery_stations
+        elif layout is not None:
+            stations = self.layout_stations(layout)
+        else:
+            stations = [(width - 1, height - 1)]
+        if not stations:
+            raise ValueError("at least one delivery station is required")
+        if len(set(stations)) != len(stations):
+            raise ValueError(f"duplicate delivery stations: {stations}")
+        for x, y in stations:
+            if not (0 <= x < width and 0 <= y < height):
+                raise ValueError(f"delivery station ({x}, {y}) is outside the warehouse")
+            if (x, y) in self.static_obstacles:
+                raise ValueError(f"delivery station ({x}, {y}) is on a static obstacle")
+        self.delivery_stations: List[Position] = [Position(x, y) for x, y in stations]
+        self.station_cells = frozenset((p.x, p.y) for p in self.delivery_stations)
+        # 第一个支付台，只有一个支付台时与旧代码的含义相同
+        self.delivery_station = self.delivery_stations[0]
+        # 不含机器人、货架和支付台的空闲格子池，用于O(1)随机选取放置位置与临时目标
+        self.free_cells = FreeCellPool(width, height)
+        for cell in self.station_cells:
+            self.free_cells.occupy(cell)
+        for cell in self.static_obstacles:
+            self.free_cells.occupy(cell)
+        self.occupancy = OccupancyIndex(self.free_cells)  # 机器人占用索引，随机器人移动增量维护
+        self.robot_positions = self.occupancy.cell_to_robot.keys()  # 所有机器人所在格子的实时视图
         self.pickup_points: Dict[str, Position] = {}  # 存储所有取货点，键为取货点ID（PA, PB等）
         self.picked_shelves = set()  # 存储已被拾取的货架ID
+        self.unpicked_shelves = set()  # 存储尚未被拾取的货架ID
+        self.pickup_at: Dict[Tuple[int, int], str] = {}  # 格子 -> 该格子上的取货点ID，随取货点增删同步维护
+        self._pickup_serial = 0  # 已分配过的取货点编号，保证ID不与现存取货点重复
         self.tick_count: int = 0
+        # 支付台与各取货点的距离场，供规划器作为精确启发值
+        self.distance_fields = DistanceFieldCache(width, height)
+        self.distance_fields.set_static_obstacles(self.static_obstacles)
+        for station in self.delivery_stations:
+            self.distance_fields.add_target(station)
+        # 被静态障碍物隔开、到不了第一个支付台的格子（地图中的封闭区域）不放置机器人与取货点
+        self.isolated_cells = frozenset()
+        if self.static_obstacles:
+            field = self.distance_fields.get(self.delivery_station)
+            self.isolated_cells = frozenset(
+                (i % width, i // width) for i, d in enumerate(field)
+                if d == DistanceFieldCache.UNREACHABLE and (i % width, i // width) not in self.static_obstacles)
+            for cell in self.isolated_cells:
+                self.free_cells.occupy(cell)
+        # 货架面：与静态障碍物相邻的可达格子，有静态布局时取货点只生成在货架面上
+        self.rack_faces: List[Tuple[int, int]] = []
+        if layout is not None:
+            self.rack_faces = [cell for cell in layout.rack_faces()
+                               if cell not in self.isolated_cells and cell not in self.station_cells]
+        # 每个tick结束时为空闲机器人批量分配未拾取的货架，每个货架只分给一台机器人
+        self.task_assigner = TaskAssigner(self.distance_fields)
+        self.task_assignment: Dict[str, str] = {}  # 机器人ID -> 分配到的取货点ID
+        self.pickup_claims: Dict[str, str] = {}  # 取货点ID -> 被分配的机器人ID
         self.dynamic_planner: DynamicPlanner = DynamicPlanner(self)
+        # 每个支付台一个交付预约队列：附近携带货物的机器人在缓冲车道上按时间窗顺序排队进入，
+        # 后建的队列避开先建队列的车道
+        self.delivery_queues: Dict[Position, DeliveryQueue] = {}
+        for station in self.delivery_stations:
+            self.delivery_queues[station] = DeliveryQueue(self, station)
+        self.queue_cells = frozenset(cell for queue in self.delivery_queues.values()
+                                     for cell in queue.reserved_cells())
+        self.station_choice: Dict[str, Position] = {}  # 携带货物的机器人ID -> 选定的支付台
+        # 每个tick所有机器人行动后检测等待图中的环与长队列
+        self.deadlock_detector = DeadlockDetector(self, deadlock_policy)
         self.tick_successMoveCount: int = 0
-        self.unpicked_positions = []
+        self.tick_failedMoveCount: int = 0  # 本应移动却未能移动（无路径或目标格子被占）的次数
+        self.delivery_count: int = 0  # 已交付的货物数
+        # tick期间持有，供其他线程（如终端渲染线程）读取一致的快照
+        self.state_lock = threading.Lock()
 
 
     def _generate_next_letter_id(self) -> str:
@@ -74,7 +203,9 @@ class Warehouse:
                 n = n // 26 - 1
             return result
 
-        return int_to_excel_col(len(self.pickup_points) + 1)
+        # 使用单调递增的编号，避免移除取货点后按数量生成的ID与现存取货点重复
+        self._pickup_serial += 1
+        return int_to_excel_col(self._pickup_serial)
 
     def add_pickup_point(self) -> Optional[str]:
         """添加一个新地取货点，返回新取货点的ID"""
@@ -82,23 +213,35 @@ class Warehouse:
         next_letter = self._generate_next_letter_id()
         pickup_id = f"P{next_letter}"
 
-        # 获取所有可用位置
-        occupied_positions = {(pos.x, pos.y) for pos in self.pickup_points.values()}
-        occupied_positions.add((self.delivery_station.x, self.delivery_station.y))
-        self.flash_robots_position()
-        occupied_positions.update(self.robot_positions)
-
-        available_positions = [(x, y) for x in range(self.width) for y in range(self.height)
-                               if (x, y) not in occupied_positions]
-
-        if not available_positions:
+        # 从空闲格子池中随机选择一个不是货架、支付台且没有机器人的位置，有静态布局时只选货架面
+        cell = self._sample_rack_face() if self.rack_faces else self.free_cells.sample(self.rng)
+        if cell is None:
             return None
 
-        # 随机选择一个可用位置
-        pos_x, pos_y = random.choice(available_positions)
+        pos_x, pos_y = cell
         self.pickup_points[pickup_id] = Position(pos_x, pos_y)
+        self.pickup_at[cell] = pickup_id
+        self.free_cells.occupy(cell)
+        self.unpicked_shelves.add(pickup_id)
+        self.distance_fields.add_target(self.pickup_points[pickup_id])
         return pickup_id
 
+    def _sample_rack_face(self) -> Optional[Tuple[int, int]]:
+        """
+        随机选择一个空闲的货架面格子：先随机试几次，货架面大多被占用时再遍历一遍；
+        货架面全部被占用时退回任意空闲格子
+        """
+        faces = self.rack_faces
+        for _ in range(8):
+            cell = self.rng.choice(faces)
+            if cell in self.free_cells:
+                return cell
+        free = [cell for cell in faces if cell in self.free_cells]
+        if free:
+            return self.rng.choice(free)
+        logger.debug("货架面已全部被占用，取货点放在任意空闲格子上")
+        return self.free_cells.sample(self.rng)
+
     def remove_pickup_point(self, pickup_id: str) -> bool:
         """移除指定的取货点，如果取货点上有机器人则不能移除"""
         if pickup_id not in self.pickup_points:
@@ -106,13 +249,25 @@ class Warehouse:
 
         pickup_pos = self.pickup_points[pickup_id]
         # 检查是否有机器人在这个取货点上
-        for robot in self.robots.values():
-            if robot.position == pickup_pos:
-                return False
+        if self.occupancy.is_occupied(pickup_pos):
+            return False
 
         del self.pickup_points[pickup_id]
+        del self.pickup_at[(pickup_pos.x, pickup_pos.y)]
+        self.free_cells.vacate((pickup_pos.x, pickup_pos.y))
+        self.picked_shelves.discard(pickup_id)
+        self.unpicked_shelves.discard(pickup_id)
+        self.distance_fields.remove_target(pickup_pos)
+        self.release_pickup_claim(pickup_id)
         return True
 
+    def _mark_picked(self, pickup_id: str):
+        """标记货架已被拾取：不再作为取货目标，取消对它的分配"""
+        self.picked_shelves.add(pickup_id)
+        self.unpicked_shelves.discard(pickup_id)
+        self.distance_fields.remove_target(self.pickup_points[pickup_id])
+        self.release_pickup_claim(pickup_id)
+
     def add_robot(self, robot_id: str, initial_position: Optional[Position] = None) -> bool:
         """添加新机器人到指定位置，如果不指定位置则放在空闲位置"""
         if robot_id in self.robots:
@@ -120,29 +275,31 @@ class Warehouse:
 
         if initial_position is None:
             # 找一个不是取货点也不是支付台的空闲位置
-            occupied_positions = {(pos.x, pos.y) for pos in self.pickup_points.values()}
-            occupied_positions.add((self.delivery_station.x, self.delivery_station.y))
-            self.flash_robots_position()
-            occupied_positions.update(self.robot_positions)
-
-            available_positions = [(x, y) for x in range(self.width) for y in range(self.height)
-                                if (x, y) not in occupied_positions]
-
-            if not available_positions:
+            cell = self.free_cells.sample(self.rng)
+            if cell is None:
                 return False
 
-            pos_x, pos_y = random.choice(available_positions)
-            initial_position = Position(pos_x, pos_y)
+            initial_position = Position(cell[0], cell[1])
         elif not self._is_position_valid(initial_position):
-            print(f"位置 ({initial_position.x}, {initial_position.y}) 超出仓库范围")
+            logger.warning("位置 (%s, %s) 超出仓库范围", initial_position.x, initial_position.y)
+            return False
+        elif initial_position in self.static_obstacles:
+            logger.warning("位置 (%s, %s) 是静态障碍物", initial_position.x, initial_position.y)
             return False
         elif not self._is_position_available(initial_position):
-            print(f"位置 ({initial_position.x}, {initial_position.y}) 已被占用")
+            logger.warning("位置 (%s, %s) 已被占用", initial_position.x, initial_position.y)
             return False
 
-        robot = Robot(robot_id, initial_position)
+        spill_path = None
+        if self.history_spill_dir is not None:
+            spill_path = os.path.join(self.history_spill_dir, f"{robot_id}.hist")
+        robot = Robot(robot_id, initial_position,
+                      RouteHistory(self.width, self.history_capacity, spill_path))
         robot.target = self.delivery_station
+        robot.occupancy = self.occupancy
         self.robots[robot_id] = robot
+        self.occupancy.place(robot_id, initial_position)
+        self.dynamic_planner.register_robot(robot_id)
         return True
 
     def place_robot_at_pickup(self, robot_id: str, pickup_id: str) -> bool:
@@ -156,14 +313,15 @@ class Warehouse:
             return False
 
         robot = self.robots[robot_id]
-        # 移除原位置
-        #self.robot_positions.remove((robot.position.x, robot.position.y))
         # 更新到新位置
         robot.position = pickup_pos
-        #self.robot_positions.add((pickup_pos.x, pickup_pos.y))
+        self.occupancy.place(robot_id, pickup_pos)
+        robot.future_route = []
+        self.dynamic_planner.register_robot(robot_id)
         # 自动拾取物品
         if robot.pick_item(pickup_id):
-            self.picked_shelves.add(pickup_id)  # 标记货架已被拾取
+            self._mark_picked(pickup_id)  # 标记货架已被拾取
+            self.release_task(robot_id)
         return True
 
     def remove_robot(self, robot_id: str) -> bool:
@@ -172,7 +330,14 @@ class Warehouse:
             return False
 
         robot = self.robots[robot_id]
-        #self.robot_positions.remove((robot.position.x, robot.position.y))
+        robot.occupancy = None
+        robot.history_route.close()
+        self.release_task(robot_id)
+        self.station_choice.pop(robot_id, None)
+        for queue in self.delivery_queues.values():
+            queue.remove(robot_id)
+        self.occupancy.remove(robot_id)
+        self.dynamic_planner.unregister_robot(robot_id)
         del self.robots[robot_id]
         return True
 
@@ -184,11 +349,13 @@ class Warehouse:
         - 设置机器人的新目标
         """
         robot = self.robots[rid]
-        if (robot.position.x == self.delivery_station.x and
-                robot.position.y == self.delivery_station.y):
+        queue = self.delivery_queues.get(robot.position)
+        if queue is not None:
             if robot.carrying_item is not None:
                 source, delivered_item = robot.deliver_item()
-                print(f"机器人{rid}在支付台交付货物{delivered_item}")
+                self.delivery_count += 1
+                self.profiler.count("deliveries")
+                logger.info("机器人%s在支付台交付货物%s", rid, delivered_item)
 
                 # 根据交付的货物ID创建对应的取货点ID
                 new_pickup_id = f"P{delivered_item}"
@@ -196,59 +363,42 @@ class Warehouse:
                 # 如果已存在相同ID的货架，先移除
                 if new_pickup_id in self.pickup_points:
                     self.remove_pickup_point(new_pickup_id)
-                    print(f"移除货架{new_pickup_id}")
+                    logger.info("移除货架%s", new_pickup_id)
 
                 # 创建新的取货点
                 new_pickup_id = self.add_pickup_point()
                 if new_pickup_id:
-                    print(f"创建新货架{new_pickup_id}")
-                
-                # 立即寻找新的未被拾取的货架作为目标
-                unpicked_shelves = set()
-                for pickId, pickPos in self.pickup_points.items():
-                    if pickId not in self.picked_shelves:
-                        unpicked_shelves.add((pickId, pickPos))
+                    logger.info("创建新货架%s", new_pickup_id)
                 
-                if unpicked_shelves:
-                    # 选择一个未被拾取的货架
-                    unpicked_id, unpicked_pos = unpicked_shelves.pop()
-                    robot.target = unpicked_pos
-                    robot.future_route = []  # 清空当前路径，强制重新规划
-                    print(f"机器人{rid}的新目标设置为取货点{unpicked_id}")
-                else:
-                    # 如果没有可用的取货点，让机器人移动到一个随机位置
-                    available_positions = [(x, y) for x in range(self.width) for y in range(self.height)
-                                        if (x, y) not in self.robot_positions and 
-                                        (x, y) != (self.delivery_station.x, self.delivery_station.y)]
-                    if available_positions:
-                        x, y = random.choice(available_positions)
+                # 立即与其他空闲机器人一起分配取货目标，让机器人在本次行动中就能离开支付台
+                self.assign_tasks()
+                if rid not in self.task_assignment and not self.open_pickups():
+                    # 如果没有可用的取货点，让机器人移动到一个随机的空闲位置
+                    cell = self.free_cells.sample(self.rng)
+                    if cell is not None:
+                        x, y = cell
                         robot.target = Position(x, y)
                         robot.future_route = []
-                        print(f"机器人{rid}暂无可用取货点，移动到随机位置({x}, {y})")
+                        logger.info("机器人%s暂无可用取货点，移动到随机位置(%s, %s)", rid, x, y)
                     else:
-                        print(f"机器人{rid}无法找到可用的移动位置")
+                        logger.warning("机器人%s无法找到可用的移动位置", rid)
+                # 经出口车道离开支付台，给排在后面的机器人让出入口
+                self.station_choice.pop(rid, None)
+                queue.depart(rid)
 
     def on_pickup(self, rid: str):
         robot = self.robots[rid]
         # 检查机器人是否在某个取货点上
         if robot.carrying_item is None:  # 只有未携带物品的机器人才能拾取
-            for pickup_id, pickup_pos in self.pickup_points.items():
-                if (robot.position.x == pickup_pos.x and
-                        robot.position.y == pickup_pos.y and
-                        pickup_id not in self.picked_shelves):  # 只能拾取未被拾取过的货架
-                    robot.pick_item(pickup_id)
-                    self.picked_shelves.add(pickup_id)  # 标记货架已被拾取
-                    # robot.target = self.delivery_station
-                    # print(robot.target)
-                    # print("\n\n\n\n\n\n\n\n\n\n\n\n\n")
-                    # self.dynamic_planner.set_route(robot_id)
-                    self.unpicked_positions = [
-                        (pickup_id, position)
-                        for pickup_id, position in self.pickup_points.items()
-                        if pickup_id not in self.pickup_points
-                    ]
-                    print(f"机器人{rid}拾取货架{pickup_id}的物品")
-                    break
+            pickup_id = self.pickup_at.get((robot.position.x, robot.position.y))
+            if (pickup_id is not None and
+                    pickup_id in self.unpicked_shelves and  # 只能拾取未被拾取过的货架
+                    self.pickup_claims.get(pickup_id, rid) == rid):  # 不能拾取分配给其他机器人的货架
+                robot.pick_item(pickup_id)
+                self.release_task(rid)
+                self._mark_picked(pickup_id)  # 标记货架已被拾取
+                self.profiler.count("pickups")
+                logger.info("机器人%s拾取货架%s的物品", rid, pickup_id)
 
     def move_robot(self, robot_id: str, direction: Direction) -> bool:
         """移动指定的机器人"""
@@ -258,24 +408,21 @@ class Warehouse:
         robot = self.robots[robot_id]
         new_position = robot.position + direction.value
 
-        if not self._is_position_valid(new_position):
+        if not self._is_position_valid(new_position) or new_position in self.static_obstacles:
             return False
 
         if not self._is_position_available(new_position):
-            self.dynamic_planner.assignment_type(
-                robot_id,
-                self._get_position_unavailable_robot(new_position),
-                "collision"
-            )
+            self.profiler.count("collisions")
+            with self.profiler.phase("collision"):
+                self.dynamic_planner.assignment_type(
+                    robot_id,
+                    self._get_position_unavailable_robot(new_position),
+                    "collision"
+                )
             return False
 
-        # 更新机器人位置
-        robot.move(direction)
-        #self.robot_positions.remove((robot.position.x, robot.position.y))
-        #self.robot_positions.add((robot.position.x, robot.position.y))
-
-
-
+        # 更新机器人位置，占用索引由Robot.move_to同步更新
+        robot.move_to(new_position)
         return True
 
     def _is_position_valid(self, position: Position) -> bool:
@@ -285,8 +432,7 @@ class Warehouse:
 
     def _is_position_available(self, position: Position) -> bool:
         """检查位置是否被其他机器人占用"""
-        self.flash_robots_position()
-        return (position.x, position.y) not in self.robot_positions
+        return not self.occupancy.is_occupied(position)
 
     def _get_position_unavailable_robot(self, pos: Position) -> str:
         """
@@ -294,102 +440,105 @@ class Warehouse:
         :param pos:
         :return:
         """
-        #空位置无法获取机器人位置
-        if self._is_position_available(pos):
-            return None
-        #仓库边缘无机器人
-        if not self._is_position_valid(pos):
-            return None
-        #_is_position_available已刷新robot_positions成员变量，此处无需再刷新
-        for rid,r in self.robots.items():
-            if r.position == pos:
-                return rid
+        #空位置或仓库范围外返回None
+        return self.occupancy.robot_at(pos)
+
+    def cell_contents(self) -> Dict[Tuple[int, int], str]:
+        """
+        一次遍历机器人与取货点，生成所有非空格子的显示内容
+        :return: (x, y) -> 8个字符宽度的显示内容，未出现的格子为空格子
+        """
+        shelf_at = self.pickup_at
+
+        cells = dict.fromkeys(self.static_obstacles, self.OBSTACLE_CELL)
+        for cell, pickup_id in shelf_at.items():
+            # 添加标识显示货架是否已被拾取
+            picked = '*' if pickup_id in self.picked_shelves else ''
+            cells[cell] = self.cell_label(f"{pickup_id}{picked}")
+        for i, station in enumerate(self.delivery_stations, 1):
+            cells[(station.x, station.y)] = self.cell_label(f"D{i}")
+
+        robot_cells = set()
+        for robot_id, robot in self.robots.items():
+            cell = (robot.position.x, robot.position.y)
+            # 同一格子有多个机器人时显示先加入的那个
+            if cell in robot_cells:
+                continue
+            robot_cells.add(cell)
+            if cell in self.station_cells:
+                content = f"{robot_id}/D"
+            else:
+                # 根据是否携带物品、是否位于货架位置显示机器人状态
+                content = robot_id
+                if robot.carrying_item is not None:
+                    content += f"/{robot.carrying_item}"
+                if cell in shelf_at:
+                    content += f"/{shelf_at[cell]}"
+            cells[cell] = self.cell_label(content)
+        return cells
+
+    @classmethod
+    def cell_label(cls, content: str) -> str:
+        """截断并居中为恰好CELL_WIDTH个字符：超长的内容会覆盖相邻格子，差分渲染时残留在画面上"""
+        return content[:cls.CELL_WIDTH].center(cls.CELL_WIDTH)
+
+    @property
+    def row_label_width(self) -> int:
+        """地图左侧行号的宽度，至少两位"""
+        return max(2, len(str(self.height - 1)))
+
+    def snapshot(self) -> Tuple[Dict[Tuple[int, int], str], int, int]:
+        """
+        在tick之间读取一致的仓库快照，可在其他线程调用
+        :return: (格子显示内容, 当前tick数, 成功移动次数)
+        """
+        with self.state_lock:
+            return self.cell_contents(), self.tick_count, self.tick_successMoveCount
+
+    def run_config(self) -> Dict[str, object]:
+        """复现本次运行所需的参数：用相同参数新建仓库并以相同顺序添加机器人即可得到相同的运行过程"""
+        return {
+            "width": self.width,
+            "height": self.height,
+            "seed": self.seed,
+            "planner_type": self.dynamic_planner.planner_type,
+            "deadlock_policy": self.deadlock_detector.policy,
+            "delivery_stations": [(p.x, p.y) for p in self.delivery_stations],
+            "layout": self.layout.name if self.layout is not None else "",
+            "robot_ids": list(self.robots),
+            "tick_count": self.tick_count,
+        }
 
     def display_warehouse(self):
-        """以表格形式显示仓库状态，使用终端刷新方式"""
-        import os
-        import platform
+        """以表格形式显示仓库状态，使用终端刷新方式，无界面模式下不做任何事"""
+        if self.headless:
+            return
+        with self.profiler.phase("render"):
+            self._print_warehouse()
 
-        # 清屏
-        if platform.system() == "Windows":
-            os.system('cls')
-        else:
-            os.system('clear')
+    def _print_warehouse(self):
 
-        # 移动光标到终端顶部
-        print("\033[H", end="")
+        # 使用ANSI转义序列清屏并把光标移到终端顶部，避免每帧启动外部进程
+        print("\033[2J\033[H", end="")
 
         # 创建表头，确保每个数字占据8个字符的宽度并居中对齐
-        header = "     " + "".join(f"{i:^8}" for i in range(self.width))
+        indent = " " * (self.row_label_width + 3)
+        header = indent + "".join(f"{i:^8}" for i in range(self.width))
         print(header)
-        print("     +" + "--------" * self.width + "+")
+        print(indent + "+" + "--------" * self.width + "+")
 
         # 创建仓库地图
+        cells = self.cell_contents()
         for y in range(self.height):
-            row = f"{y:2}   |"
+            row = f"{y:{self.row_label_width}}   |"
             for x in range(self.width):
-                current_pos = Position(x, y)
-                cell_content = "   .    "  # 默认为空格子，8个字符宽度
-
-                # 检查是否有机器人
-                robot_found = False
-                for robot_id, robot in self.robots.items():
-                    if robot.position.x == x and robot.position.y == y:
-                        # 检查机器人是否在支付台位置
-                        if x == self.delivery_station.x and y == self.delivery_station.y:
-                            cell_content = f"{robot_id}/D".center(8)
-                        else:
-                            # 检查机器人是否在取货点位置
-                            shelf_at_position = None
-                            for pickup_id, pickup_pos in self.pickup_points.items():
-                                if pickup_pos.x == x and pickup_pos.y == y:
-                                    shelf_at_position = pickup_id
-                                    break
-
-                            # 根据不同情况显示机器人状态
-                            if robot.carrying_item is not None:
-                                if shelf_at_position:
-                                    # 携带物品的机器人在货架位置
-                                    cell_content = f"{robot_id}/{robot.carrying_item}/{shelf_at_position}".center(8)
-                                else:
-                                    # 携带物品的机器人在普通位置
-                                    cell_content = f"{robot_id}/{robot.carrying_item}".center(8)
-                            else:
-                                if shelf_at_position:
-                                    # 未携带物品的机器人在货架位置
-                                    cell_content = f"{robot_id}/{shelf_at_position}".center(8)
-                                else:
-                                    # 未携带物品的机器人在普通位置
-                                    cell_content = f"{robot_id}".center(8)
-
-                        robot_found = True
-                        break
-
-                # 如果没有机器人，检查其他元素
-                if not robot_found:
-                    # 检查是否是支付台
-                    if x == self.delivery_station.x and y == self.delivery_station.y:
-                        cell_content = "   D1   "
-                    # 检查是否是取货点 - 始终显示取货点
-                    else:
-                        for pickup_id, pos in self.pickup_points.items():
-                            if pos.x == x and pos.y == y:
-                                # 添加标识显示货架是否已被拾取
-                                picked = '*' if pickup_id in self.picked_shelves else ''
-                                cell_content = f"{pickup_id}{picked}".center(8)
-                                break
-
-                row += cell_content
+                row += cells.get((x, y), self.EMPTY_CELL)
             row += "|"
             print(row)
 
         # 打印底部边框
-        print("     +" + "--------" * self.width + "+")
-        print("\n图例: .  = 空格子, D = 支付台")
-        print("     PA* = 已被拾取的货架, PA = 未被拾取的货架")
-        print("     R1/A = 机器人R1携带A货物")
-        print("     R1/A/PB = 机器人R1携带A货物且位于PB货架位置")
-        print("     R1/D = 机器人R1在支付台")
+        print(indent + "+" + "--------" * self.width + "+")
+        print("\n".join(self.LEGEND))
         print(f"\n当前tick数: {self.tick_count}")
         print(f"成功移动次数: {self.tick_successMoveCount}")
 
@@ -402,7 +551,7 @@ class Warehouse:
         # 先创建新的取货点
         pickup_id = self.add_pickup_point()
         if not pickup_id:
-            print(f"无法为机器人{robot_id}创建新的取货点")
+            logger.warning("无法为机器人%s创建新的取货点", robot_id)
             return False, None
 
         # 获取取货点位置
@@ -411,26 +560,27 @@ class Warehouse:
         # 创建机器人在取货点位置
         if not self.add_robot(robot_id, pickup_pos):
             self.remove_pickup_point(pickup_id)
-            print(f"无法在取货点{pickup_id}创建机器人{robot_id}")
+            logger.warning("无法在取货点%s创建机器人%s", pickup_id, robot_id)
             return False, None
 
         # 让机器人拾取物品
         robot = self.robots[robot_id]
         if robot.pick_item(pickup_id):
-            self.picked_shelves.add(pickup_id)  # 标记货架已被拾取
-            robot.target = self.delivery_station  # 设置目标为支付台
-            print(f"机器人{robot_id}已创建并在取货点{pickup_id}拾取物品")
+            self._mark_picked(pickup_id)  # 标记货架已被拾取
+            robot.target = self.choose_station(robot_id)  # 设置目标为支付台
+            logger.info("机器人%s已创建并在取货点%s拾取物品", robot_id, pickup_id)
             return True, pickup_id
         else:
             self.remove_robot(robot_id)
             self.remove_pickup_point(pickup_id)
-            print(f"机器人{robot_id}无法在取货点{pickup_id}拾取物品")
+            logger.warning("机器人%s无法在取货点%s拾取物品", robot_id, pickup_id)
             return False, None
 
     def flash_robots_position(self):
-        self.robot_positions = set()
-        for r_id, r in self.robots.items():
-            self.robot_positions.add((r.position.x,r.position.y))
+        """
+        robot_positions已是占用索引的实时视图，无需重建；保留此方法以兼容旧调用
+        """
+        self.robot_positions = self.occupancy.cell_to_robot.keys()
 
     def move_robot_use_route_plan(self, rid: str):
         """
@@ -442,62 +592,67 @@ class Warehouse:
         self.recorder(rid)
 
         # 先处理交付和拾取
-        self.on_delivery(rid)
-        self.on_pickup(rid)
+        with self.profiler.phase("events"):
+            self.on_delivery(rid)
+            self.on_pickup(rid)
 
         # 如果没有规划好的路径，需要规划新路径
         if not robot.future_route:
-            # 如果携带物品，目标应该是支付台
+            # 如果携带物品，目标是选定的支付台；已预约交付时间窗的机器人先前往缓冲车道上的排队位置
             if robot.carrying_item is not None:
-                if robot.target != self.delivery_station:
-                    robot.target = self.delivery_station
-                    print(f"机器人{rid}携带物品{robot.carrying_item}，前往支付台")
+                target = self.delivery_queues[self.choose_station(rid)].target_of(rid)
+                if robot.target != target:
+                    robot.target = target
+                    logger.info("机器人%s携带物品%s，前往%s", rid, robot.carrying_item,
+                                "支付台" if target in self.station_cells else "排队位置")
+                if robot.target == robot.position:
+                    # 在排队位置等待放行，预约表中的原地停留由end_turn维护
+                    return True
                 if not self.dynamic_planner.set_route(rid):
-                    print(f"机器人{rid}无法找到路径到支付台，等待下一次尝试")
+                    logger.debug("机器人%s无法找到路径到支付台，等待下一次尝试", rid)
                     return False
             else:
-                # 如果没有携带物品，寻找未被拾取的货架
-                unpicked_shelves = set()
-                for pickId, pickPos in self.pickup_points.items():
-                    if pickId not in self.picked_shelves:
-                        unpicked_shelves.add((pickId, pickPos))
-                
-                if unpicked_shelves:
-                    # 选择一个未被拾取的货架
-                    unpicked_id, unpicked_pos = unpicked_shelves.pop()
+                # 如果没有携带物品，前往分配到的货架
+                unpicked_id = self.task_assignment.get(rid)
+                if unpicked_id is not None:
+                    unpicked_pos = self.pickup_points[unpicked_id]
                     if robot.target != unpicked_pos:
                         robot.target = unpicked_pos
-                        print(f"机器人{rid}前往取货点{unpicked_id}")
+                        logger.info("机器人%s前往取货点%s", rid, unpicked_id)
                     if not self.dynamic_planner.set_route(rid):
-                        print(f"机器人{rid}无法找到路径到取货点{unpicked_id}，等待下一次尝试")
+                        logger.debug("机器人%s无法找到路径到取货点%s，等待下一次尝试", rid, unpicked_id)
                         return False
                 else:
-                    # 如果没有未被拾取的货架，且机器人在支付台，移动到随机位置
-                    if robot.position == self.delivery_station:
-                        available_positions = [(x, y) for x in range(self.width) for y in range(self.height)
-                                            if (x, y) not in self.robot_positions and 
-                                            (x, y) != (self.delivery_station.x, self.delivery_station.y)]
-                        if available_positions:
-                            x, y = random.choice(available_positions)
+                    # 如果没有可分配的货架，且机器人在支付台或排队、出口车道上，移动到随机位置
+                    if ((robot.position in self.station_cells or robot.position in self.queue_cells) and
+                            not self.open_pickups()):
+                        cell = self.free_cells.sample(self.rng)
+                        if cell is not None:
+                            x, y = cell
                             robot.target = Position(x, y)
-                            print(f"机器人{rid}从支付台移动到随机位置({x}, {y})")
+                            logger.info("机器人%s从支付台移动到随机位置(%s, %s)", rid, x, y)
                             if not self.dynamic_planner.set_route(rid):
-                                print(f"机器人{rid}无法找到路径到随机位置，等待下一次尝试")
+                                logger.debug("机器人%s无法找到路径到随机位置，等待下一次尝试", rid)
                                 return False
                         else:
-                            print(f"机器人{rid}无法找到可用的移动位置")
+                            logger.warning("机器人%s无法找到可用的移动位置", rid)
                             return False
                     else:
                         # 如果不在支付台，可以暂时待命
                         if robot.target != robot.position:
                             robot.target = robot.position
-                            print(f"机器人{rid}当前无任务，待命中")
+                            logger.debug("机器人%s当前无任务，待命中", rid)
                         return True
 
         # 确保有可用的路径
         if not robot.future_route:
             return False
 
+        # 时空规划的路线中可能包含原地等待
+        if robot.future_route[0] == robot.position:
+            robot.future_route.pop(0)
+            return True
+
         # 移动机器人
         if self.move_robot(rid,
                         Direction.coordinates_to_direction(
@@ -506,6 +661,7 @@ class Warehouse:
                         )):
             robot.future_route.pop(0)
             self.tick_successMoveCount += 1
+            self.profiler.count("moves")
             return True
 
         return False
@@ -517,23 +673,134 @@ class Warehouse:
         :return:
         """
         r = self.robots[rid]
-        for pickId, pickPoint in self.pickup_points.items():
-            if pickPoint == r.position:
-                r.history_route.append(
-                    (r.position, 1)
-                )
-            elif r.position == self.delivery_station:
-                r.history_route.append(
-                    (r.position, 2)
-                )
-            else:
-                r.history_route.append(
-                    (r.position, 0)
-                )
+        # 每个tick记录一条：1 = 位于取货点，2 = 位于支付台，0 = 其他位置
+        if (r.position.x, r.position.y) in self.pickup_at:
+            status = 1
+        elif r.position in self.station_cells:
+            status = 2
+        else:
+            status = 0
+        r.history_route.append(r.position, status)
+
+    def open_pickups(self) -> Dict[str, Position]:
+        """未被拾取且未分配给任何机器人的取货点，按ID排序，使任务分配不依赖集合的迭代顺序"""
+        return {pickup_id: self.pickup_points[pickup_id] for pickup_id in sorted(self.unpicked_shelves)
+                if pickup_id not in self.pickup_claims}
+
+    @staticmethod
+    def default_stations(width: int, height: int, count: int) -> List[Tuple[int, int]]:
+        """沿仓库底边均匀分布count个支付台，最右边的一个位于右下角，count为1时与默认位置相同"""
+        count = max(1, min(count, width))
+        return [((i + 1) * width // count - 1, height - 1) for i in range(count)]
+
+    @staticmethod
+    def layout_stations(layout: WarehouseMap, count: int = 1) -> List[Tuple[int, int]]:
+        """
+        静态布局上的支付台：地图中标出支付台时直接使用，
+        否则按default_stations放置，落在障碍物上的移到最近的可通行格子
+        """
+        if layout.stations:
+            return list(layout.stations)
+        stations = []
+        for cell in Warehouse.default_stations(layout.width, layout.height, count):
+            cell = layout.nearest_free(cell, stations)
+            if cell is not None:
+                stations.append(cell)
+        return stations
+
+    @classmethod
+    def from_map(cls, path: str, **kwargs) -> "Warehouse":
+        """
+        从MovingAI格式的地图文件建立仓库，尺寸与静态障碍物取自地图
+        :param path: .map 文件路径
+        :param kwargs: 其他Warehouse参数
+        """
+        layout = WarehouseMap.load(path)
+        return cls(layout.width, layout.height, layout=layout, **kwargs)
+
+    def choose_station(self, rid: str) -> Position:
+        """
+        为携带货物的机器人选择支付台：预计到达时间（到该支付台距离场的步数）
+        加上已选择该支付台的其他机器人的交付时间之和最小者；
+        已预约交付时间窗或已获准进入的机器人不再更换支付台
+        """
+        current = self.station_choice.get(rid)
+        if current is not None and self.delivery_queues[current].holds_booking(rid):
+            return current
+        if len(self.delivery_stations) == 1:
+            choice = self.delivery_station
+        else:
+            pending = {station: 0 for station in self.delivery_stations}
+            for other, station in self.station_choice.items():
+                if other != rid:
+                    pending[station] += 1
+            position = self.robots[rid].position
+            best_cost = None
+            choice = current or self.delivery_station
+            for station in self.delivery_stations:
+                distance = self.distance_fields.distance(station, position)
+                if distance is None or distance == DistanceFieldCache.UNREACHABLE:
+                    continue
+                cost = distance + pending[station] * DeliveryQueue.service_ticks
+                if best_cost is None or cost < best_cost:
+                    best_cost, choice = cost, station
+        if choice != current:
+            self.station_choice[rid] = choice
+            if current is not None:
+                logger.debug("机器人%s改为前往支付台(%s, %s)", rid, choice.x, choice.y)
+        return choice
+
+    def station_report(self) -> Dict[str, object]:
+        """各支付台的交付预约统计与合计：排队长度相加，支付台利用率取平均"""
+        reports = [dict(queue.report(), station=(station.x, station.y))
+                   for station, queue in self.delivery_queues.items()]
+        return {
+            "stations": len(reports),
+            "deliveries_per_tick": round(self.delivery_count / self.tick_count, 4) if self.tick_count else 0.0,
+            "mean_queue_length": round(sum(r["mean_queue_length"] for r in reports), 3),
+            "max_queue_length": max(r["max_queue_length"] for r in reports),
+            "station_utilization": round(sum(r["station_utilization"] for r in reports) / len(reports), 4),
+            "per_station": reports,
+        }
+
+    def release_task(self, rid: str):
+        """取消机器人的取货分配"""
+        pickup_id = self.task_assignment.pop(rid, None)
+        if pickup_id is not None and self.pickup_claims.get(pickup_id) == rid:
+            del self.pickup_claims[pickup_id]
+
+    def release_pickup_claim(self, pickup_id: str):
+        """取货点被拾取或移除时取消对它的分配"""
+        rid = self.pickup_claims.pop(pickup_id, None)
+        if rid is not None and self.task_assignment.get(rid) == pickup_id:
+            del self.task_assignment[rid]
+
+    def assign_tasks(self) -> Dict[str, str]:
+        """
+        为所有空闲机器人（未携带物品且没有分配货架）与未分配的货架求最小代价匹配
+        :return: 本次新分配的 机器人ID -> 取货点ID
+        """
+        tasks = self.open_pickups()
+        if not tasks:
+            return {}
+        idle = {rid: robot.position for rid, robot in self.robots.items()
+                if robot.carrying_item is None and rid not in self.task_assignment}
+        assignment = self.task_assigner.assign(idle, tasks)
+        for rid, pickup_id in assignment.items():
+            robot = self.robots[rid]
+            self.task_assignment[rid] = pickup_id
+            self.pickup_claims[pickup_id] = rid
+            robot.target = tasks[pickup_id]
+            self.dynamic_planner.cancel_route(rid)  # 清空当前路径，强制重新规划
+            logger.info("机器人%s的新目标设置为取货点%s", rid, pickup_id)
+        return assignment
 
     def moveAll(self):
         for rid, r in self.robots.items():
-            self.move_robot_use_route_plan(rid)
+            if not self.move_robot_use_route_plan(rid):
+                self.tick_failedMoveCount += 1
+                self.profiler.count("failed_moves")
+            self.dynamic_planner.end_turn(rid)
 
     def tick_time(self,times: int):
         for i in range[1:times + 1:1]:
@@ -545,13 +812,22 @@ class Warehouse:
         :return: tuple(每次tick所消耗时间，单位毫秒ms;成功移动总次数)
         """
         start_time = time.perf_counter()
-
-        self.moveAll()
-        self.dynamic_planner.check()
-        self.tick_count += 1
-
-        end_time = time.perf_counter()
-        return (end_time - start_time) * 1000
+        profiler = self.profiler
+
+        with self.state_lock:
+            with profiler.phase("move_all"):
+                self.moveAll()
+            with profiler.phase("deadlock"):
+                self.deadlock_detector.update()
+            with profiler.phase("assign"):
+                self.assign_tasks()
+            with profiler.phase("check"):
+                self.dynamic_planner.check()
+            self.tick_count += 1
+
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        profiler.record("tick", elapsed_ms)
+        return elapsed_ms
 
 
 def main():
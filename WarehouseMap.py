@@ -0,0 +1,172 @@
+from collections import deque
+from typing import Iterable, List, NamedTuple, Optional, Set, Tuple
+from Direction import Direction
+from Position import Position
+
+
+class WarehouseMap:
+    """
+    仓库静态布局：尺寸、静态障碍物（货架、墙）与支付台位置
+    地图文件使用MovingAI的 .map 格式：
+        type octile
+        height <行数>
+        width <列数>
+        map
+        <每行width个字符>
+    '.'、'G'、'S' 为可通行格子，'@'、'O'、'T'、'W' 等其他字符为障碍物；
+    此外 'D' 表示支付台（可通行），MovingAI的标准地图中不会出现
+    """
+
+    PASSABLE = ".GS"
+    STATION = "D"
+
+    def __init__(self, width: int, height: int, obstacles: Iterable[Tuple[int, int]] = (),
+                 stations: Iterable[Tuple[int, int]] = (), name: str = ""):
+        """
+        :param width: 仓库宽
+        :param height: 仓库高
+        :param obstacles: 静态障碍物格子
+        :param stations: 支付台格子，为空时由Warehouse决定
+        :param name: 地图名（一般为文件名），仅用于显示
+        """
+        self.width = width
+        self.height = height
+        self.obstacles: Set[Tuple[int, int]] = set(obstacles)
+        self.stations: List[Tuple[int, int]] = list(stations)
+        self.name = name
+        for x, y in self.obstacles | set(self.stations):
+            if not (0 <= x < width and 0 <= y < height):
+                raise ValueError(f"cell ({x}, {y}) is outside the {width}x{height} map")
+        blocked = self.obstacles.intersection(self.stations)
+        if blocked:
+            raise ValueError(f"delivery stations on obstacles: {sorted(blocked)}")
+
+    @classmethod
+    def load(cls, path: str) -> "WarehouseMap":
+        """读取MovingAI格式的 .map 文件"""
+        with open(path, encoding="utf-8") as f:
+            return cls.parse(f.read(), name=path)
+
+    @classmethod
+    def parse(cls, text: str, name: str = "") -> "WarehouseMap":
+        """解析MovingAI格式的地图文本"""
+        lines = text.splitlines()
+        header = {}
+        index = 0
+        while index < len(lines):
+            line = lines[index].strip()
+            index += 1
+            if line == "map":
+                break
+            if line:
+                key, _, value = line.partition(" ")
+                header[key] = value.strip()
+        else:
+            raise ValueError(f"{name or 'map'}: missing 'map' line")
+        try:
+            width, height = int(header["width"]), int(header["height"])
+        except (KeyError, ValueError):
+            raise ValueError(f"{name or 'map'}: missing or invalid width/height") from None
+        rows = lines[index:index + height]
+        if len(rows) < height:
+            raise ValueError(f"{name or 'map'}: expected {height} rows, got {len(rows)}")
+        return cls.from_rows(rows, width, name)
+
+    @classmethod
+    def from_rows(cls, rows: List[str], width: Optional[int] = None, name: str = "") -> "WarehouseMap":
+        """由字符行构建布局，字符含义与 .map 文件相同，便于在代码中直接写出小地图"""
+        width = width if width is not None else max((len(row) for row in rows), default=0)
+        obstacles = []
+        stations = []
+        for y, row in enumerate(rows):
+            row = row.rstrip("\r\n")
+            if len(row) < width:
+                raise ValueError(f"{name or 'map'}: row {y} has {len(row)} cells, expected {width}")
+            for x, char in enumerate(row[:width]):
+                if char == cls.STATION:
+                    stations.append((x, y))
+                elif char not in cls.PASSABLE:
+                    obstacles.append((x, y))
+        return cls(width, len(rows), obstacles, stations, name)
+
+    @classmethod
+    def rack_blocks(cls, width: int, height: int, rack_length: int = 4, aisle: int = 1,
+                    margin: int = 2) -> "WarehouseMap":
+        """
+        生成常见的货架布局：两排背靠背的货架组成一个货架块（2 x rack_length），
+        块与块之间留aisle宽的通道，四周留margin宽的主通道
+        """
+        obstacles = []
+        y = margin
+        while y + 2 <= height - margin:
+            x = margin
+            while x + rack_length <= width - margin:
+                obstacles.extend((x + dx, y + dy) for dx in range(rack_length) for dy in range(2))
+                x += rack_length + aisle
+            y += 2 + aisle
+        return cls(width, height, obstacles, name=f"racks{width}x{height}")
+
+    def is_free(self, x: int, y: int) -> bool:
+        return 0 <= x < self.width and 0 <= y < self.height and (x, y) not in self.obstacles
+
+    def rack_faces(self) -> List[Tuple[int, int]]:
+        """与静态障碍物四相邻的可通行格子（货架面），按 (y, x) 顺序"""
+        faces = []
+        for y in range(self.height):
+            for x in range(self.width):
+                if (x, y) in self.obstacles:
+                    continue
+                if any((x + dx, y + dy) in self.obstacles for dx, dy in Direction.get_directions()):
+                    faces.append((x, y))
+        return faces
+
+    def nearest_free(self, cell: Tuple[int, int], taken: Iterable[Tuple[int, int]] = ()) -> Optional[Tuple[int, int]]:
+        """从cell出发广度优先找到最近的可通行且不在taken中的格子，没有时返回None"""
+        taken = set(taken)
+        x, y = cell
+        x, y = min(max(x, 0), self.width - 1), min(max(y, 0), self.height - 1)
+        visited = {(x, y)}
+        queue = deque([(x, y)])
+        while queue:
+            x, y = queue.popleft()
+            if (x, y) not in self.obstacles and (x, y) not in taken:
+                return x, y
+            for dx, dy in Direction.get_directions():
+                neighbor = (x + dx, y + dy)
+                if neighbor not in visited and 0 <= neighbor[0] < self.width and 0 <= neighbor[1] < self.height:
+                    visited.add(neighbor)
+                    queue.append(neighbor)
+        return None
+
+
+class ScenarioEntry(NamedTuple):
+    """MovingAI .scen 文件中的一条查询"""
+    bucket: int
+    map_name: str
+    width: int
+    height: int
+    start: Position
+    goal: Position
+    optimal_length: float  # MovingAI按八连通（对角线代价√2）计算的最短路长度，仅供参考
+
+
+def load_scenarios(path: str) -> List[ScenarioEntry]:
+    """
+    读取MovingAI格式的 .scen 文件（version 1），每行：
+    bucket  map  map_width  map_height  start_x  start_y  goal_x  goal_y  optimal_length
+    """
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            parts = line.split()
+            if not parts or parts[0] == "version":
+                continue
+            if len(parts) < 9:
+                raise ValueError(f"{path}:{number}: expected 9 fields, got {len(parts)}")
+            try:
+                entries.append(ScenarioEntry(int(parts[0]), parts[1], int(parts[2]), int(parts[3]),
+                                             Position(int(parts[4]), int(parts[5])),
+                                             Position(int(parts[6]), int(parts[7])), float(parts[8])))
+            except ValueError:
+                raise ValueError(f"{path}:{number}: invalid scenario line") from None
+    return entries
@@ -1,8 +1,15 @@
+import logging
 from time import sleep
+from typing import Optional
 
 from WareHouse_system import Robot
 from WareHouse_system import Warehouse
 from Direction import Direction
+from TerminalRenderer import TerminalRenderer
+from ExperimentRunner import MonteCarloRunner
+from TickProfiler import percentile
+
+logger = logging.getLogger(__name__)
 
 def func1():
     warehouse = Warehouse(6, 6)
@@ -23,39 +30,115 @@ def func1():
         print(f"物品来源: {warehouse.robots['R2'].item_source}")
     warehouse.display_warehouse()
 
-def func2():
-    warehouse = Warehouse(20, 20)
-    print("初始化仓库系统...")
-    success, pickup_id = warehouse.add_robot_with_pickup("R1")
-    success, pickup_id = warehouse.add_robot_with_pickup("R2")
-    success, pickup_id = warehouse.add_robot_with_pickup("R3")
-    success, pickup_id = warehouse.add_robot_with_pickup("R4")
-    success, pickup_id = warehouse.add_robot_with_pickup("R5")
-
-    warehouse.display_warehouse()
-    max_ticks = 1000  # 最大运行100个时间单位
-    tick_count = 0
-    
+def run_experiments(widths=(20,), robot_counts=(5,), max_ticks: int = 1000,
+                    planner_types=("space_time",), repeats: int = 10, processes: Optional[int] = None,
+                    csv_path: str = "experiments.csv", summary_path: str = "experiments_summary.csv",
+                    deadlock_policies=("back_off",), station_counts=(1,), map_paths=("",)) -> list:
+    """
+    多进程批量运行带种子的无界面仿真，结果逐行写入csv_path，按参数组合汇总写入summary_path
+    :param widths: 仓库边长（正方形仓库）
+    :param robot_counts: 机器人数量
+    :param planner_types: 路径规划方式，见DynamicPlanner.planner_type
+    :param repeats: 每个参数组合使用的种子数
+    :param processes: 工作进程数，默认CPU核数
+    :param deadlock_policies: 死锁处理方式，见DeadlockDetector.POLICIES
+    :param station_counts: 支付台数量，见Warehouse.default_stations
+    :param map_paths: MovingAI格式的静态布局文件，空字符串表示空仓库
+    :return: 汇总结果
+    """
+    runner = MonteCarloRunner(processes)
+    configs = runner.grid(widths=widths, robot_counts=robot_counts, max_ticks=max_ticks,
+                          planner_types=planner_types, repeats=repeats,
+                          deadlock_policies=deadlock_policies, station_counts=station_counts,
+                          map_paths=map_paths)
+    rows = runner.run(configs, csv_path, summary_path)
+    summary = runner.aggregate(rows)
+    for entry in summary:
+        logger.info("%sx%s，%s台机器人，%s个支付台，%s，死锁处理%s：%d次仿真，平均交付%.1f次，平均死锁%.1f次，"
+                    "平均tick %.3fms",
+                    entry["width"], entry["height"], entry["robot_count"], entry["station_count"],
+                    entry["planner_type"], entry["deadlock_policy"], entry["runs"], entry["deliveries_mean"],
+                    entry["deadlocks_mean"], entry["tick_mean_ms"])
+    return summary
+
+
+def run_headless(width: int = 20, height: int = 20, robot_count: int = 5, max_ticks: int = 1000,
+                 planner_type: str = "space_time", seed: Optional[int] = None,
+                 profile: bool = False, deadlock_policy: str = "back_off",
+                 delivery_stations: Optional[list] = None, map_path: Optional[str] = None) -> dict:
+    """
+    无界面模式运行仿真，不渲染终端画面，只统计吞吐量
+    :param width: 仓库宽
+    :param height: 仓库高
+    :param robot_count: 机器人数量
+    :param max_ticks: 运行的tick数
+    :param planner_type: 路径规划方式，见DynamicPlanner.planner_type
+    :param seed: 随机种子，默认随机生成，实际使用的种子记录在结果中
+    :param profile: 记录tick各阶段耗时，结果中附带 profile 统计并输出文本摘要
+    :param deadlock_policy: 死锁处理方式，见DeadlockDetector.POLICIES
+    :param delivery_stations: 支付台位置列表，默认只有右下角一个
+    :param map_path: MovingAI格式的静态布局文件，给出时忽略width与height，仓库尺寸取自地图
+    :return: 统计结果，包括每秒tick数、单次tick耗时（毫秒）的平均值与分位数、死锁次数与持续时间，以及各支付台的排队统计
+    """
+    if map_path:
+        warehouse = Warehouse.from_map(map_path, headless=True, seed=seed, profile=profile,
+                                       deadlock_policy=deadlock_policy, delivery_stations=delivery_stations)
+    else:
+        warehouse = Warehouse(width, height, headless=True, seed=seed, profile=profile,
+                              deadlock_policy=deadlock_policy, delivery_stations=delivery_stations)
+    warehouse.dynamic_planner.planner_type = planner_type
+    for i in range(1, robot_count + 1):
+        warehouse.add_robot_with_pickup(f"R{i}")
+
+    tick_ms = []
+    for _ in range(max_ticks):
+        tick_ms.append(warehouse.tick())
+
+    total_ms = sum(tick_ms)
+    ordered = sorted(tick_ms)
+    stats = {
+        "ticks": max_ticks,
+        "ticks_per_second": max_ticks / (total_ms / 1000) if total_ms > 0 else float("inf"),
+        "mean_ms": total_ms / max_ticks if max_ticks else 0.0,
+        "p50_ms": percentile(ordered, 0.5),
+        "p95_ms": percentile(ordered, 0.95),
+        "max_ms": ordered[-1] if ordered else 0.0,
+        "moves": warehouse.tick_successMoveCount,
+        "seed": warehouse.seed,
+        "deadlocks": warehouse.deadlock_detector.report(),
+        "stations": warehouse.station_report(),
+    }
+    if profile:
+        stats["profile"] = warehouse.profiler.report()
+        logger.info("各阶段耗时：\n%s", warehouse.profiler.summary())
+    logger.info("无界面仿真完成：%d tick，%.1f tick/s，平均%.3fms，p50 %.3fms，p95 %.3fms，最大%.3fms，成功移动%d次",
+                stats["ticks"], stats["ticks_per_second"], stats["mean_ms"], stats["p50_ms"],
+                stats["p95_ms"], stats["max_ms"], stats["moves"])
+    return stats
+
+
+def run_live(width: int = 20, height: int = 20, robot_count: int = 5, max_ticks: int = 1000,
+             fps: float = 10.0, tick_interval: float = 0.0):
+    """
+    运行仿真并在独立线程中差分渲染终端画面，渲染不阻塞仿真tick
+    :param fps: 渲染帧率
+    :param tick_interval: 每次tick后的等待时间，单位秒，0表示全速运行
+    """
+    warehouse = Warehouse(width, height, headless=True)
+    for i in range(1, robot_count + 1):
+        warehouse.add_robot_with_pickup(f"R{i}")
+
+    renderer = TerminalRenderer(warehouse, fps=fps)
+    renderer.start()
     try:
-        while tick_count < max_ticks:
+        for _ in range(max_ticks):
             warehouse.tick()
-            warehouse.display_warehouse()
-            #sleep(0.5)  # 添加0.5秒延时，使显示更容易观察
-            tick_count += 1
-            
-            # 检查是否所有机器人都完成了任务
-            all_done = True
-            for rid, robot in warehouse.robots.items():
-                if robot.carrying_item is not None or len(robot.future_route) > 0:
-                    all_done = False
-                    break
-            
-            if all_done and False:
-                print("\n所有机器人已完成任务！")
-                break
-                
+            if tick_interval > 0:
+                sleep(tick_interval)
     except KeyboardInterrupt:
         print("\n程序被用户中断")
+    finally:
+        renderer.stop()
 
 
 def func3():
@@ -75,10 +158,7 @@ def func3():
     # warehouse.flash_robots_position()
     print(warehouse.robot_positions)
 
-func2()
-
-
-
-
-
 
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    run_experiments()
@@ -0,0 +1,62 @@
+import pytest
+from ConflictBasedSearch import ConflictBasedSearch
+from Position import Position
+from ReservationTable import ReservationTable
+
+# 5x3 的走廊：中间一行可以通行，(2, 0) 是唯一的避让格子
+WIDTH, HEIGHT = 5, 3
+WALLS = [(x, y) for x in range(WIDTH) for y in (0, 2) if (x, y) != (2, 0)]
+
+
+def timeline(start: Position, route, length: int):
+    """包含起点的逐tick位置，到达终点后一直停留"""
+    cells = [(start.x, start.y)] + [(p.x, p.y) for p in route]
+    return cells + [cells[-1]] * (length - len(cells))
+
+
+def assert_conflict_free(agents, routes, walls=(), slack=0):
+    """路线连续、不进入墙、到达终点，任意两台机器人在同一格子的时间差大于slack，且不互换位置"""
+    assert routes is not None and set(routes) == set(agents)
+    length = max(len(route) for route in routes.values()) + 1
+    lines = {}
+    for rid, (start, goal, _, _) in agents.items():
+        assert routes[rid][-1] == goal
+        cells = timeline(start, routes[rid], length)
+        for (x1, y1), (x2, y2) in zip(cells, cells[1:]):
+            assert abs(x1 - x2) + abs(y1 - y2) <= 1
+            assert (x2, y2) not in walls
+        lines[rid] = cells
+
+    rids = sorted(lines)
+    for i, first in enumerate(rids):
+        for second in rids[i + 1:]:
+            a, b = lines[first], lines[second]
+            for t in range(length):
+                for dt in range(-slack, slack + 1):
+                    if 0 <= t + dt < length:
+                        assert a[t] != b[t + dt], f"vertex conflict between {first} and {second} at t={t}"
+                if t > 0:
+                    assert (a[t - 1], a[t]) != (b[t], b[t - 1]), f"edge conflict between {first} and {second} at t={t}"
+
+
+@pytest.mark.parametrize("suboptimality", [1.0, 1.5])
+def test_corridor_swap_is_conflict_free(suboptimality):
+    agents = {
+        "R1": (Position(0, 1), Position(4, 1), 0, True),
+        "R2": (Position(4, 1), Position(0, 1), 0, True),
+    }
+    cbs = ConflictBasedSearch(WIDTH, HEIGHT, ReservationTable(), suboptimality=suboptimality,
+                              time_limit=1.0, static_obstacles=WALLS)
+    assert_conflict_free(agents, cbs.solve(agents), WALLS, cbs.table.slack)
+
+
+@pytest.mark.parametrize("suboptimality", [1.0, 1.5])
+def test_rotation_with_slack_is_solved(suboptimality):
+    # 三台机器人的终点是下一台的起点：按时间窗松弛量，拆分到起点上的冲突只能由进入的一方推迟
+    agents = {
+        "R1": (Position(4, 4), Position(5, 4), 0, True),
+        "R2": (Position(5, 4), Position(5, 5), 0, True),
+        "R3": (Position(5, 5), Position(4, 4), 0, True),
+    }
+    cbs = ConflictBasedSearch(10, 10, ReservationTable(slack=1), suboptimality=suboptimality, time_limit=1.0)
+    assert_conflict_free(agents, cbs.solve(agents), slack=1)
@@ -0,0 +1,47 @@
+import random
+import pytest
+from AStar import AStar
+from DStarLite import DStarLite
+from Position import Position
+
+WIDTH, HEIGHT = 20, 20
+
+
+def assert_valid(start: Position, path, obstacles, static_obstacles):
+    previous = (start.x, start.y)
+    for step in path:
+        cell = (step.x, step.y)
+        assert abs(cell[0] - previous[0]) + abs(cell[1] - previous[1]) == 1
+        assert 0 <= step.x < WIDTH and 0 <= step.y < HEIGHT
+        assert cell not in obstacles and cell not in static_obstacles
+        previous = cell
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_replan_matches_fresh_astar_after_obstacle_update(seed):
+    rng = random.Random(seed)
+    cells = [(x, y) for x in range(WIDTH) for y in range(HEIGHT)]
+    start, goal = Position(0, 0), Position(WIDTH - 1, HEIGHT - 1)
+    static_obstacles = {cell for cell in rng.sample(cells, 60) if cell not in ((0, 0), (goal.x, goal.y))}
+    free = [cell for cell in cells if cell not in static_obstacles and cell not in ((0, 0), (goal.x, goal.y))]
+
+    planner = DStarLite(WIDTH, HEIGHT, goal, static_obstacles)
+    obstacles = set(rng.sample(free, 20))
+    for _ in range(6):
+        path = planner.plan(start, obstacles)
+        expected = AStar(width=WIDTH, height=HEIGHT, static_obstacles=static_obstacles).find_path(
+            start, goal, obstacles)
+        assert len(path) == len(expected)
+        if not path:
+            break
+        assert_valid(start, path, obstacles, static_obstacles)
+        assert path[-1] == goal
+
+        # 沿路线前进几步，再把路线上的格子挡住、放开部分旧障碍物
+        start = path[min(2, len(path) - 1)]
+        if start == goal:
+            break
+        ahead = [(p.x, p.y) for p in path[3:6] if p != goal]
+        released = set(rng.sample(sorted(obstacles), 5))
+        obstacles = (obstacles - released) | set(ahead)
+        obstacles.discard((start.x, start.y))
@@ -0,0 +1,60 @@
+import pytest
+from Position import Position
+from WareHouse_system import Warehouse
+
+# 三台机器人的目标分别是下一台所在的格子，都没有路线：R1 -> R2 -> R3 -> R1
+CELLS = {"R1": (4, 4), "R2": (5, 4), "R3": (5, 5)}
+TARGETS = {"R1": (5, 4), "R2": (5, 5), "R3": (4, 4)}
+
+
+def make_cycle(policy: str) -> Warehouse:
+    warehouse = Warehouse(10, 10, headless=True, seed=1, deadlock_policy=policy)
+    for rid, (x, y) in CELLS.items():
+        assert warehouse.add_robot(rid, Position(x, y))
+    for rid, (x, y) in TARGETS.items():
+        warehouse.robots[rid].target = Position(x, y)
+        warehouse.robots[rid].future_route = []
+    return warehouse
+
+
+def wait_for_resolution(warehouse: Warehouse):
+    """逐tick调用update直到死锁被确认，返回本tick处理过的死锁"""
+    detector = warehouse.deadlock_detector
+    for _ in range(detector.patience + 1):
+        handled = detector.update()
+        if detector.detected["cycle"]:
+            return handled
+        warehouse.tick_count += 1
+    return []
+
+
+def test_detects_three_robot_cycle():
+    warehouse = make_cycle("none")
+    detector = warehouse.deadlock_detector
+    detector.update()
+    assert detector.waits_for == {"R1": "R2", "R2": "R3", "R3": "R1"}
+    assert set(detector.cycles) == {frozenset(CELLS)}
+    assert detector.detected["cycle"] == 0  # 持续patience个tick后才确认
+
+    assert wait_for_resolution(warehouse) == []
+    assert detector.detected["cycle"] == 1
+    assert [record.members for record in detector.active()] == [frozenset(CELLS)]
+    assert all(count == 0 for count in detector.resolutions.values())
+
+
+@pytest.mark.parametrize("policy", ["priority_yield", "back_off", "joint_replan"])
+def test_policy_breaks_three_robot_cycle(policy):
+    warehouse = make_cycle(policy)
+    detector = warehouse.deadlock_detector
+    handled = wait_for_resolution(warehouse)
+    assert [record.members for record in handled] == [frozenset(CELLS)]
+    assert detector.resolutions[policy] == 1
+    assert detector.failed_joint_replans == 0
+
+    # 按处理后的路线走一个tick，环不再存在
+    warehouse.moveAll()
+    warehouse.tick_count += 1
+    detector.update()
+    assert not detector.cycles
+    assert all(detector._cycle_from(rid) is None for rid in CELLS)
+    assert detector.report()["active"] == 0
@@ -0,0 +1,112 @@
+import random
+import pytest
+from AStar import AStar
+from HPAStar import HPAStar
+from Position import Position
+
+SIZE = 60
+CLUSTER_SIZE = 10
+
+
+def random_map(seed: int, density: float = 0.2):
+    rng = random.Random(seed)
+    cells = [(x, y) for x in range(SIZE) for y in range(SIZE)]
+    blocked = set(rng.sample(cells, int(len(cells) * density)))
+    return rng, blocked, [cell for cell in cells if cell not in blocked]
+
+
+def assert_valid(start, goal, path, blocked):
+    previous = start
+    for step in path:
+        cell = (step.x, step.y)
+        assert abs(cell[0] - previous[0]) + abs(cell[1] - previous[1]) == 1
+        assert 0 <= step.x < SIZE and 0 <= step.y < SIZE
+        assert cell not in blocked
+        previous = cell
+    assert previous == goal
+
+
+def assert_within_bound(path, optimal):
+    """
+    HPA*不保证最短：路线经过区域边界上的入口，多走的步数与区域边长有关。
+    在 20% 障碍物的随机地图上多走的步数不超过 最短路线的25% 与 半个区域边长 中的较大者
+    """
+    assert len(optimal) <= len(path) <= len(optimal) + max(0.25 * len(optimal), CLUSTER_SIZE / 2)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_paths_are_valid_and_near_optimal(seed):
+    rng, blocked, free = random_map(seed)
+    hpa = HPAStar(SIZE, SIZE, blocked, CLUSTER_SIZE)
+    astar = AStar(width=SIZE, height=SIZE, static_obstacles=blocked)
+    for _ in range(50):
+        start, goal = rng.sample(free, 2)
+        path = hpa.find_path(Position(*start), Position(*goal))
+        optimal = astar.find_path(Position(*start), Position(*goal), set())
+        assert bool(path) == bool(optimal)
+        if optimal:
+            assert_valid(start, goal, path, blocked)
+            assert_within_bound(path, optimal)
+
+
+def test_paths_stay_valid_after_local_rebuild():
+    rng, blocked, free = random_map(0)
+    hpa = HPAStar(SIZE, SIZE, blocked, CLUSTER_SIZE)
+    for _ in range(5):
+        # 放开一部分货架、新增一部分货架，只重建受影响的区域
+        released = set(rng.sample(sorted(blocked), 40))
+        added = set(rng.sample(free, 40))
+        blocked = (blocked - released) | added
+        free = [cell for cell in free if cell not in added] + sorted(released)
+        hpa.set_static_obstacles(blocked)
+        astar = AStar(width=SIZE, height=SIZE, static_obstacles=blocked)
+        for _ in range(20):
+            start, goal = rng.sample(free, 2)
+            path = hpa.find_path(Position(*start), Position(*goal))
+            optimal = astar.find_path(Position(*start), Position(*goal), set())
+            assert bool(path) == bool(optimal)
+            if optimal:
+                assert_valid(start, goal, path, blocked)
+                assert_within_bound(path, optimal)
+
+
+def test_repair_avoids_dynamic_obstacles_within_horizon():
+    rng, blocked, free = random_map(1)
+    hpa = HPAStar(SIZE, SIZE, blocked, CLUSTER_SIZE)
+    horizon = 2 * CLUSTER_SIZE
+    for _ in range(30):
+        start, goal = rng.sample(free, 2)
+        path = hpa.find_path(Position(*start), Position(*goal))
+        if len(path) < 4:
+            continue
+        # 其他机器人挡在路线前段
+        robots = {(p.x, p.y) for p in path[1:min(len(path) - 1, horizon):3]}
+        repaired = hpa.find_path(Position(*start), Position(*goal), robots)
+        if not repaired:
+            continue
+        cells = [(p.x, p.y) for p in repaired]
+        assert not robots & set(cells[:horizon])
+        assert_valid(start, cells[-1], repaired, blocked)
+
+
+def test_repair_continues_along_existing_route():
+    rng, blocked, free = random_map(2)
+    hpa = HPAStar(SIZE, SIZE, blocked, CLUSTER_SIZE)
+    horizon = 2 * CLUSTER_SIZE
+    checked = 0
+    for _ in range(50):
+        start, goal = rng.sample(free, 2)
+        path = hpa.find_path(Position(*start), Position(*goal))
+        if len(path) < 2 * horizon:
+            continue
+        # 走完第一段后，其他机器人挡在剩余路线的下一段上
+        position, rest = path[horizon - 1], path[horizon:]
+        robots = {(p.x, p.y) for p in rest[1:horizon:4]}
+        repaired = hpa.repair(position, rest, robots, horizon)
+        if not repaired:
+            continue
+        cells = [(p.x, p.y) for p in repaired]
+        assert not robots & set(cells[:horizon])
+        assert_valid((position.x, position.y), cells[-1], repaired, blocked)
+        checked += 1
+    assert checked > 0
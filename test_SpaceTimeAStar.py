@@ -0,0 +1,92 @@
+import random
+import pytest
+from DistanceFieldCache import DistanceFieldCache
+from Position import Position
+from ReservationTable import ReservationTable
+from SpaceTimeAStar import SpaceTimeAStar
+
+SIZE = 12
+
+
+def random_table(rng: random.Random, robots: int) -> ReservationTable:
+    """其他机器人沿随机游走的路线预约，最后停留在终点"""
+    table = ReservationTable(slack=1)
+    occupied = set()
+    for i in range(robots):
+        cell = (rng.randrange(SIZE), rng.randrange(SIZE))
+        if cell in occupied:
+            continue
+        occupied.add(cell)
+        cells = [cell]
+        for _ in range(rng.randrange(3, 15)):
+            x, y = cells[-1]
+            dx, dy = rng.choice(((0, 1), (1, 0), (0, -1), (-1, 0), (0, 0)))
+            if 0 <= x + dx < SIZE and 0 <= y + dy < SIZE:
+                cells.append((x + dx, y + dy))
+        if table.is_route_free(f"O{i}", cells, 0):
+            table.book_route(f"O{i}", cells, 0, park_at_goal=rng.random() < 0.3)
+    return table
+
+
+def assert_valid(table, start, route, t0):
+    cells = [(start.x, start.y)] + [(p.x, p.y) for p in route]
+    for (x1, y1), (x2, y2) in zip(cells, cells[1:]):
+        assert abs(x1 - x2) + abs(y1 - y2) <= 1
+    assert table.is_route_free("R", cells, t0)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_routes_avoid_reservations(seed):
+    rng = random.Random(seed)
+    table = random_table(rng, 12)
+    planner = SpaceTimeAStar(SIZE, SIZE, table)
+    start = Position(rng.randrange(SIZE), rng.randrange(SIZE))
+    goal = Position(rng.randrange(SIZE), rng.randrange(SIZE))
+    if not table.is_cell_free(start.x, start.y, 0, "R") or start == goal:
+        return
+    route = planner.find_path("R", start, goal, 0, max_expansions=SIZE * SIZE * 8)
+    if route:
+        assert route[-1] == goal
+        assert_valid(table, start, route, 0)
+
+
+def test_route_is_shortest_without_reservations():
+    planner = SpaceTimeAStar(SIZE, SIZE, ReservationTable())
+    route = planner.find_path("R", Position(0, 0), Position(SIZE - 1, 5), 0)
+    assert len(route) == SIZE - 1 + 5
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_windowed_route_stops_at_window(seed):
+    rng = random.Random(seed)
+    table = random_table(rng, 8)
+    fields = DistanceFieldCache(SIZE, SIZE)
+    planner = SpaceTimeAStar(SIZE, SIZE, table, fields)
+    start, goal = Position(0, 0), Position(SIZE - 1, SIZE - 1)
+    if not table.is_cell_free(0, 0, 0, "R"):
+        return
+    window = 5
+    route = planner.find_path("R", start, goal, 0, window=window)
+    assert 0 < len(route) <= window
+    assert_valid(table, start, route, 0)
+
+
+def test_windowed_route_follows_distance_field():
+    # 没有其他预约时，窗口内的路线是最短路线的前window步
+    fields = DistanceFieldCache(SIZE, SIZE)
+    planner = SpaceTimeAStar(SIZE, SIZE, ReservationTable(), fields)
+    goal = Position(SIZE - 1, SIZE - 1)
+    route = planner.find_path("R", Position(0, 0), goal, 0, window=4)
+    assert len(route) == 4
+    assert (goal.x - route[-1].x) + (goal.y - route[-1].y) == 2 * (SIZE - 1) - 4
+
+
+def test_expansion_budget_bounds_failed_search():
+    # 终点四周被一直停留的机器人围住，搜索在展开上限处失败
+    table = ReservationTable()
+    goal = Position(6, 6)
+    for i, (dx, dy) in enumerate(((0, 1), (1, 0), (0, -1), (-1, 0))):
+        table.park(f"O{i}", Position(goal.x + dx, goal.y + dy), 0)
+    planner = SpaceTimeAStar(SIZE, SIZE, table)
+    assert planner.find_path("R", Position(0, 0), goal, 0, max_expansions=500) == []
+    assert planner.expansions <= 500